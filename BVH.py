@@ -0,0 +1,315 @@
+from MeshLib.Topology import FanTriangulate, GatherRows
+import numpy
+
+# Bounding volume hierarchy over mesh faces, for batched ray casting,
+# closest-point and box queries.
+# Faces are given as a flat corner list (faceStart, faceVerts), see Topology;
+# polygons are fan triangulated and results refer to the original faces.
+# Each node's triangles are split at the median of their centroids along the
+# longest axis of the centroid bounds, all nodes of a level at once, so the tree
+# is a complete binary tree kept as an implicit heap: the children of node i are
+# 2i+1 and 2i+2, and the leaves are the last nLeaf nodes. Queries walk the tree
+# one level at a time for a whole batch of queries at once.
+
+# triangles per leaf
+LEAF_SIZE = 8
+# queries walked through the tree together, bounding the memory of a walk
+QUERY_BATCH = 1 << 15
+
+# BVH class
+# fields:
+#     positions	---- Nx3 vertex positions the tree was built on
+#     tris	---- Tx3 vertex indices of the triangles, in tree order
+#     triFace	---- T face of each triangle
+#     nLeaf	---- number of leaves, a power of two
+#     leafStart	---- nLeaf+1 offsets of the triangles of each leaf into tris
+#     boxMin	---- (2*nLeaf-1)x3 lower corners of the node bounds
+#     boxMax	---- (2*nLeaf-1)x3 upper corners of the node bounds
+#     nonEmpty	---- 2*nLeaf-1 flags, False for nodes without triangles
+class BVH:
+	def __init__(self, positions, faceStart, faceVerts, faceValid = None, leafSize = LEAF_SIZE):
+		self.positions = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 3)
+		faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+		faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+		tris = faceVerts[FanTriangulate(faceStart)].reshape(-1, 3)
+		nTri = numpy.maximum(numpy.diff(faceStart) - 2, 0)
+		triFace = numpy.repeat(numpy.arange(len(nTri), dtype=numpy.int64), nTri)
+		if faceValid is not None:
+			keep = numpy.asarray(faceValid, dtype=bool)[triFace]
+			(tris, triFace) = (tris[keep], triFace[keep])
+		corners = self.positions[tris]
+		(triMin, triMax) = (corners.min(axis=1), corners.max(axis=1))
+		nTri = len(tris)
+		self.nLeaf = 1
+		while self.nLeaf * leafSize < nTri: self.nLeaf *= 2
+		# the nodes of a level split the ordered triangles evenly
+		order = _medianOrder((triMin + triMax) / 2.0, self.nLeaf)
+		(self.tris, self.triFace) = (tris[order], triFace[order])
+		(triMin, triMax) = (triMin[order], triMax[order])
+		self.leafStart = numpy.arange(self.nLeaf+1, dtype=numpy.int64) * nTri // self.nLeaf
+		nNode = 2 * self.nLeaf - 1
+		self.boxMin = numpy.full((nNode, 3), numpy.inf)
+		self.boxMax = numpy.full((nNode, 3), -numpy.inf)
+		filled = numpy.flatnonzero(self.leafStart[1:] > self.leafStart[:-1])
+		if len(filled) != 0:
+			self.boxMin[self.nLeaf-1+filled] = numpy.minimum.reduceat(triMin, self.leafStart[filled], axis=0)
+			self.boxMax[self.nLeaf-1+filled] = numpy.maximum.reduceat(triMax, self.leafStart[filled], axis=0)
+		# merge the bounds bottom-up, a level at a time
+		first = self.nLeaf - 1
+		while first > 0:
+			first = (first - 1) // 2
+			node = numpy.arange(first, 2*first+1)
+			self.boxMin[node] = numpy.minimum(self.boxMin[2*node+1], self.boxMin[2*node+2])
+			self.boxMax[node] = numpy.maximum(self.boxMax[2*node+1], self.boxMax[2*node+2])
+		self.nonEmpty = (self.boxMin <= self.boxMax).all(axis=1)
+
+	def RayIntersect(self, origins, directions, tMax = numpy.inf):
+		'''
+		Intersect the rays origins + t * directions, 0 <= t <= tMax, with the faces.
+		Return (faces, t, verts, barycentrics) of the nearest hit of each ray: the face,
+		the ray parameter, the Qx3 vertices of the hit triangle (of the fan of a polygon)
+		and their Qx3 weights at the hit point. Rays that miss get face -1 and t inf.
+		'''
+		origins = numpy.asarray(origins, dtype=numpy.float64).reshape(-1, 3)
+		directions = numpy.broadcast_to(numpy.asarray(directions, dtype=numpy.float64).reshape(-1, 3), origins.shape)
+		tMax = numpy.broadcast_to(numpy.asarray(tMax, dtype=numpy.float64), (len(origins),))
+		(faces, t, verts, bary) = _missResults(len(origins))
+		with numpy.errstate(divide='ignore', invalid='ignore'):
+			for start in range(0, len(origins), QUERY_BATCH):
+				end = min(start + QUERY_BATCH, len(origins))
+				(o, d) = (origins[start:end], directions[start:end])
+				invDir = 1.0 / d
+				def hitBox(q, node):
+					t0 = (self.boxMin[node] - o[q]) * invDir[q]
+					t1 = (self.boxMax[node] - o[q]) * invDir[q]
+					# fmin/fmax skip the NaN of a ray parallel to and on a slab plane
+					tNear = numpy.fmax(numpy.fmin(t0, t1).max(axis=1), 0.0)
+					tFar = numpy.fmin(numpy.fmax(t0, t1).min(axis=1), tMax[start:end][q])
+					return tNear <= tFar
+				(q, tri) = self.__walk(end - start, hitBox)
+				(hitT, u, v) = _rayTriangles(o[q], d[q], *self.__corners(tri))
+				hit = (hitT >= 0.0) & (hitT <= tMax[start:end][q])
+				(q, tri, hitT, u, v) = (q[hit], tri[hit], hitT[hit], u[hit], v[hit])
+				first = _firstPerQuery(q, hitT)
+				q = q[first]
+				faces[start+q] = self.triFace[tri[first]]
+				t[start+q] = hitT[first]
+				verts[start+q] = self.tris[tri[first]]
+				bary[start+q] = numpy.stack((1.0 - u[first] - v[first], u[first], v[first]), axis=1)
+		return (faces, t, verts, bary)
+
+	def ClosestPoints(self, points, maxDistance = numpy.inf):
+		'''
+		Find the closest point on the faces of each point within maxDistance.
+		Return (faces, closest, verts, barycentrics, distances): the face, the Qx3 closest
+		points, the Qx3 vertices of the triangle they lie on (of the fan of a polygon),
+		their Qx3 weights and the distances. Points farther than maxDistance from every
+		face get face -1 and distance inf.
+		'''
+		points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+		(faces, distances, verts, bary) = _missResults(len(points))
+		closest = numpy.full((len(points), 3), numpy.nan)
+		for start in range(0, len(points), QUERY_BATCH):
+			end = min(start + QUERY_BATCH, len(points))
+			p = points[start:end]
+			# squared distance within which a face is known to be
+			bound = numpy.minimum(self.__descentBound(p), float(maxDistance) ** 2)
+			def nearBox(q, node):
+				return _boxDistance2(p[q], self.boxMin[node], self.boxMax[node]) <= bound[q]
+			(q, tri) = self.__walk(end - start, nearBox)
+			(a, b, c) = self.__corners(tri)
+			# skip the triangles whose own bounds are too far
+			near = _boxDistance2(p[q], numpy.minimum(numpy.minimum(a, b), c), numpy.maximum(numpy.maximum(a, b), c)) <= bound[q]
+			(q, tri, a, b, c) = (q[near], tri[near], a[near], b[near], c[near])
+			w = _closestOnTriangles(p[q], a, b, c)
+			point = w[:, 0:1] * a + w[:, 1:2] * b + w[:, 2:3] * c
+			dist2 = ((point - p[q]) ** 2).sum(axis=1)
+			inRange = dist2 <= float(maxDistance) ** 2
+			(q, tri, w, point, dist2) = (q[inRange], tri[inRange], w[inRange], point[inRange], dist2[inRange])
+			first = _firstPerQuery(q, dist2)
+			q = q[first]
+			faces[start+q] = self.triFace[tri[first]]
+			distances[start+q] = numpy.sqrt(dist2[first])
+			verts[start+q] = self.tris[tri[first]]
+			bary[start+q] = w[first]
+			closest[start+q] = point[first]
+		return (faces, closest, verts, bary, distances)
+
+	def BoxFaces(self, boxMin, boxMax):
+		'''
+		Find the faces that intersect each axis-aligned box (boxMin, boxMax).
+		Return (indptr, faces), the faces of box i being faces[indptr[i]:indptr[i+1]], ascending.
+		'''
+		boxMin = numpy.asarray(boxMin, dtype=numpy.float64).reshape(-1, 3)
+		boxMax = numpy.asarray(boxMax, dtype=numpy.float64).reshape(-1, 3)
+		nFace = int(self.triFace.max()) + 1 if len(self.triFace) != 0 else 1
+		keys = []
+		for start in range(0, len(boxMin), QUERY_BATCH):
+			end = min(start + QUERY_BATCH, len(boxMin))
+			(lo, hi) = (boxMin[start:end], boxMax[start:end])
+			def overlap(q, node):
+				return (self.boxMin[node] <= hi[q]).all(axis=1) & (self.boxMax[node] >= lo[q]).all(axis=1)
+			(q, tri) = self.__walk(end - start, overlap)
+			inside = _triangleBoxOverlap(*self.__corners(tri), lo[q], hi[q])
+			keys.append((q[inside] + start) * nFace + self.triFace[tri[inside]])
+		keys = numpy.unique(numpy.concatenate(keys + [numpy.zeros(0, dtype=numpy.int64)]))
+		(rows, faces) = (keys // nFace, keys % nFace)
+		indptr = numpy.zeros(len(boxMin)+1, dtype=numpy.int64)
+		numpy.cumsum(numpy.bincount(rows, minlength=len(boxMin)), out=indptr[1:])
+		return (indptr, faces)
+
+	# walk the tree for nQuery queries, descending into the nodes for which
+	# test(queries, nodes) is True; return the (query, triangle) pairs of the leaves reached
+	def __walk(self, nQuery, test):
+		q = numpy.arange(nQuery, dtype=numpy.int64)
+		node = numpy.zeros(nQuery, dtype=numpy.int64)
+		while True:
+			keep = self.nonEmpty[node]
+			(q, node) = (q[keep], node[keep])
+			keep = test(q, node)
+			(q, node) = (q[keep], node[keep])
+			if len(node) == 0 or node[0] >= self.nLeaf - 1: break
+			q = numpy.repeat(q, 2)
+			node = (2 * node[:, None] + numpy.array([1, 2])).ravel()
+		leaf = node - (self.nLeaf - 1)
+		counts = self.leafStart[leaf+1] - self.leafStart[leaf]
+		tri = GatherRows((self.leafStart, numpy.arange(len(self.tris))), leaf)
+		return (numpy.repeat(q, counts), tri)
+
+	# squared distances of points to the faces of the leaf reached by descending into
+	# the nearer child at each level, an upper bound of their closest face distance
+	def __descentBound(self, p):
+		if len(self.tris) == 0: return numpy.full(len(p), numpy.inf)
+		node = numpy.zeros(len(p), dtype=numpy.int64)
+		while node[0] < self.nLeaf - 1:
+			children = 2 * node[:, None] + numpy.array([1, 2])
+			(lo, hi) = (self.boxMin[children], self.boxMax[children])
+			near = _boxDistance2(p[:, None], lo, hi)
+			near[~self.nonEmpty[children]] = numpy.inf
+			# a point inside both boxes goes to the one whose center is nearer
+			center = ((p[:, None] - (lo + hi) / 2.0) ** 2).sum(axis=2)
+			second = (near[:, 1] < near[:, 0]) | ((near[:, 1] == near[:, 0]) & (center[:, 1] < center[:, 0]))
+			node = children[:, 0] + second
+		leaf = node - (self.nLeaf - 1)
+		q = numpy.repeat(numpy.arange(len(p)), self.leafStart[leaf+1] - self.leafStart[leaf])
+		(a, b, c) = self.__corners(GatherRows((self.leafStart, numpy.arange(len(self.tris))), leaf))
+		w = _closestOnTriangles(p[q], a, b, c)
+		dist2 = ((w[:, 0:1] * a + w[:, 1:2] * b + w[:, 2:3] * c - p[q]) ** 2).sum(axis=1)
+		bound = numpy.full(len(p), numpy.inf)
+		numpy.minimum.at(bound, q, dist2)
+		return bound
+
+	# corner positions (a, b, c) of triangles
+	def __corners(self, tri):
+		corners = self.tris[tri]
+		return (self.positions[corners[:, 0]], self.positions[corners[:, 1]], self.positions[corners[:, 2]])
+
+# results of queries that found no face: (faces, values, verts, barycentrics)
+def _missResults(nQuery):
+	return (numpy.full(nQuery, -1, dtype=numpy.int64), numpy.full(nQuery, numpy.inf), \
+		numpy.full((nQuery, 3), -1, dtype=numpy.int64), numpy.zeros((nQuery, 3)))
+
+# squared distances of points to boxes
+def _boxDistance2(p, lo, hi):
+	return ((p - numpy.clip(p, lo, hi)) ** 2).sum(axis=-1)
+
+# index of the pair with the smallest value of each query
+def _firstPerQuery(q, values):
+	order = numpy.lexsort((values, q))
+	isFirst = numpy.ones(len(order), dtype=bool)
+	isFirst[1:] = q[order[1:]] != q[order[:-1]]
+	return order[isFirst]
+
+# order of the centroids such that, for every level down to nLeaf nodes, the i-th of the
+# 2^d even parts of the order is split at its middle along its longest axis
+def _medianOrder(centroids, nLeaf):
+	order = numpy.arange(len(centroids), dtype=numpy.int64)
+	nNode = 1
+	while nNode < nLeaf and len(order) != 0:
+		bounds = numpy.arange(nNode+1, dtype=numpy.int64) * len(order) // nNode
+		filled = numpy.flatnonzero(bounds[1:] > bounds[:-1])
+		points = centroids[order]
+		(low, high) = (numpy.zeros((nNode, 3)), numpy.ones((nNode, 3)))
+		low[filled] = numpy.minimum.reduceat(points, bounds[filled], axis=0)
+		high[filled] = numpy.maximum.reduceat(points, bounds[filled], axis=0)
+		axis = (high - low).argmax(axis=1)
+		node = numpy.repeat(numpy.arange(nNode), numpy.diff(bounds))
+		# sort within the nodes at once: node index plus the position in the node's extent
+		extent = (high - low)[numpy.arange(nNode), axis]
+		extent = numpy.where(extent > 0.0, extent * (1.0 + 1e-9), 1.0)
+		key = node + (points[numpy.arange(len(order)), axis[node]] - low[node, axis[node]]) / extent[node]
+		order = order[numpy.argsort(key)]
+		nNode *= 2
+	return order
+
+# ray parameters t and barycentrics (u, v) of the intersections of rays and triangles (Moller-Trumbore);
+# t is NaN where a ray misses its triangle
+def _rayTriangles(o, d, a, b, c):
+	(e1, e2) = (b - a, c - a)
+	p = numpy.cross(d, e2)
+	det = (e1 * p).sum(axis=1)
+	invDet = 1.0 / numpy.where(det == 0.0, 1.0, det)
+	s = o - a
+	u = (s * p).sum(axis=1) * invDet
+	qv = numpy.cross(s, e1)
+	v = (d * qv).sum(axis=1) * invDet
+	t = (e2 * qv).sum(axis=1) * invDet
+	hit = (det != 0.0) & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0)
+	return (numpy.where(hit, t, numpy.nan), u, v)
+
+# barycentric weights of the closest points on triangles (a, b, c) to points p,
+# by the Voronoi regions of the triangle's vertices, edges and interior
+def _closestOnTriangles(p, a, b, c):
+	(ab, ac) = (b - a, c - a)
+	dot = lambda x, y: (x * y).sum(axis=1)
+	(d1, d2) = (dot(ab, p - a), dot(ac, p - a))
+	(d3, d4) = (dot(ab, p - b), dot(ac, p - b))
+	(d5, d6) = (dot(ab, p - c), dot(ac, p - c))
+	va = d3 * d6 - d5 * d4
+	vb = d5 * d2 - d1 * d6
+	vc = d1 * d4 - d3 * d2
+	safe = lambda x: numpy.where(x == 0.0, 1.0, x)
+	denom = safe(va + vb + vc)
+	# the regions are tested last to first, so earlier ones take precedence
+	(v, w) = (vb / denom, vc / denom)
+	weights = numpy.stack((1.0 - v - w, v, w), axis=1)
+	regions = []
+	# edge bc
+	wbc = (d4 - d3) / safe((d4 - d3) + (d5 - d6))
+	regions.append(((va <= 0.0) & (d4 - d3 >= 0.0) & (d5 - d6 >= 0.0), (0.0, 1.0 - wbc, wbc)))
+	# edge ac
+	wac = d2 / safe(d2 - d6)
+	regions.append(((vb <= 0.0) & (d2 >= 0.0) & (d6 <= 0.0), (1.0 - wac, 0.0, wac)))
+	# vertex c
+	regions.append(((d6 >= 0.0) & (d5 <= d6), (0.0, 0.0, 1.0)))
+	# edge ab
+	vab = d1 / safe(d1 - d3)
+	regions.append(((vc <= 0.0) & (d1 >= 0.0) & (d3 <= 0.0), (1.0 - vab, vab, 0.0)))
+	# vertex b
+	regions.append(((d3 >= 0.0) & (d4 <= d3), (0.0, 1.0, 0.0)))
+	# vertex a
+	regions.append(((d1 <= 0.0) & (d2 <= 0.0), (1.0, 0.0, 0.0)))
+	for (inRegion, regionWeights) in regions:
+		regionWeights = numpy.stack(numpy.broadcast_arrays(*regionWeights, d1)[:3], axis=1)
+		weights = numpy.where(inRegion[:, None], regionWeights, weights)
+	return weights
+
+# whether triangles (a, b, c) intersect boxes (lo, hi), by the separating axis test
+def _triangleBoxOverlap(a, b, c, lo, hi):
+	center = (lo + hi) / 2.0
+	half = (hi - lo) / 2.0
+	verts = (a - center, b - center, c - center)
+	edges = (verts[1] - verts[0], verts[2] - verts[1], verts[0] - verts[2])
+	axes = [numpy.cross(edges[0], edges[1])]
+	for e in edges:
+		for k in range(0, 3):
+			axes.append(numpy.cross(numpy.eye(3)[k], e))
+	separated = numpy.zeros(len(a), dtype=bool)
+	for k in range(0, 3):
+		coords = numpy.stack([v[:, k] for v in verts])
+		separated |= (coords.min(axis=0) > half[:, k]) | (coords.max(axis=0) < -half[:, k])
+	for axis in axes:
+		projs = numpy.stack([(v * axis).sum(axis=1) for v in verts])
+		radius = (half * numpy.abs(axis)).sum(axis=1)
+		separated |= (projs.min(axis=0) > radius) | (projs.max(axis=0) < -radius)
+	return ~separated
@@ -0,0 +1,310 @@
+from MeshLib.Topology import VertexFaces
+from MeshLib.MeshArrays import UniqueRows
+import numpy
+import heapq
+
+# Mesh simplification by edge collapses driven by quadric error metrics
+# (Garland & Heckbert). Every vertex carries the area weighted quadric of the
+# planes of its faces; collapsing an edge sums the quadrics of its end points and
+# moves the kept one to the position of least error. Edges are collapsed cheapest
+# first from a heap whose entries are stamped with the versions of their end
+# points: an entry whose vertex changed since is stale and skipped when popped,
+# and the changed vertex pushes fresh entries for all its edges. The heap is
+# popped in batches of edges apart from each other, so that their tests and
+# updates run vectorized; an edge near one of the batch waits for the next batch.
+# A collapse is refused when it would change the topology (the link condition),
+# flip a face or move a locked vertex; locked vertices, by default those of
+# boundary and non-manifold edges, stay where they are, and an edge between two
+# locked vertices is never collapsed, so boundaries are kept as they are.
+# Texture coordinates are interpolated along the collapsed edge. A seam where
+# vertices are split by their texture coordinates is a boundary, hence kept.
+
+# faces removed between two progress calls
+PROGRESS_STEP = 10000
+# a batch takes one collapse per BATCH_FACES faces left, small enough next to the
+# mesh to keep close to the order of the heap
+BATCH_FACES = 256
+
+# Levels of detail for display are cheaper: LODPyramid snaps the vertices of
+# every grid cell onto one of them (vertex clustering), so that each level is an
+# index array into the original vertices and all levels share one vertex buffer.
+# a level is kept if it has at most LOD_SHRINK times the triangles of the previous one
+LOD_SHRINK = 0.75
+# levels are made until one has at most LOD_MIN_FACES triangles or there are LOD_MAX_LEVELS
+LOD_MIN_FACES = 20000
+LOD_MAX_LEVELS = 8
+
+# QuadricDecimator class
+# fields:
+#     positions	---- Nx3 vertex positions, moved by the collapses
+#     textures	---- Nx2 texture coordinates or None, interpolated by the collapses
+#     faces	---- list of the [a, b, c] vertex lists of the triangles
+#     faceAlive	---- list of flags, False for the faces removed by collapses
+#     vertFaces	---- list of the sets of the alive faces of each vertex
+#     quadrics	---- Nx10 upper triangles of the vertex quadrics
+#     locked	---- N flags of the vertices that are not moved
+#     into	---- N vertex each vertex was collapsed into, -1 for the vertices left
+#     nFaces	---- number of alive faces
+#     maxError	---- largest error of the collapses done
+class QuadricDecimator:
+	def __init__(self, positions, faces, textures = None, locked = None):
+		self.positions = numpy.array(positions, dtype=numpy.float64).reshape(-1, 3)
+		self.textures = None if textures is None else numpy.array(textures, dtype=numpy.float64).reshape(-1, 2)
+		faces = numpy.asarray(faces, dtype=numpy.int64).reshape(-1, 3)
+		nVert = len(self.positions)
+		self.faces = faces.tolist()
+		self.faceAlive = [True] * len(faces)
+		self.nFaces = len(faces)
+		self.maxError = 0.0
+		(indptr, indices) = VertexFaces(numpy.arange(0, 3 * len(faces) + 1, 3), faces.ravel(), nVert)
+		indices = indices.tolist(); indptr = indptr.tolist()
+		self.vertFaces = [set(indices[indptr[v]:indptr[v+1]]) for v in range(0, nVert)]
+		self.quadrics = _faceQuadrics(self.positions, faces, nVert)
+		(edges, counts) = _uniqueEdges(faces, nVert)
+		if locked is None:
+			# the vertices of boundary and non-manifold edges
+			locked = numpy.zeros(nVert, dtype=bool)
+			locked[edges[counts != 2].ravel()] = True
+		self.locked = numpy.array(locked, dtype=bool)
+		self.into = numpy.full(nVert, -1, dtype=numpy.int64)
+		self.__version = [0] * nVert
+		self.__heap = self.__entries(edges[:, 0], edges[:, 1])
+		heapq.heapify(self.__heap)
+
+	def Collapse(self, targetFaces = None, maxError = None, progress = None):
+		'''
+		Collapse edges, cheapest first, until at most targetFaces faces are left or
+		the next collapse would cost more than maxError; without either, until no
+		edge can be collapsed. progress(nFaces) is called every PROGRESS_STEP removed
+		faces and at the end. Return the number of faces left.
+		'''
+		target = 0 if targetFaces is None else targetFaces
+		nextProgress = self.nFaces - PROGRESS_STEP
+		while self.nFaces > target and len(self.__heap) != 0:
+			# a collapse removes at most two faces
+			(batch, stop) = self.__pick(max(1, min(self.nFaces // BATCH_FACES, (self.nFaces - target) // 2)), maxError)
+			self.__apply(batch)
+			if progress is not None and self.nFaces <= nextProgress:
+				progress(self.nFaces)
+				nextProgress = self.nFaces - PROGRESS_STEP
+			if stop: break
+		if progress is not None: progress(self.nFaces)
+		return self.nFaces
+
+	def Result(self):
+		'''
+		Return (positions, faces, textures, keep, vertMap): the vertices left and their
+		faces, keep being the original indices of the vertices left and vertMap the new
+		index of every original vertex, following the collapses
+		'''
+		alive = self.into < 0
+		keep = numpy.flatnonzero(alive)
+		newIndex = numpy.cumsum(alive) - 1
+		# the vertex each vertex ended up in
+		root = numpy.where(alive, numpy.arange(len(alive)), self.into)
+		while True:
+			nextRoot = root[root]
+			if (nextRoot == root).all(): break
+			root = nextRoot
+		faces = numpy.array([f for (f, a) in zip(self.faces, self.faceAlive) if a], dtype=numpy.int64).reshape(-1, 3)
+		textures = None if self.textures is None else self.textures[keep]
+		return (self.positions[keep], newIndex[faces], textures, keep, newIndex[root])
+
+	# pop up to size cheapest collapses that keep the topology and are apart from each other:
+	# no end point of one is on a face around another, so they can be tested and done at once.
+	# Return (list of (entry, shared faces, moved faces), whether maxError was reached)
+	def __pick(self, size, maxError):
+		(heap, version, faces) = (self.__heap, self.__version, self.faces)
+		batch = []; deferred = []; touched = set(); stop = False
+		while len(batch) < size and len(heap) != 0:
+			entry = heapq.heappop(heap)
+			(cost, keep, gone, keepVersion, goneVersion) = entry[:5]
+			if version[keep] != keepVersion or version[gone] != goneVersion: continue
+			if maxError is not None and cost > maxError:
+				deferred.append(entry); stop = True
+				break
+			if keep in touched or gone in touched:
+				deferred.append(entry)
+				continue
+			(keepFaces, goneFaces) = (self.vertFaces[keep], self.vertFaces[gone])
+			shared = keepFaces & goneFaces
+			if len(shared) == 0: continue
+			# link condition: the common neighbours are the opposite corners of the shared faces
+			(opposite, keepRing, goneRing) = (set(), set(), set())
+			for fi in shared: opposite.update(faces[fi])
+			for fi in keepFaces: keepRing.update(faces[fi])
+			for fi in goneFaces: goneRing.update(faces[fi])
+			if keepRing & goneRing != opposite: continue
+			touched |= keepRing
+			touched |= goneRing
+			batch.append((entry, shared, list((keepFaces | goneFaces) - shared)))
+		for entry in deferred: heapq.heappush(heap, entry)
+		return (batch, stop)
+
+	# do the collapses of a batch of __pick that do not fold a face over
+	def __apply(self, batch):
+		if len(batch) == 0: return
+		(faces, vertFaces, version) = (self.faces, self.vertFaces, self.__version)
+		entries = [b[0] for b in batch]
+		keeps = numpy.array([e[1] for e in entries], dtype=numpy.int64)
+		gones = numpy.array([e[2] for e in entries], dtype=numpy.int64)
+		# the same positions as when the entries were pushed, their end points being unchanged since
+		targets = _collapseTargets(self.quadrics[keeps] + self.quadrics[gones], \
+			self.positions[keeps], self.positions[gones], self.locked[keeps])[1]
+		flipped = _flips([[faces[fi] for fi in b[2]] for b in batch], self.positions, keeps, gones, targets)
+		done = numpy.flatnonzero(~flipped)
+		(keeps, gones, targets) = (keeps[done], gones[done], targets[done])
+		if self.textures is not None:
+			# where the position lies along the edge from keep to gone
+			edge = self.positions[gones] - self.positions[keeps]
+			length2 = (edge * edge).sum(axis=1)
+			t = numpy.clip(((targets - self.positions[keeps]) * edge).sum(axis=1) / numpy.where(length2 == 0.0, 1.0, length2), 0.0, 1.0)
+			self.textures[keeps] += t[:, None] * (self.textures[gones] - self.textures[keeps])
+		self.positions[keeps] = targets
+		self.quadrics[keeps] += self.quadrics[gones]
+		self.into[gones] = keeps
+		if len(done) != 0: self.maxError = max(self.maxError, max(entries[i][0] for i in done.tolist()))
+		(ringKeeps, rings) = ([], [])
+		for (i, keep, gone) in zip(done.tolist(), keeps.tolist(), gones.tolist()):
+			for fi in batch[i][1]:
+				self.faceAlive[fi] = False
+				for v in faces[fi]: vertFaces[v].discard(fi)
+			self.nFaces -= len(batch[i][1])
+			keepFaces = vertFaces[keep]
+			for fi in vertFaces[gone]:
+				f = faces[fi]
+				f[f.index(gone)] = keep
+				keepFaces.add(fi)
+			vertFaces[gone] = set()
+			version[gone] += 1
+			version[keep] += 1
+			ring = set()
+			for fi in keepFaces: ring.update(faces[fi])
+			ring.discard(keep)
+			ringKeeps += [keep] * len(ring)
+			rings += ring
+		# fresh entries for the edges of the moved vertices
+		for entry in self.__entries(numpy.array(ringKeeps, dtype=numpy.int64), numpy.array(rings, dtype=numpy.int64)):
+			heapq.heappush(self.__heap, entry)
+
+	# heap entries (cost, keep, gone, keep version, gone version) of the edges (a, b) that can be collapsed
+	def __entries(self, a, b):
+		# a locked end point is kept
+		swap = self.locked[b] & ~self.locked[a]
+		(keep, gone) = (numpy.where(swap, b, a), numpy.where(swap, a, b))
+		free = ~self.locked[gone]
+		(keep, gone) = (keep[free], gone[free])
+		cost = _collapseTargets(self.quadrics[keep] + self.quadrics[gone], \
+			self.positions[keep], self.positions[gone], self.locked[keep])[0]
+		(keep, gone) = (keep.tolist(), gone.tolist())
+		version = self.__version
+		return list(zip(cost.tolist(), keep, gone, [version[v] for v in keep], [version[v] for v in gone]))
+
+def ClusterFaces(positions, faces, cellSize):
+	'''
+	Return the Mx3 triangles left of the Nx3 triangles faces when the vertices of
+	every grid cell of cellSize are snapped onto the one closest to their mean;
+	triangles that degenerate are dropped, and so are repeats of a triangle
+	'''
+	faces = numpy.asarray(faces).reshape(-1, 3)
+	if len(faces) == 0: return faces.copy()
+	used = numpy.flatnonzero(numpy.bincount(faces.ravel(), minlength=len(positions)) != 0)
+	points = numpy.asarray(positions, dtype=numpy.float64)[used]
+	cells = numpy.floor((points - points.min(axis=0)) / cellSize).astype(numpy.int64)
+	dims = cells.max(axis=0) + 1
+	cell = numpy.unique((cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2], return_inverse=True)[1].ravel()
+	counts = numpy.bincount(cell)
+	mean = numpy.stack([numpy.bincount(cell, points[:, k]) for k in range(0, 3)], axis=1) / counts[:, None]
+	offset = points - mean[cell]
+	order = numpy.lexsort(((offset * offset).sum(axis=1), cell))
+	closest = order[numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))]
+	snap = numpy.arange(len(positions), dtype=faces.dtype)
+	snap[used] = used[closest][cell]
+	tris = snap[faces]
+	tris = tris[(tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 2] != tris[:, 0])]
+	return tris[numpy.sort(UniqueRows(numpy.sort(tris, axis=1))[0])]
+
+def LODPyramid(positions, faces, minFaces = LOD_MIN_FACES):
+	'''
+	Return the levels of detail of the Nx3 triangles faces, finest first: faces
+	itself, then clusterings (see ClusterFaces) with about a quarter of the triangles
+	of the previous level each, down to minFaces triangles
+	'''
+	positions = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 3)
+	levels = [numpy.asarray(faces).reshape(-1, 3)]
+	if len(levels[0]) == 0: return levels
+	(p0, p1, p2) = (positions[levels[0][:, 0]], positions[levels[0][:, 1]], positions[levels[0][:, 2]])
+	cross = numpy.cross(p1 - p0, p2 - p0)
+	area = numpy.sqrt((cross * cross).sum(axis=1)).sum() / 2.0
+	# twice the mean vertex spacing (about two triangles per vertex), so the cells of
+	# the first level hold about four vertices
+	cellSize = 2.0 * numpy.sqrt(2.0 * area / len(levels[0]))
+	if cellSize == 0.0: return levels
+	for attempt in range(0, 2 * LOD_MAX_LEVELS):
+		if len(levels[-1]) <= minFaces or len(levels) == LOD_MAX_LEVELS: break
+		coarse = ClusterFaces(positions, levels[-1], cellSize)
+		cellSize *= 2.0
+		if len(coarse) == 0: break
+		if len(coarse) <= LOD_SHRINK * len(levels[-1]): levels.append(coarse)
+	return levels
+
+# Nx10 sums of the area weighted plane quadrics of the faces around each vertex
+def _faceQuadrics(positions, faces, nVert):
+	(p0, p1, p2) = (positions[faces[:, 0]], positions[faces[:, 1]], positions[faces[:, 2]])
+	cross = numpy.cross(p1 - p0, p2 - p0)
+	length = numpy.sqrt((cross * cross).sum(axis=1))
+	normal = cross / numpy.where(length == 0.0, 1.0, length)[:, None]
+	plane = numpy.hstack((normal, -(normal * p0).sum(axis=1)[:, None]))
+	(i, j) = numpy.triu_indices(4)
+	faceQuadrics = plane[:, i] * plane[:, j] * (length / 2.0)[:, None]
+	quadrics = numpy.zeros((nVert, 10))
+	for k in range(0, 3):
+		numpy.add.at(quadrics, faces[:, k], faceQuadrics)
+	return quadrics
+
+# the 4x4 symmetric quadrics of rows of upper triangles
+_SYMMETRIC = numpy.array([0, 1, 2, 3, 1, 4, 5, 6, 2, 5, 7, 8, 3, 6, 8, 9])
+
+# (cost, position) of collapsing edges with summed quadrics q: the position of least error, or
+# the best of the end points and the midpoint where that is ill-conditioned; keepOnly edges stay at p0
+def _collapseTargets(q, p0, p1, keepOnly):
+	k = len(q)
+	quadric = q[:, _SYMMETRIC].reshape(k, 4, 4)
+	linear = quadric[:, :3, :3]
+	det = numpy.linalg.det(linear)
+	scale = numpy.maximum(numpy.abs(q[:, [0, 4, 7]]).max(axis=1), 1e-300) ** 3
+	solvable = numpy.abs(det) > 1e-10 * scale
+	linear = numpy.where(solvable[:, None, None], linear, numpy.eye(3))
+	best = numpy.linalg.solve(linear, -quadric[:, :3, 3:])[:, :, 0]
+	candidates = numpy.ones((k, 4, 4))
+	candidates[:, :, :3] = numpy.stack((p0, p1, (p0 + p1) / 2.0, best), axis=1)
+	costs = numpy.einsum('kci,kij,kcj->kc', candidates, quadric, candidates)
+	costs[~solvable, 3] = numpy.inf
+	costs[keepOnly, 1:] = numpy.inf
+	choice = costs.argmin(axis=1)
+	rows = numpy.arange(k)
+	return (numpy.maximum(costs[rows, choice], 0.0), candidates[rows, choice, :3])
+
+# flags of the collapses folding a face over or making it degenerate: collapse i moves
+# keeps[i] and gones[i] of the triangles in triangles[i] to targets[i]; triangles that
+# already were degenerate do not count
+def _flips(triangles, positions, keeps, gones, targets):
+	owner = numpy.repeat(numpy.arange(len(triangles)), [len(t) for t in triangles])
+	tris = numpy.array([f for t in triangles for f in t], dtype=numpy.int64).reshape(-1, 3)
+	corners = positions[tris]
+	old = _cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+	moving = (tris == keeps[owner][:, None]) | (tris == gones[owner][:, None])
+	corners[moving] = numpy.repeat(targets[owner], 3, axis=0)[moving.ravel()]
+	new = _cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+	folded = ((old * new).sum(axis=1) <= 0.0) & (old != 0.0).any(axis=1)
+	return numpy.bincount(owner[folded], minlength=len(triangles)) > 0
+
+# row-wise cross products, cheaper than numpy.cross on a few rows
+def _cross(u, v):
+	return numpy.stack((u[:, 1]*v[:, 2] - u[:, 2]*v[:, 1], u[:, 2]*v[:, 0] - u[:, 0]*v[:, 2], u[:, 0]*v[:, 1] - u[:, 1]*v[:, 0]), axis=1)
+
+# (Ex2 unique edges (a < b) of the triangles, E numbers of triangles using them)
+def _uniqueEdges(faces, nVert):
+	pairs = numpy.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+	(keys, counts) = numpy.unique(pairs[:, 0] * nVert + pairs[:, 1], return_counts=True)
+	return (numpy.stack((keys // nVert, keys % nVert), axis=1), counts)
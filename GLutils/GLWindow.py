@@ -18,7 +18,7 @@ if len(sys.argv) < 2:
 
 for i in range(1, len(sys.argv)):
 	mesh = Mesh()
-	mesh.LoadMesh(sys.argv[i])
+	mesh.LoadMesh(sys.argv[i], False, True, True)
 	objList.append(mesh)
 	
 def initGL():
@@ -5,23 +5,27 @@ from OpenGL.GLUT import *
 from OpenGL.arrays import vbo
 from OpenGL.GL import shaders
 from MeshLib.Mesh import *
+from MeshLib.Decimate import LODPyramid, LOD_MIN_FACES
 from MeshLib.GLutils.trackball import *
+import MeshLib.utils.MLBMesh
+import MeshLib.utils.Instrument
 from math import pi, tan, sin, cos, sqrt
 import ctypes
+import logging
 import numpy
 from PIL import Image
 import sys, os
+import threading, queue
 
 if len(sys.argv) < 2:
 	print('USAGE: [.py] [mesh1] ...')
 	sys.exit(-1)
 
-# load models
+# models are loaded by a background thread while the window is open (see loadMeshes),
+# objList grows as they arrive, objNames holding their file names
 objList = []
-for i in range(1, len(sys.argv)):
-	mesh = Mesh()
-	mesh.LoadMesh(sys.argv[i], False, True)
-	objList.append(mesh)
+objNames = []
+_logger = logging.getLogger('MeshLib')
 
 OpenGL.ERROR_CHECKING = False
 
@@ -40,9 +44,28 @@ program = None
 vertArrayObjs = []
 vertBufObjs = []
 faceBufObjs = []
-normBufObjs = []
-texBufObjs = []
 scaleMatrices = []
+# levels of detail: lodStarts[i] are the offsets of the levels of object i, finest first, in the
+# triangles of its face buffer, objRadii[i] the radius of object i after its scale matrix
+lodStarts = []
+objRadii = []
+windowHeight = 480
+# the level drawn is the finest with at most LOD_FACES_PER_PIXEL triangles per pixel covered
+LOD_FACES_PER_PIXEL = 1.0
+LOD_CACHE_SUFFIX = '.lod.mlb'
+# loading: the loader thread hands (file name, mesh, vertex data, faces, lod offsets) over through loadQueue
+# and reports what it is doing in loadStatus; the buffers of an arrived model are uploaded by
+# UPLOAD_CHUNK bytes every UPLOAD_MS milliseconds, uploads holding the pending ones as
+# [objId, vertex data, faces, vertex rows uploaded], uploadedFrom[i] the first triangle of
+# object i uploaded so far (faces are uploaded coarsest level first, from the end)
+loadQueue = queue.Queue()
+loadStatus = ''
+uploads = []
+uploadedFrom = []
+UPLOAD_CHUNK = 1 << 24
+UPLOAD_MS = 15
+WINDOW_TITLE = 'Narusaki\'s GLWindow'
+windowTitle = WINDOW_TITLE
 vPositionId = -1; vNormalId = -1; vTexCoordId = -1; scaleMatrixId = -1; mvMatrixId = -1; projMatrixId = -1; colorId = -1
 lightingOnId = -1; AmbientId = -1; DiffuseId = -1; SpecularId = -1; LightPositionId = -1; ShininessId = -1; StrengthId = -1
 cAttenuationId = -1; bAttenuationId = -1; aAttenuationId = -1
@@ -83,6 +106,83 @@ def constructScaleMatrix(model):
 	m[15] = 1.0;
 	return m
 
+# the levels of detail of a mesh file, from its sidecar cache or built and cached:
+# (all levels concatenated, offsets of the levels)
+def loadLODs(fileName, positions, faces):
+	key = MeshLib.utils.MLBMesh.CacheKey(fileName, 'lod', LOD_MIN_FACES)
+	cached = MeshLib.utils.MLBMesh.LoadMLBCache(fileName, key, LOD_CACHE_SUFFIX)
+	# the finest level is the mesh itself, unless it is loaded otherwise than when cached
+	if cached is not None and cached[0]['lodStarts'][1] == len(faces) and \
+		(cached[0]['lodFaces'][:3*len(faces)] == faces.ravel()).all():
+		return (cached[0]['lodFaces'], cached[0]['lodStarts'])
+	levels = LODPyramid(positions, faces)
+	lodFaces = numpy.ascontiguousarray(numpy.concatenate(levels).ravel(), dtype=numpy.uint32)
+	starts = numpy.cumsum([0] + [len(l) for l in levels], dtype=numpy.int64)
+	MeshLib.utils.MLBMesh.SaveMLBCache(fileName, key, {'lodFaces': lodFaces, 'lodStarts': starts}, {}, LOD_CACHE_SUFFIX)
+	return (lodFaces, starts)
+
+# (first, count) of the triangles of the level of detail to draw for an object: the coarsest
+# while the trackball is dragged, else the finest that fits the projected size of the object;
+# while the object is uploaded, the finest uploaded level or the uploaded part of the coarsest
+def selectLOD(objId):
+	starts = lodStarts[objId]
+	ready = uploadedFrom[objId]
+	if ready > starts[-2]: return (ready, int(starts[-1] - ready))
+	level = len(starts) - 2
+	dragging = mouseState == GLUT_DOWN and mouseButton in (GLUT_LEFT_BUTTON, GLUT_RIGHT_BUTTON, GLUT_MIDDLE_BUTTON)
+	if not dragging:
+		mvMatrix = numpy.asarray(trackball.mvMatrix, dtype=numpy.float64)
+		radius = objRadii[objId] * sqrt((mvMatrix[:3, 0] * mvMatrix[:3, 0]).sum())
+		# the object is centered at the origin of the scaled space, the view is shifted by 2 units
+		depth = 2.0 - mvMatrix[2][3]
+		if depth <= radius: level = 0
+		else:
+			pixels = radius / (depth * tan(45.0 / 180.0 * pi / 2.0)) * windowHeight / 2.0
+			budget = LOD_FACES_PER_PIXEL * pi * pixels * pixels
+			for i in range(0, len(starts) - 1):
+				if starts[i+1] - starts[i] <= budget: level = i; break
+	level = max(level, int(numpy.searchsorted(starts, ready)))
+	return (int(starts[level]), int(starts[level+1] - starts[level]))
+
+# the loader thread: load the models one after the other and queue them with their buffers
+def loadMeshes(fileNames):
+	global loadStatus
+	def stageHook(report):
+		global loadStatus
+		loadStatus = '%s (%s)' % (status, report.stage)
+	MeshLib.utils.Instrument.AddHook(stageHook)
+	try:
+		for i in range(0, len(fileNames)):
+			status = 'loading %d/%d %s' % (i+1, len(fileNames), os.path.basename(fileNames[i]))
+			loadStatus = status
+			# a file that fails in any way is skipped, the others are still shown
+			try:
+				mesh = Mesh(True)
+				mesh.LoadMesh(fileNames[i], False, True, True)
+				loadStatus = '%s (levels of detail)' % status
+				(vertData, faces) = meshBuffers(mesh)
+				(faces, starts) = loadLODs(fileNames[i], mesh.arrays.positions, faces.reshape(-1, 3))
+			except Exception:
+				_logger.exception('Cannot load %s.', fileNames[i])
+				continue
+			loadQueue.put((fileNames[i], mesh, vertData, faces, starts))
+	finally:
+		MeshLib.utils.Instrument.RemoveHook(stageHook)
+		loadStatus = ''
+
+# the buffers of an array mode mesh: Nx8 float32 rows of interleaved position, normal and
+# uv (Nx6 without uvs), and the uint32 corners of its valid faces, a view of its storage if all are
+def meshBuffers(obj):
+	arrays = obj.arrays
+	hasTextures = arrays.textures is not None
+	vertData = numpy.empty((len(arrays.positions), 8 if hasTextures else 6), dtype=numpy.float32)
+	vertData[:, 0:3] = arrays.positions
+	if arrays.normals is not None: vertData[:, 3:6] = arrays.normals
+	else: vertData[:, 3:6] = 0.0
+	if hasTextures: vertData[:, 6:8] = arrays.textures
+	faces = arrays.faces if arrays.faceValid.all() else arrays.faces[arrays.faceValid]
+	return (vertData, numpy.ascontiguousarray(faces).view(numpy.uint32))
+
 def ExtractTextureFileName(mtllibFile):
 	if not os.path.exists(mtllibFile): return None
 	for curLine in open(mtllibFile):
@@ -91,7 +191,7 @@ def ExtractTextureFileName(mtllibFile):
 	assert False, 'No \'map_Kd\' line exists in mtllibFile %s.' % (mtllibFile) 
 
 def initGL():
-	global vertArrayObjs, vertBufObjs, faceBufObjs, normBufObjs
+	global vertArrayObjs, vertBufObjs, faceBufObjs
 	global vPositionId, vNormalId, vTexCoordId, scaleMatrixId, mvMatrixId, projMatrixId, colorId
 	global lightingOnId, AmbientId, DiffuseId, SpecularId, LightPositionId, ShininessId, StrengthId
 	global cAttenuationId, bAttenuationId, aAttenuationId
@@ -139,67 +239,65 @@ def initGL():
 	glUniform1f(StrengthId, 1.0)
 	glUniform1f(cAttenuationId, 1.0); glUniform1f(bAttenuationId, 5e-4); glUniform1f(aAttenuationId, 5e-4)
 
-	# vao
-	for obj in objList:
-		# construct arrays
-		verts = []; faces = []; normals = []; textures = []
-		for v in obj.verts:
-			verts.append(v[0]); verts.append(v[1]); verts.append(v[2])
-		for f in obj.faces:
-			faces.append(f[0]); faces.append(f[1]); faces.append(f[2])
-		for n in obj.normals:
-			normals.append(n[0]); normals.append(n[1]); normals.append(n[2])
-		for t in obj.textures:
-			textures.append(t[0]); textures.append(t[1])
-		if len(obj.textures) == 0:  
-			for i in range(0, len(verts)): textures.append(0.0)
-		verts = numpy.array(verts, dtype=numpy.float32)
-		faces = numpy.array(faces, dtype=numpy.uint32)
-		normals = numpy.array(normals, dtype=numpy.float32)
-		textures = numpy.array(textures, dtype=numpy.float32)
-		# generate vao
-		vertArrayObj = glGenVertexArrays(1)
-		vertArrayObjs.append(vertArrayObj)
-		glBindVertexArray(vertArrayObj)
-		# bo for vertices
-		vertBufObj = glGenBuffers(1)
-		vertBufObjs.append(vertBufObj)
-		# send data to server
-		glBindBuffer(GL_ARRAY_BUFFER, vertBufObj)
-		glBufferData(GL_ARRAY_BUFFER, len(verts)*4, verts, GL_STATIC_DRAW)
-		# assign data layout
-		glVertexAttribPointer(vPositionId, 3, GL_FLOAT, False, 0, ctypes.c_void_p(0))
-		glEnableVertexAttribArray(vPositionId)
-
-		# bo for faces
-		faceBufObj = glGenBuffers(1)
-		faceBufObjs.append(faceBufObj)
-		# send data to server
-		glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, faceBufObj)
-		glBufferData(GL_ELEMENT_ARRAY_BUFFER, len(faces)*4, faces, GL_STATIC_DRAW)
-
-		# bo for normals
-		normBufObj = glGenBuffers(1)
-		normBufObjs.append(normBufObj)
-		# send data to server
-		glBindBuffer(GL_ARRAY_BUFFER, normBufObj)
-		glBufferData(GL_ARRAY_BUFFER, len(normals)*4, normals, GL_STATIC_DRAW)
-		# assign data layout
-		glVertexAttribPointer(vNormalId, 3, GL_FLOAT, False, 0, ctypes.c_void_p(0))
-		glEnableVertexAttribArray(vNormalId)
-
-		# bo for textures
-		texBufObj = glGenBuffers(1)
-		texBufObjs.append(texBufObj)
-		# send data to server
-		glBindBuffer(GL_ARRAY_BUFFER, texBufObj)
-		glBufferData(GL_ARRAY_BUFFER, len(textures)*4, textures, GL_STATIC_DRAW)
-		# assign data layout
-		glVertexAttribPointer(vTexCoordId, 2, GL_FLOAT, False, 0, ctypes.c_void_p(0))
-		glEnableVertexAttribArray(vTexCoordId)
+	# shift along minus-z direction for 2 units
+	trackball.mvMatrix[2][3] -= 2.0
+	glUniformMatrix4fv(mvMatrixId, 1, True, trackball.mvMatrix)
+	trackball.mvMatrix[2][3] += 2.0
+	
+	# glEnableClientState(GL_VERTEX_ARRAY)
 
-		# scale matrices
-		scaleMatrices.append(numpy.array(constructScaleMatrix(obj), dtype=numpy.float32))
+	glClearColor(1.0, 1.0, 1.0, 1.0)
+	glShadeModel(GL_SMOOTH)
+	glClearDepth(1.0)
+	glEnable(GL_DEPTH_TEST)
+
+# set up the buffers of a model that arrived from the loader thread and queue their upload
+def addObject(fileName, obj, vertData, faces, starts):
+	global selectedObjId, textureHandle
+	objId = len(objList)
+	objList.append(obj)
+	objNames.append(os.path.basename(fileName))
+	lodStarts.append(starts)
+	uploadedFrom.append(int(starts[-1]))
+	offsets = obj.arrays.positions - numpy.array([obj.center.x, obj.center.y, obj.center.z])
+	objRadii.append(obj.scale * sqrt((offsets * offsets).sum(axis=1).max()) if len(offsets) != 0 else 0.0)
+	# generate vao
+	vertArrayObj = glGenVertexArrays(1)
+	vertArrayObjs.append(vertArrayObj)
+	glBindVertexArray(vertArrayObj)
+	# bo for vertices, positions, normals and uvs interleaved, filled by uploadChunk
+	vertBufObj = glGenBuffers(1)
+	vertBufObjs.append(vertBufObj)
+	glBindBuffer(GL_ARRAY_BUFFER, vertBufObj)
+	glBufferData(GL_ARRAY_BUFFER, vertData.nbytes, None, GL_STATIC_DRAW)
+	# assign data layout
+	stride = vertData.shape[1] * 4
+	glVertexAttribPointer(vPositionId, 3, GL_FLOAT, False, stride, ctypes.c_void_p(0))
+	glEnableVertexAttribArray(vPositionId)
+	glVertexAttribPointer(vNormalId, 3, GL_FLOAT, False, stride, ctypes.c_void_p(12))
+	glEnableVertexAttribArray(vNormalId)
+	if vertData.shape[1] == 8:
+		glVertexAttribPointer(vTexCoordId, 2, GL_FLOAT, False, stride, ctypes.c_void_p(24))
+		glEnableVertexAttribArray(vTexCoordId)
+	else:
+		# without uvs the shader reads a constant (0, 0)
+		glDisableVertexAttribArray(vTexCoordId)
+		glVertexAttrib2f(vTexCoordId, 0.0, 0.0)
+
+	# bo for faces, all levels of detail, filled by uploadChunk
+	faceBufObj = glGenBuffers(1)
+	faceBufObjs.append(faceBufObj)
+	glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, faceBufObj)
+	glBufferData(GL_ELEMENT_ARRAY_BUFFER, faces.nbytes, None, GL_STATIC_DRAW)
+	uploads.append([objId, vertData, faces.reshape(-1, 3), 0])
+
+	# scale matrices
+	scaleMatrices.append(numpy.array(constructScaleMatrix(obj), dtype=numpy.float32))
+	if objId != 0: return
+
+	# the first model is shown as soon as it arrives
+	selectedObjId = 0
+	glUniformMatrix4fv(scaleMatrixId, 1, False, scaleMatrices[selectedObjId])
 
 	# generate texture
 	# c = Image.open(os.path.dirname(os.path.abspath(sys.argv[0])) + os.sep + '..' + os.sep + 'texture3.jpg').convert('RGB')
@@ -219,20 +317,43 @@ def initGL():
 	else:
 		textureHandle = 0
 
-	# shift along minus-z direction for 2 units
-	trackball.mvMatrix[2][3] -= 2.0
-	glUniformMatrix4fv(mvMatrixId, 1, True, trackball.mvMatrix)
-	trackball.mvMatrix[2][3] += 2.0
-	
-	# glEnableClientState(GL_VERTEX_ARRAY)
-
-	selectedObjId = 0
-	glUniformMatrix4fv(scaleMatrixId, 1, False, scaleMatrices[selectedObjId])
-
-	glClearColor(1.0, 1.0, 1.0, 1.0)
-	glShadeModel(GL_SMOOTH)
-	glClearDepth(1.0)
-	glEnable(GL_DEPTH_TEST)
+# upload the next chunk of the pending buffers, the vertices of a model before its faces
+def uploadChunk():
+	if len(uploads) == 0: return
+	(objId, vertData, faces, vertDone) = uploads[0]
+	if vertDone < len(vertData):
+		rowEnd = min(len(vertData), vertDone + max(1, UPLOAD_CHUNK // vertData.itemsize // vertData.shape[1]))
+		glBindBuffer(GL_ARRAY_BUFFER, vertBufObjs[objId])
+		glBufferSubData(GL_ARRAY_BUFFER, vertDone * vertData.strides[0], (rowEnd - vertDone) * vertData.strides[0], vertData[vertDone:rowEnd])
+		uploads[0][3] = rowEnd
+		return
+	# faces from the end, so the coarsest level of detail is complete first
+	faceEnd = uploadedFrom[objId]
+	faceStart = max(0, faceEnd - max(1, UPLOAD_CHUNK // faces.strides[0]))
+	glBindVertexArray(vertArrayObjs[objId])
+	glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, faceBufObjs[objId])
+	glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, faceStart * faces.strides[0], (faceEnd - faceStart) * faces.strides[0], faces[faceStart:faceEnd])
+	uploadedFrom[objId] = faceStart
+	if faceStart == 0: uploads.pop(0)
+	if objId == selectedObjId: glutPostRedisplay()
+
+# timer: take the models that arrived, upload a chunk and show the progress in the title bar
+def pollLoads(value):
+	global windowTitle
+	while not loadQueue.empty():
+		addObject(*loadQueue.get())
+		glutPostRedisplay()
+	uploadChunk()
+	status = [loadStatus] if len(loadStatus) != 0 else []
+	if len(uploads) != 0:
+		(objId, vertData, faces) = uploads[0][:3]
+		done = uploads[0][3] * vertData.strides[0] + (len(faces) - uploadedFrom[objId]) * faces.strides[0]
+		status.append('uploading %s %d%%' % (objNames[objId], 100 * done // max(1, vertData.nbytes + faces.nbytes)))
+	title = WINDOW_TITLE if len(status) == 0 else '%s - %s' % (WINDOW_TITLE, ', '.join(status))
+	if title != windowTitle:
+		windowTitle = title
+		glutSetWindowTitle(title.encode())
+	glutTimerFunc(UPLOAD_MS, pollLoads, 0)
 
 
 def display():
@@ -244,26 +365,32 @@ def display():
 
 	glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 	glUseProgram(program)
+	# nothing to draw before the first model arrives
+	if selectedObjId < 0:
+		glutSwapBuffers()
+		return
 
 	glBindVertexArray(vertArrayObjs[selectedObjId])
 	glBindTexture(GL_TEXTURE_2D, textureHandle)
 
+	(first, count) = selectLOD(selectedObjId)
 	glUniform3f(colorId, 1.0, 0.0, 0.0)
 	glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
 	glDepthRange(DEPTHEPS, 1.0)
-	glDrawElements(GL_TRIANGLES, len(objList[selectedObjId].faces)*3, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+	glDrawElements(GL_TRIANGLES, count*3, GL_UNSIGNED_INT, ctypes.c_void_p(first*3*4))
 
 	if showWire:
 		glUniform3f(colorId, 0.0, 0.0, 0.0)
 		glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
 		glDepthRange(0.0, 1.0 - DEPTHEPS)
-		glDrawElements(GL_TRIANGLES, len(objList[selectedObjId].faces)*3, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+		glDrawElements(GL_TRIANGLES, count*3, GL_UNSIGNED_INT, ctypes.c_void_p(first*3*4))
 
 	glutSwapBuffers()
 
 def reshape(width, height):
-	global projMatrixId, projectMatrix
+	global projMatrixId, projectMatrix, windowHeight
 	glViewport(0, 0, width, height)
+	windowHeight = height
 	projectMatrix = constructPerspectiveMatrix(45.0, width/height, 0.1, 1000.0)
 	glUniformMatrix4fv(projMatrixId, 1, False, projectMatrix)
 	trackball.Resize(width, height, 45.0)
@@ -291,8 +418,8 @@ def keyboard(key, x, y):
 			tkey = True
 			texturing = not texturing
 	elif key == b'\x1b': sys.exit(0)
-	if selectedObjId > len(sys.argv) - 2: selectedObjId = len(sys.argv) - 2
-	glUniformMatrix4fv(scaleMatrixId, 1, False, scaleMatrices[selectedObjId])
+	if selectedObjId > len(objList) - 1: selectedObjId = len(objList) - 1
+	if selectedObjId >= 0: glUniformMatrix4fv(scaleMatrixId, 1, False, scaleMatrices[selectedObjId])
 	glUniform1i(lightingOnId, lighting)
 	glUniform1i(textureOnId, texturing)
 	glutPostRedisplay()
@@ -311,6 +438,8 @@ def mouseClick(button, state, x, y):
 	global viewport
 	mouseButton = button
 	mouseState = state
+	# back to the level of detail of the view once a drag ends
+	if state == GLUT_UP: glutPostRedisplay()
 	if button == GLUT_LEFT_BUTTON and state == GLUT_DOWN:
 		trackball.MousePress(Vector2D(x, y))
 	elif (mouseButton == GLUT_RIGHT_BUTTON or mouseButton == GLUT_MIDDLE_BUTTON) and mouseState == GLUT_DOWN:
@@ -361,8 +490,10 @@ glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGBA | GLUT_DEPTH)
 glutInitWindowSize(640, 480)
 glutInitContextVersion(4, 3)
 glutInitContextProfile(GLUT_CORE_PROFILE);
-glutCreateWindow(b'Narusaki\'s GLWindow')
+glutCreateWindow(WINDOW_TITLE.encode())
 initGL()
+threading.Thread(target=loadMeshes, args=(sys.argv[1:],), daemon=True).start()
+glutTimerFunc(UPLOAD_MS, pollLoads, 0)
 glutDisplayFunc(display)
 glutReshapeFunc(reshape)
 glutKeyboardFunc(keyboard)
@@ -1,9 +1,12 @@
 from math import sqrt, pi, cos, sin
+from MeshLib.Transform import TranslationMatrix, AxisAngleMatrix, TransformPoints
+import numpy
 
 class Vector2D:
 	'''
 	2D Vector class
 	'''
+	__slots__ = ('x', 'y')
 
 	def __init__(self, x0 = 0.0, y0 = 0.0):
 		self.x = float(x0)
@@ -79,6 +82,7 @@ class Vector3D:
 	'''
 	3D Vector class
 	'''
+	__slots__ = ('x', 'y', 'z')
 
 	def __init__(self, x0 = 0.0, y0 = 0.0, z0 = 0.0):
 		self.x = float(x0)
@@ -157,38 +161,22 @@ class Vector3D:
 
 def Shift(verts, v):
 	'''
-	Shift a group of vertices
+	Return a group of vertices shifted by v as new Vector3D, leaving verts unchanged;
+	see Transform for arrays of positions
 	'''
-	newVerts = verts[:]
-	for i in range(0, len(newVerts)):
-		for j in range(0, 3):
-			newVerts[i][j] += v[j]
-	return newVerts
+	return _transformed(TranslationMatrix((v[0], v[1], v[2])), verts)
 
 def Rotate(verts, ax, ay, az, angle):
 	'''
-	Rotate a group of the vertices
+	Return a group of vertices rotated by angle degrees around the axis (ax, ay, az)
+	as new Vector3D, leaving verts unchanged; see Transform for arrays of positions
 	'''
-	angle = angle / 180.0 * pi
-	c = cos(angle); s = sin(angle)
-	m = []
-	row = [c+(1-c)*ax*ax, (1-c)*ax*ay-s*az, (1-c)*ax*az+s*ay]
-	m.append(row)
-	row = [(1-c)*ay*ax+s*az, c+(1-c)*ay*ay, (1-c)*ay*az-s*ax]
-	m.append(row)
-	row = [(1-c)*az*ax-s*ay, (1-c)*az*ay+s*ax, c+(1-c)*az*az]
-	m.append(row)
-
-	newVerts = verts[:]
-
-	for i in range(0, len(newVerts)):
-		newV = Vector3D()
-		for j in range(0, 3):
-			newV[j] = 0.0
-			for k in range(0, 3):
-				newV[j] += m[j][k] * newVerts[i][k]
-		newVerts[i] = newV
-	return newVerts
+	return _transformed(AxisAngleMatrix((ax, ay, az), angle), verts)
+
+# the vertices (anything indexed by 0, 1, 2) transformed by a 4x4 matrix, as Vector3D
+def _transformed(matrix, verts):
+	positions = numpy.array([(p[0], p[1], p[2]) for p in verts], dtype=numpy.float64).reshape(-1, 3)
+	return [Vector3D(*p) for p in TransformPoints(matrix, positions).tolist()]
 
 if __name__ == '__main__':
 	v0 = Vector3D(1, 2, 3)
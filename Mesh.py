@@ -1,20 +1,93 @@
 from MeshLib.Geometry import *
+from MeshLib.MeshArrays import *
+from MeshLib.Topology import *
+from MeshLib.Normals import *
+from MeshLib.BVH import *
+from MeshLib.Transform import *
+from MeshLib.Decimate import *
+import numpy
+import heapq
+import logging
+import weakref
+import queue
+from array import array
+import traceback
 import MeshLib.utils.OBJMesh
 import MeshLib.utils.OFFMesh
 import MeshLib.utils.PLYMesh
 import MeshLib.utils.MMesh
+import MeshLib.utils.MLBMesh
+import MeshLib.utils.Parallel
+from MeshLib.utils.Instrument import Stage, Staged
+
+# progress messages and warnings, silenced or redirected like any logger
+_logger = logging.getLogger('MeshLib')
+
+# _MeshLink class, the link of the Vertex/Face objects of an object mode mesh back to it,
+# so that their derived fields are computed when read while pending, like the array mode views
+# fields:
+#     pending	---- the pending set of the mesh
+#     mesh	---- weak reference to the mesh, the objects do not keep it alive
+class _MeshLink:
+	__slots__ = ('pending', 'mesh')
+
+	def __init__(self, mesh):
+		self.pending = mesh.pending
+		self.mesh = weakref.ref(mesh)
+
+	def Derive(self, stage):
+		if stage not in self.pending: return
+		mesh = self.mesh()
+		if mesh is None: return
+		if stage == 'adjacency': mesh.edges
+		else: mesh.normals
 
 # Vertex class
 # fields: 
 #     pos	---- geometry position
 #     edges	---- adjacent edges
 #     isBoundary---- whether is a boundary vertex
+#     color	---- vertex color, white unless set; allocated when first read or set
+# edges and isBoundary are derived when read while the adjacency of the mesh is pending
 class Vertex:
+	__slots__ = ('pos', '__edges', '__isBoundary', '__color', '_link')
+
 	def __init__(self, point):
+		self._link = None
 		self.pos = point
-		self.edges = []
+		self.edges = ()
 		self.isBoundary = False
-		self.color = Vector3D(1.0, 1.0, 1.0)
+		self.__color = None
+
+	@property
+	def edges(self):
+		if self._link is not None: self._link.Derive('adjacency')
+		return self.__edges
+	@edges.setter
+	def edges(self, value):
+		self.__edges = _indexArray(value)
+
+	@property
+	def isBoundary(self):
+		if self._link is not None: self._link.Derive('adjacency')
+		return self.__isBoundary
+	@isBoundary.setter
+	def isBoundary(self, value):
+		self.__isBoundary = value
+
+	@property
+	def color(self):
+		if self.__color is None: self.__color = Vector3D(1.0, 1.0, 1.0)
+		return self.__color
+	@color.setter
+	def color(self, value):
+		self.__color = value
+
+	def HasColor(self):
+		'''
+		Whether the color was set or read, i.e. allocated
+		'''
+		return self.__color is not None
 	
 	def __getitem__(self, key):
 		return self.pos[key]
@@ -27,14 +100,49 @@ class Vertex:
 #     edges	---- adjacent edges
 #     normal	---- face normals
 #     area	---- face area
+# edges, normal and area are derived when read while the adjacency or normals of the mesh are pending
 class Face:
+	__slots__ = ('__verts', '__edges', '__normal', '__area', 'valid', '_link')
+
 	def __init__(self, vertList):
-		self.verts = vertList[:]
-		self.edges = list(range(0, 3))
+		self._link = None
+		self.verts = vertList
+		self.edges = range(0, 3)
 		self.normal = Vector3D()
 		self.area = 0.0
 		self.valid = True
 
+	@property
+	def verts(self):
+		return self.__verts
+	@verts.setter
+	def verts(self, value):
+		self.__verts = _indexArray(value)
+
+	@property
+	def edges(self):
+		if self._link is not None: self._link.Derive('adjacency')
+		return self.__edges
+	@edges.setter
+	def edges(self, value):
+		self.__edges = _indexArray(value)
+
+	@property
+	def normal(self):
+		if self._link is not None: self._link.Derive('normals')
+		return self.__normal
+	@normal.setter
+	def normal(self, value):
+		self.__normal = value
+
+	@property
+	def area(self):
+		if self._link is not None: self._link.Derive('normals')
+		return self.__area
+	@area.setter
+	def area(self, value):
+		self.__area = value
+
 	def __getitem__(self, key):
 		return self.verts[key]
 	def __setitem__(self, key, value):
@@ -49,20 +157,134 @@ class Face:
 #     idxAtVert	---- index at adjacent vertices's edge list
 #     isBoundary---- whether is a boundary edge
 class Edge:
+	__slots__ = ('__verts', '__faces', '__idxAtVert', 'isBoundary', 'valid')
+
 	def __init__(self, vertPair):
-		self.verts = vertPair[:]
-		self.faces = [-1, -1]
-		self.idxAtVert = [-1, -1]
+		self.verts = vertPair
+		self.faces = (-1, -1)
+		self.idxAtVert = (-1, -1)
 		self.isBoundary = False
 		self.valid = True
 
+	@property
+	def verts(self):
+		return self.__verts
+	@verts.setter
+	def verts(self, value):
+		self.__verts = _indexArray(value)
+
+	@property
+	def faces(self):
+		return self.__faces
+	@faces.setter
+	def faces(self, value):
+		self.__faces = _indexArray(value)
+
+	@property
+	def idxAtVert(self):
+		return self.__idxAtVert
+	@idxAtVert.setter
+	def idxAtVert(self, value):
+		self.__idxAtVert = _indexArray(value)
+
 	def __getitem__(self, key):
 		return self.verts[key]
 	def __setitem__(self, key, value):
 		self.verts[key] = value
 
-class Mesh:
+# index lists of the objects are kept as compact arrays of C ints, a copy of the given values
+def _indexArray(values):
+	return array('i', values)
+
+# RepairReport class
+# fields:
+#     removedFaces	---- faces removed by RemoveNonManifoldness, in removal order
+#     invalidEdges	---- number of edges left without any face
+#     splitVerts	---- (original vertex, new vertex) pairs created by splitting non-manifold vertices
+#     vertMap	---- new index of every old vertex after WeldVertices, None otherwise
+class RepairReport:
 	def __init__(self):
+		self.removedFaces = []
+		self.invalidEdges = 0
+		self.splitVerts = []
+		self.vertMap = None
+
+	def __str__(self):
+		if self.vertMap is not None:
+			return 'Welded %d vertices into %d, removed %d degenerate faces.' % \
+				(len(self.vertMap), 0 if len(self.vertMap) == 0 else int(self.vertMap.max()) + 1, len(self.removedFaces))
+		return 'Removed %d non-manifold faces, %d edges became invalid, split %d non-manifold vertices.' % \
+			(len(self.removedFaces), self.invalidEdges, len(self.splitVerts))
+
+# MeshChunk class, a piece of a mesh yielded by the streaming readers (see utils/MeshStream)
+# fields:
+#     vertStart	---- index of the chunk's first vertex in the mesh
+#     positions	---- Nx3 vertex positions
+#     normals	---- Nx3 vertex normals, None if not given
+#     textures	---- Nx2 texture coordinates, None if not given
+#     colors	---- Nx3 vertex colors, None if not given
+#     faceFirst	---- index of the chunk's first face in the mesh
+#     faceStart	---- F+1 offsets of the faces into faceVerts
+#     faceVerts	---- face corners as 0-based vertex indices of the mesh
+class MeshChunk:
+	def __init__(self, vertStart = 0, faceFirst = 0):
+		self.vertStart = vertStart
+		self.positions = numpy.zeros((0, 3), dtype=REAL_TYPE)
+		self.normals = None
+		self.textures = None
+		self.colors = None
+		self.faceFirst = faceFirst
+		self.faceStart = numpy.zeros(1, dtype=numpy.int64)
+		self.faceVerts = numpy.zeros(0, dtype=numpy.int64)
+
+	def NumVerts(self):
+		return len(self.positions)
+	def NumFaces(self):
+		return len(self.faceStart) - 1
+
+# report info of the instrumented Mesh stages (see utils/Instrument); the edge count is
+# read only once the edges are built, None before, so that reporting does not build them
+def _meshInfo(mesh, *args, **kwargs):
+	edges = None
+	if mesh.useArrays:
+		if mesh.arrays is not None and 'adjacency' not in mesh.arrays.pending and mesh.arrays.edgeTable is not None:
+			edges = len(mesh.arrays.edgeTable.verts)
+	elif 'adjacency' not in mesh.pending and len(mesh.edges) != 0: edges = len(mesh.edges)
+	return dict(verts = len(mesh.verts), faces = len(mesh.faces), edges = edges)
+
+def _fileInfo(mesh, fileName, *args, **kwargs):
+	info = _meshInfo(mesh)
+	info['file'] = fileName
+	return info
+
+# Mesh class
+# fields:
+#     useArrays	---- whether the mesh is stored as numpy arrays (see MeshArrays);
+#                    verts/faces/normals/textures are then light views over the arrays
+#     arrays	---- the MeshArrays storage in array mode, None otherwise
+#     halfEdges	---- cached half-edge connectivity, see HalfEdges()
+#     csrAdjacency	---- cached CSR adjacency, see CSRAdjacency()
+#     vertFaces	---- (indptr, indices) vertex-face adjacency of the incremental updates (object mode),
+#                    built with the adjacency (array mode keeps it in arrays.vertFaces)
+#     bvh	---- cached face BVH, see BVH()
+#     edits	---- count of MarkMoved and Invalidate calls in object mode (arrays.edits in array mode)
+#     pending	---- derived attributes not computed yet in object mode, among 'adjacency', 'normals'
+#                    and 'bbox' (array mode keeps them in arrays.pending); see LoadMesh(lazy) and Invalidate()
+#     givenNormals	---- whether the vertex normals were loaded rather than computed (object mode)
+#     weighting	---- the weighting vertex normals were last computed with (object mode)
+#     moved	---- vertices moved since the pending 'normals' and 'bbox' were computed (object mode), see MarkMoved()
+# edges, normals, center and scale are computed when read while pending.
+class Mesh:
+	def __init__(self, useArrays = False):
+		self.useArrays = useArrays
+		self.arrays = None
+		self.pending = set()
+		self.__link = _MeshLink(self)
+		self.moved = dict()
+		# (vMin, vMax, minVert, maxVert) of the last bounding box, minVert/maxVert being its extreme vertices
+		self.__bounds = None
+		self.givenNormals = False
+		self.weighting = 'area'
 		self.verts = []
 		self.faces = []
 		self.edges = []
@@ -72,227 +294,808 @@ class Mesh:
 		self.center = Vector3D()
 		self.scale = 1.0
 		self.mtllibFile = 'texture.mtl'
+		self.halfEdges = None
+		self.csrAdjacency = None
+		self.vertFaces = None
+		self.bvh = None
+		self.edits = 0
+		self.__bvhEdits = 0
 
-	def LoadMesh(self, fileName, rmReduntVerts = False, constructAdjacency = True):
+	@property
+	def edges(self):
+		if self.__stale('adjacency'): self.__construct()
+		if self.useArrays and self.arrays is not None:
+			# the arrays may have rebuilt their edge table by themselves
+			table = self.arrays.edgeTable
+			if table is None: return []
+			if not isinstance(self.__edges, EdgeList) or self.__edges.table is not table: self.__edges = EdgeList(table)
+		return self.__edges
+	@edges.setter
+	def edges(self, value):
+		self.__edges = value
+
+	@property
+	def normals(self):
+		if self.__stale('normals'): self.__deriveNormals()
+		if self.useArrays and self.arrays is not None:
+			normals = self.arrays.normals
+			if normals is None: return []
+			if not isinstance(self.__normals, VectorList) or self.__normals.array is not normals: self.__normals = VectorList(normals)
+		return self.__normals
+	@normals.setter
+	def normals(self, value):
+		self.__normals = value
+
+	@property
+	def center(self):
+		if self.__stale('bbox'): self.__calcBoundingBox()
+		return self.__center
+	@center.setter
+	def center(self, value):
+		self.__center = value
+
+	@property
+	def scale(self):
+		if self.__stale('bbox'): self.__calcBoundingBox()
+		return self.__scale
+	@scale.setter
+	def scale(self, value):
+		self.__scale = value
+
+	@Staged('load', _fileInfo)
+	def LoadMesh(self, fileName, rmReduntVerts = False, constructAdjacency = True, useCache = False, workers = 1, lazy = False):
 		'''
 		Load mesh
+		With useCache the loaded mesh, its adjacency and normals are kept in a .mlb
+		sidecar cache (see utils/MLBMesh) that is used while the source file is unchanged.
+		With workers > 1 .obj, .off and .m files are parsed in parallel by that many processes.
+		With lazy, adjacency, normals and bounding box are computed when first read
+		rather than while loading; the per-vertex and per-face fields (edges, isBoundary,
+		normal, area) are computed as well when first read from any vertex or face.
 		'''
-		self.__init__()
+		self.__init__(self.useArrays)
 		suffix = fileName[fileName.rfind('.'):].lower()
-		if suffix == '.obj': 
-			(self.verts, self.faces, self.normals, self.textures, self.lines, self.mtllibFile) = MeshLib.utils.OBJMesh.LoadOBJFile(fileName, rmReduntVerts)
-		elif suffix == '.off': 
-			(self.verts, self.faces, self.normals, self.textures, self.lines) = MeshLib.utils.OFFMesh.LoadOFFFile(fileName, rmReduntVerts)
-		elif suffix == '.ply':
-			(self.verts, self.faces, self.normals, self.textures, self.lines) = MeshLib.utils.PLYMesh.LoadPLYFile(fileName, rmReduntVerts)
-		elif suffix == '.m':
-			(self.verts, self.faces, self.normals, self.textures, self.lines) = MeshLib.utils.MMesh.LoadMFile(fileName, rmReduntVerts)
-		# construct adjacency
-		if constructAdjacency: self.__construct()
-		self.__calcNormals()
-		# calculate bounding box
-		vMax = Vector3D(-1e30, -1e30, -1e30)
-		vMin = Vector3D(1e30, 1e30, 1e30)
-		for v in self.verts:
-			for i in range(0, 3):
-				vMax[i] = max(vMax[i], v[i])
-				vMin[i] = min(vMin[i], v[i])
-		self.center = (vMax + vMin) / 2.0
-		self.scale = -1.0
-		for i in range(0, 3):
-			self.scale = max(self.scale, vMax[i] - vMin[i])
-		self.scale = 1.0 / self.scale
+		cacheKey = None
+		if useCache and suffix != '.mlb':
+			cacheKey = MeshLib.utils.MLBMesh.CacheKey(fileName, rmReduntVerts, self.useArrays)
+			cached = MeshLib.utils.MLBMesh.LoadMLBCache(fileName, cacheKey)
+			if cached is not None:
+				self.__loadFields(cached[0], cached[1], constructAdjacency)
+				return
+		if suffix == '.mlb':
+			(fields, info) = MeshLib.utils.MLBMesh.LoadMLBFile(fileName)
+			self.__loadFields(fields, info, constructAdjacency)
+			return
+		self.__parse(fileName, suffix, rmReduntVerts, workers)
+
+		if lazy:
+			stale = {'normals', 'bbox'} | ({'adjacency'} if constructAdjacency else set())
+			(self.arrays.pending if self.useArrays else self.pending).update(stale)
+		else:
+			# construct adjacency
+			if constructAdjacency: self.__construct()
+			self.__calcNormals()
+			# calculate bounding box
+			self.__calcBoundingBox()
+		if cacheKey is not None:
+			with Stage('cache'):
+				(fields, info) = self.__saveFields()
+				MeshLib.utils.MLBMesh.SaveMLBCache(fileName, cacheKey, fields, info)
 	
-	def SaveMesh(self, fileName):
+	@Staged('save', _fileInfo)
+	def SaveMesh(self, fileName, plyFormat = 'ascii', precision = 6, workers = 1):
 		'''
-		Save mesh
+		Save mesh, plyFormat being 'ascii', 'binary_little_endian' or 'binary_big_endian'.
+		Text formats are written with precision decimals; with workers > 1 the text
+		is formatted by that many processes.
 		'''
+		# normals and textures are optional, only a partial list is worth a warning
 		nVert = len(self.verts)
 		nNorm = len(self.normals)
 		nTex = len(self.textures)
-		if nVert != nNorm: print('Warnning: nVert != nNorm')
-		if nVert != nTex: print('Warnning: nVert != nTex')
-		if nNorm != nTex: print('Warnning: nNorm != nTex')
+		if nNorm != 0 and nNorm != nVert: _logger.warning('%d normals for %d vertices.', nNorm, nVert)
+		if nTex != 0 and nTex != nVert: _logger.warning('%d texture coordinates for %d vertices.', nTex, nVert)
 	
 		suffix = fileName[fileName.rfind('.'):].lower()
-		if suffix == '.obj': MeshLib.utils.OBJMesh.SaveOBJFile(fileName, self.verts, self.faces, self.lines, self.normals, self.textures)
-		elif suffix == '.off': MeshLib.utils.OFFMesh.SaveOFFFile(fileName, self.verts, self.faces, self.normals, self.textures)
-		elif suffix == '.ply': MeshLib.utils.PLYMesh.SavePLYFile(fileName, self.verts, self.faces, self.normals, self.textures)
-		elif suffix == '.m': MeshLib.utils.MMesh.SaveMFile(fileName, self.verts, self.faces, self.normals, self.textures)
+		with Stage('gather'):
+			if suffix in ('.obj', '.off', '.ply', '.m'):
+				if self.useArrays:
+					arrays = self.arrays
+					(positions, normals, textures, faceValid) = (arrays.positions, arrays.normals, arrays.textures, arrays.faceValid)
+					(faceStart, faceVerts) = TriangleCorners(arrays.faces)
+				else:
+					(positions, normals, textures) = (VectorArray(self.verts, 3), VectorArray(self.normals, 3), VectorArray(self.textures, 2))
+					(faceStart, faceVerts) = self.__faceCorners()
+					faceValid = numpy.fromiter((f.valid for f in self.faces), dtype=bool, count=len(self.faces))
+			elif suffix == '.mlb':
+				(fields, info) = self.__saveFields()
+		with Stage('write', format = suffix):
+			if suffix == '.obj':
+				MeshLib.utils.OBJMesh.WriteOBJ(fileName, positions, faceStart, faceVerts, normals, textures, self.lines, faceValid, precision, workers)
+			elif suffix == '.off': MeshLib.utils.OFFMesh.WriteOFF(fileName, positions, faceStart, faceVerts, textures, precision, workers)
+			elif suffix == '.ply':
+				MeshLib.utils.PLYMesh.WritePLY(fileName, positions, faceStart, faceVerts, normals, textures, plyFormat, None, precision, workers)
+			elif suffix == '.m': MeshLib.utils.MMesh.WriteM(fileName, positions, faceStart, faceVerts, textures, precision, workers)
+			elif suffix == '.mlb': MeshLib.utils.MLBMesh.SaveMLBFile(fileName, fields, info)
 	
-	def RemoveNonManifoldness(self):
+	@Staged('repair', _meshInfo)
+	def RemoveNonManifoldness(self, splitVertices = False):
+		'''
+		Remove faces until no edge is shared by more than two faces, the faces on
+		most non-manifold edges first. Removed faces are kept but marked invalid.
+		If splitVertices, also split vertices whose faces form several fans; this
+		drops the invalid faces from the face list and rebuilds adjacency.
+		Return a RepairReport.
+		'''
+		report = RepairReport()
 		# statistic how "non-manifold" each face can be
-		faceCited = [0 for i in range(0, len(self.faces))]
-		for e in self.edges:
-			if len(e.faces) < 3: continue
-			for fi in e.faces:
-				faceCited[fi] += 1
+		faceCited = dict()
+		for ei in self.__nonManifoldEdges():
+			for fi in self.edges[ei].faces:
+				faceCited[fi] = faceCited.get(fi, 0) + 1
+		# bucket queue on the cited times; a face's cited times only decrease, so does the max bucket.
+		# each bucket is a heap, so that the lowest face index is removed first among equally cited ones
+		maxCited = max(faceCited.values()) if len(faceCited) != 0 else 0
+		buckets = [[] for i in range(0, maxCited+1)]
+		for fi in sorted(faceCited.keys()):
+			buckets[faceCited[fi]].append(fi)
 		# looping to erase the current "worst" face each iteration untill no non-mainofld face exists
-		while True:
-			fId = -1; maxCited = -1
-			for i in range(0, len(faceCited)):
-				if faceCited[i] <= maxCited: continue
-				maxCited = faceCited[i]
-				fId = i
-			if maxCited == 0: break
+		while maxCited > 0:
+			if len(buckets[maxCited]) == 0:
+				maxCited -= 1
+				continue
+			fId = heapq.heappop(buckets[maxCited])
+			# stale entry of a face whose cited times have decreased
+			if faceCited[fId] != maxCited: continue
 			# removing face fId
-			print('Removing non-manifold face %d, cited times: %d' % (fId, maxCited))
+			report.removedFaces.append(fId)
 			self.faces[fId].valid = False
 			faceCited[fId] = 0
 			for ei in self.faces[fId].edges:
-				newFaces = [f for f in self.edges[ei].faces if f != fId]
-				self.edges[ei].faces = newFaces
+				oldFaces = [f for f in self.edges[ei].faces if f != -1]
+				newFaces = [f for f in oldFaces if f != fId]
+				self.edges[ei].faces = (newFaces + [-1, -1])[:max(2, len(newFaces))]
 				# if a non-manifold edge becomes a manifold edge
-				if len(newFaces) == 2:
+				if len(oldFaces) == 3 and len(newFaces) == 2:
 					for fi in newFaces:
 						assert faceCited[fi] > 0
 						faceCited[fi] -= 1
+						# decrease-key: re-insert into the lower bucket
+						if faceCited[fi] != 0: heapq.heappush(buckets[faceCited[fi]], fi)
+				elif len(newFaces) == 1:
+					self.edges[ei].isBoundary = True
 				elif len(newFaces) == 0:
 					self.edges[ei].valid = False
+					report.invalidEdges += 1
+		if len(report.removedFaces) != 0: self.bvh = None
+		if splitVertices: self.__splitNonManifoldVerts(report)
+		return report
+
+	def WeldVertices(self, epsilon):
+		'''
+		Merge vertices closer than epsilon, also through chains of close vertices, into
+		the first vertex of each cluster, which keeps its normal, texture coordinates and
+		color. Faces and lines are remapped; faces left with fewer than three distinct
+		corners are dropped (removedFaces of the report), and so are the corners of a
+		polygon that collapse onto their neighbour. Return a RepairReport.
+		'''
+		report = RepairReport()
+		nVert = len(self.verts)
+		# read before the faces change, pending normals are computed on the old faces
+		hasNormals = len(self.normals) == nVert
+		hasTextures = len(self.textures) == nVert
+		positions = self.arrays.positions if self.useArrays else VectorArray(self.verts, 3)
+		(keep, realIndex) = WeldPositions(positions, epsilon)
+		(faceStart, faceVerts) = self.__faceCorners()
+		(faceStart, faceVerts, kept) = RemapFaces(faceStart, faceVerts, realIndex)
+		report.removedFaces = numpy.flatnonzero(~kept).tolist()
+		report.vertMap = realIndex
+		indexList = realIndex.tolist()
+		self.lines = [[indexList[vi] for vi in l] for l in self.lines]
+		if self.useArrays:
+			for field in ('positions', 'normals', 'textures', 'colors'):
+				array = getattr(self.arrays, field)
+				if array is None or len(array) != nVert: continue
+				setattr(self.arrays, field, array[keep])
+			self.arrays.faces = faceVerts.astype(INDEX_TYPE).reshape(-1, 3)
+			self.arrays.faceValid = self.arrays.faceValid[kept]
+			self.__bindArrays()
+		else:
+			keepList = keep.tolist()
+			self.verts = [self.verts[vi] for vi in keepList]
+			if hasNormals: self.normals = [self.normals[vi] for vi in keepList]
+			if hasTextures: self.textures = [self.textures[vi] for vi in keepList]
+			self.faces = [f for (f, k) in zip(self.faces, kept.tolist()) if k]
+			faceVertList = faceVerts.tolist(); starts = faceStart.tolist()
+			for fi in range(0, len(self.faces)):
+				self.faces[fi].verts = faceVertList[starts[fi]:starts[fi+1]]
+		self.Invalidate(True, True)
+		return report
 
+	def Decimate(self, targetFaces = None, maxError = None, progress = None):
+		'''
+		Simplify the mesh by quadric error edge collapses (see Decimate) until at most
+		targetFaces faces are left or the next collapse would cost more than maxError.
+		Boundary and non-manifold edges (Edge.isBoundary, edges of more than two faces)
+		are kept, texture coordinates are interpolated and vertex colors kept; polygons
+		are triangulated, invalid faces dropped and vertex normals recomputed.
+		progress(nFaces) is called as faces are removed. Return the largest collapse error.
+		'''
+		nVert = len(self.verts)
+		hasTextures = len(self.textures) == nVert
+		(faceStart, faceVerts) = self.__faceCorners()
+		faces = faceVerts[FanTriangulate(faceStart)].reshape(-1, 3)
+		valid = self.arrays.faceValid if self.useArrays else numpy.array([f.valid for f in self.faces], dtype=bool)
+		faces = faces[numpy.repeat(valid, numpy.maximum(numpy.diff(faceStart) - 2, 0))]
+		# the vertices of the boundary and non-manifold edges stay in place
+		locked = None
+		if len(self.edges) != 0:
+			table = self.arrays.edgeTable if self.useArrays else self.__objectEdgeTable()
+			nonManifold = numpy.zeros(len(table.verts), dtype=bool)
+			nonManifold[list(table.extraFaces.keys())] = True
+			locked = numpy.zeros(nVert, dtype=bool)
+			locked[table.verts[(table.isBoundary | nonManifold) & table.valid].ravel()] = True
+		positions = self.arrays.positions if self.useArrays else VectorArray(self.verts, 3)
+		textures = (self.arrays.textures if self.useArrays else VectorArray(self.textures, 2)) if hasTextures else None
+		decimator = QuadricDecimator(positions, faces, textures, locked)
+		decimator.Collapse(targetFaces, maxError, progress)
+		(positions, faces, textures, keep, vertMap) = decimator.Result()
+		indexList = vertMap.tolist()
+		self.lines = [[indexList[vi] for vi in l] for l in self.lines]
+		if self.useArrays:
+			colors = None if self.arrays.colors is None else self.arrays.colors[keep]
+			weighting = self.arrays.weighting
+			self.arrays = MeshArrays(positions, faces, None, textures, colors)
+			self.arrays.weighting = weighting
+			self.__bindArrays()
+		else:
+			verts = [self.verts[vi] for vi in keep.tolist()]
+			for (v, p) in zip(verts, positions.tolist()): v.pos = Vector3D(*p)
+			self.verts = verts
+			self.faces = [Face(f) for f in faces.tolist()]
+			self.textures = [] if textures is None else [Vector2D(*t) for t in textures.tolist()]
+			self.normals = []
+			self.givenNormals = False
+			self.__linkObjects()
+		self.Invalidate(True, True)
+		return decimator.maxError
+
+	def Transform(self, matrix):
+		'''
+		Transform the mesh in place by a 4x4 affine matrix (see Transform): positions by
+		the matrix, face and vertex normals by its inverse-transpose (reversed by a mirroring
+		matrix, which reverses the face winding), face areas by the area change. Computed
+		vertex normals are recalculated instead when the matrix does not keep angles. The
+		bounding box is recomputed.
+		'''
+		matrix = numpy.asarray(matrix, dtype=numpy.float64)
+		if self.__stale('normals'): self.__deriveNormals()
+		owner = self.arrays if self.useArrays else self
+		if self.useArrays:
+			(positions, normals) = (self.arrays.positions, self.arrays.normals)
+			(faceNormals, faceAreas) = (self.arrays.faceNormals, self.arrays.faceAreas)
+		else:
+			(positions, normals) = (VectorArray(self.verts, 3), VectorArray(self.normals, 3))
+			faceNormals = VectorArray([f.normal for f in self.faces], 3)
+			faceAreas = numpy.array([f.area for f in self.faces], dtype=REAL_TYPE)
+		TransformPoints(matrix, positions, out=positions)
+		# a face's area scales with the determinant and the stretch of its normal
+		stretch = numpy.sqrt(((faceNormals @ NormalMatrix(matrix).T) ** 2).sum(axis=1))
+		faceAreas *= abs(numpy.linalg.det(matrix[:3, :3])) * stretch
+		# the normals of the winding point against the inverse-transpose ones after a mirroring
+		orientation = numpy.sign(numpy.linalg.det(matrix[:3, :3]))
+		TransformNormals(matrix, faceNormals, out=faceNormals)
+		faceNormals *= orientation
+		recalc = not owner.givenNormals and not IsSimilarity(matrix)
+		if normals is not None and not recalc:
+			TransformNormals(matrix, normals, out=normals)
+			normals *= orientation
+		if not self.useArrays:
+			for (v, p) in zip(self.verts, positions.tolist()): v.pos = Vector3D(*p)
+			for (f, n, a) in zip(self.faces, faceNormals.tolist(), faceAreas.tolist()):
+				(f.normal, f.area) = (Vector3D(*n), a)
+			if not recalc: self.normals = [Vector3D(*n) for n in normals.tolist()]
+		if recalc: self.__calcNormals(owner.weighting, False)
+		owner.edits += 1
+		owner.moved.pop('bbox', None)
+		self.__calcBoundingBox()
+
+	def CalcNormals(self, weighting = 'area'):
+		'''
+		(Re)calculate face normals, face areas and vertex normals.
+		weighting: 'area', 'angle' or 'uniform' weights of the faces around a vertex
+		'''
+		self.__calcNormals(weighting, False)
+
+	def Invalidate(self, geometry = True, topology = False):
+		'''
+		Mark normals and bounding box as stale after the positions were changed (geometry),
+		normals and adjacency after the faces were changed (topology); they are recomputed
+		when next read. Loaded vertex normals are kept.
+		In array mode writes through the vertex and face views invalidate by themselves.
+		'''
+		if topology:
+			self.halfEdges = None
+			self.csrAdjacency = None
+			self.vertFaces = None
+			self.bvh = None
+		if self.useArrays:
+			self.arrays.Invalidate(geometry, topology)
+			return
+		self.edits += 1
+		stages = set()
+		if geometry: stages.update(('normals', 'bbox'))
+		if topology: stages.update(('adjacency', 'normals'))
+		self.pending.update(stages)
+		for stage in stages: self.moved.pop(stage, None)
+
+	def MarkMoved(self, verts):
+		'''
+		Mark normals and bounding box as stale after the vertices verts were moved. When
+		next read, or on Refresh(), only the face normals and areas around them, the vertex
+		normals of those faces and, if a moved vertex bounded it, the bounding box are updated.
+		In array mode writes through the vertex views mark by themselves.
+		'''
+		if self.useArrays:
+			self.arrays.MarkMoved(verts)
+			return
+		self.edits += 1
+		for stage in ('normals', 'bbox'):
+			if stage not in self.pending:
+				self.pending.add(stage)
+				self.moved[stage] = set()
+			if stage in self.moved: self.moved[stage].update(verts)
+
+	def Refresh(self):
+		'''
+		Update stale normals, face areas and bounding box now
+		'''
+		if self.__stale('normals'): self.__deriveNormals()
+		if self.__stale('bbox'): self.__calcBoundingBox()
+
+	def HalfEdges(self):
+		'''
+		Return the half-edge connectivity (Topology.HalfEdgeMesh) of the mesh, built on first call
+		'''
+		if self.halfEdges is None:
+			(faceStart, faceVerts) = self.__faceCorners()
+			self.halfEdges = HalfEdgeMesh(faceStart, faceVerts, len(self.verts))
+		return self.halfEdges
+
+	def CSRAdjacency(self):
+		'''
+		Return vertex-vertex, vertex-face and face-face adjacency as CSR arrays
+		(Topology.CSRAdjacency), built from the faces on first call
+		'''
+		if self.csrAdjacency is None:
+			(faceStart, faceVerts) = self.__faceCorners()
+			self.csrAdjacency = CSRAdjacency(faceStart, faceVerts, len(self.verts))
+		return self.csrAdjacency
+
+	def BVH(self):
+		'''
+		Return the bounding volume hierarchy (BVH.BVH) of the valid faces, for ray casting,
+		closest-point and box queries; built on first call and again after the mesh
+		was edited (see MarkMoved and Invalidate)
+		'''
+		edits = self.arrays.edits if self.useArrays else self.edits
+		if self.bvh is None or self.__bvhEdits != edits:
+			(faceStart, faceVerts) = self.__faceCorners()
+			if self.useArrays: (positions, faceValid) = (self.arrays.positions, self.arrays.faceValid)
+			else: (positions, faceValid) = (VectorArray(self.verts, 3), [f.valid for f in self.faces])
+			self.bvh = BVH(positions, faceStart, faceVerts, faceValid)
+			self.__bvhEdits = edits
+		return self.bvh
+
+	def ToFields(self):
+		'''
+		Return the mesh, its adjacency and normals as (dict of numpy arrays, dict of info strings),
+		the contents of a .mlb file
+		'''
+		return self.__saveFields()
+
+	def FromFields(self, fields, info, constructAdjacency = True):
+		'''
+		Set the mesh from the result of ToFields; in array mode the arrays are used without copying
+		'''
+		self.__init__(self.useArrays)
+		self.__loadFields(fields, info, constructAdjacency)
+
+	# flat corner list (faceStart, faceVerts) of the faces
+	def __faceCorners(self):
+		if self.useArrays: return TriangleCorners(self.arrays.faces)
+		return PolygonCorners(self.faces)
+
+	# indices of the edges shared by at least three faces
+	def __nonManifoldEdges(self):
+		if self.useArrays: return sorted(self.arrays.edgeTable.extraFaces.keys())
+		return [ei for ei in range(0, len(self.edges)) if len(self.edges[ei].faces) >= 3]
+
+	# split non-manifold vertices of the valid faces, then rebuild adjacency
+	def __splitNonManifoldVerts(self, report):
+		nVert = len(self.verts)
+		# read before the faces change, pending normals are computed on the old faces
+		hasNormals = len(self.normals) == nVert
+		hasTextures = len(self.textures) == nVert
+		# drop the invalid faces
+		if self.useArrays:
+			valid = self.arrays.faceValid
+			self.arrays.faces = self.arrays.faces[valid]
+			self.arrays.faceNormals = self.arrays.faceNormals[valid]
+			self.arrays.faceAreas = self.arrays.faceAreas[valid]
+			self.arrays.faceValid = self.arrays.faceValid[valid]
+		else:
+			self.faces = [f for f in self.faces if f.valid]
+		(faceStart, faceVerts) = self.__faceCorners()
+		(newFaceVerts, sourceVert) = SplitNonManifoldVerts(faceStart, faceVerts, nVert)
+		sourceList = sourceVert.tolist()
+		report.splitVerts = [(sourceList[i], nVert+i) for i in range(0, len(sourceList))]
+		# duplicate the split vertices with their attributes
+		if self.useArrays:
+			self.arrays.faces = newFaceVerts.astype(INDEX_TYPE).reshape(-1, 3)
+			for field in ('positions', 'normals', 'textures', 'colors'):
+				array = getattr(self.arrays, field)
+				if array is None or len(array) != nVert: continue
+				setattr(self.arrays, field, numpy.concatenate((array, array[sourceVert])))
+			self.__bindArrays()
+		else:
+			faceVertList = newFaceVerts.tolist(); starts = faceStart.tolist()
+			for fi in range(0, len(self.faces)):
+				self.faces[fi].verts = faceVertList[starts[fi]:starts[fi+1]]
+			for vi in sourceList:
+				p = self.verts[vi].pos
+				v = Vertex(Vector3D(p.x, p.y, p.z))
+				if self.verts[vi].HasColor():
+					c = self.verts[vi].color
+					v.color = Vector3D(c.x, c.y, c.z)
+				v._link = self.__link
+				self.verts.append(v)
+				if hasNormals:
+					n = self.normals[vi]
+					self.normals.append(Vector3D(n.x, n.y, n.z))
+				if hasTextures:
+					t = self.textures[vi]
+					self.textures.append(Vector2D(t.x, t.y))
+		self.halfEdges = None
+		self.csrAdjacency = None
+		self.vertFaces = None
+		self.bvh = None
+		if self.useArrays: self.arrays.vertFaces = None
+		self.edges = []
+		self.__construct()
+
+	# (re)bind the list-like views to the arrays in array mode
+	def __bindArrays(self):
+		self.verts = VertexList(self.arrays)
+		self.faces = FaceList(self.arrays)
+		self.normals = [] if self.arrays.normals is None else VectorList(self.arrays.normals)
+		self.textures = [] if self.arrays.textures is None else VectorList(self.arrays.textures)
+
+	# whether a derived attribute is pending
+	def __stale(self, stage):
+		return stage in self.pending or (self.arrays is not None and stage in self.arrays.pending)
+
+	# read a mesh file, the parse stage of LoadMesh
+	@Staged('parse', _meshInfo)
+	def __parse(self, fileName, suffix, rmReduntVerts, workers):
+		if self.useArrays and suffix == '.obj':
+			(self.arrays, self.lines, self.mtllibFile) = MeshLib.utils.OBJMesh.LoadOBJArrays(fileName, rmReduntVerts, workers = workers)
+		elif self.useArrays and suffix == '.ply':
+			(self.arrays, self.lines) = MeshLib.utils.PLYMesh.LoadPLYArrays(fileName, rmReduntVerts)
+		elif self.useArrays and suffix == '.off':
+			(self.arrays, self.lines) = MeshLib.utils.OFFMesh.LoadOFFArrays(fileName, rmReduntVerts, workers)
+		elif self.useArrays and suffix == '.m':
+			(self.arrays, self.lines) = MeshLib.utils.MMesh.LoadMArrays(fileName, rmReduntVerts, workers)
+		elif suffix == '.obj': 
+			(self.verts, self.faces, self.normals, self.textures, self.lines, self.mtllibFile) = MeshLib.utils.OBJMesh.LoadOBJFile(fileName, rmReduntVerts, workers)
+		elif suffix == '.off': 
+			(self.verts, self.faces, self.normals, self.textures, self.lines) = MeshLib.utils.OFFMesh.LoadOFFFile(fileName, rmReduntVerts, workers)
+		elif suffix == '.ply':
+			(self.verts, self.faces, self.normals, self.textures, self.lines) = MeshLib.utils.PLYMesh.LoadPLYFile(fileName, rmReduntVerts)
+		elif suffix == '.m':
+			(self.verts, self.faces, self.normals, self.textures, self.lines) = MeshLib.utils.MMesh.LoadMFile(fileName, rmReduntVerts, workers)
+		if self.useArrays:
+			if self.arrays is None:
+				self.arrays = MeshArrays.FromObjects(self.verts, self.faces, self.normals, self.textures)
+			self.__bindArrays()
+		else:
+			self.givenNormals = len(self.normals) != 0
+			self.__linkObjects()
+
+	# link the Vertex/Face objects to the mesh, so that their pending fields are derived when read (object mode)
+	def __linkObjects(self):
+		for v in self.verts: v._link = self.__link
+		for f in self.faces: f._link = self.__link
 
 	# constructing adjacent structure
 	def __construct(self):
-		print('Constructing...')
-		for fIndex in range(0, len(self.faces)):
-			f = self.faces[fIndex]
-			for i in range(0, len(f)):
-				v0 = f[i]; v1 = f[(i+1)%len(f)]
-				# check if edge has already existed
-				existEdge = -1
-
-				for edgeIndex in self.verts[v0].edges:
-					edge = self.edges[edgeIndex]
-					if edge[0] == v0 and edge[1] == v1 or edge[0] == v1 and edge[1] == v0:
-						existEdge = edgeIndex
-						break
-
-				if existEdge != -1:
-					# edgeIndex = existEdge
-					# assert self.edges[edgeIndex].faces[1] == -1, \
-					# 		'Non-manifold edge found! At least three faces (%d, %d, %d) share a common edge.' % \
-					# 		(self.edges[edgeIndex].faces[0], self.edges[edgeIndex].faces[1], fIndex)
-					# self.edges[edgeIndex].faces[1] = fIndex
-					edgeIndex = existEdge
-					if self.edges[edgeIndex].faces[1] != -1:
-						print('Non-manifold edge found! At least three faces (%d, %d, %d) share a common edge.' % \
-							(self.edges[edgeIndex].faces[0], self.edges[edgeIndex].faces[1], fIndex))
-						self.edges[edgeIndex].faces.append(fIndex)
-					else:
-						self.edges[edgeIndex].faces[1] = fIndex
+		with Stage('construct') as stage:
+			self.pending.discard('adjacency')
+			_logger.info('Constructing...')
+			if self.useArrays:
+				table = self.arrays.ConstructAdjacency()
+				self.edges = EdgeList(table)
+			else:
+				(faceStart, faceVerts) = self.__faceCorners()
+				table = BuildEdgeTable(faceStart, faceVerts, len(self.verts))
+				self.__bindEdgeTable(table, faceStart, faceVerts)
+			if len(table.extraFaces) != 0:
+				_logger.warning('Non-manifold edge found! %d edges are shared by at least three faces.', len(table.extraFaces))
+			stage.Info(nonManifoldEdges = len(table.extraFaces), **_meshInfo(self))
 
-				else:
-					edgeIndex = len(self.edges)
-					curEdge = Edge((v0, v1))
-					curEdge.faces[0] = fIndex
-					self.edges.append(curEdge)
-					self.verts[v0].edges.append(edgeIndex)
-					self.verts[v1].edges.append(edgeIndex)
-
-				self.faces[fIndex].edges[i] = edgeIndex
-		# up to now, Face and Edge are all filled
-		# Vertex's edges are filled but not ordered
-		# now re-order Vertex's edges
-		vi = -1
-		for vertex in self.verts:
-			vi += 1
-			# isolated vertex, skip
-			if len(vertex.edges) == 0: continue
-
-			# move a boundary edge (if exist) to front
-			boundaryEdgeIdx = -1
-			for i in range(0, len(vertex.edges)):
-				if self.edges[vertex.edges[i]].faces[0] == -1 or \
-				self.edges[vertex.edges[i]].faces[1] == -1:
-					boundaryEdgeIdx = i
-					break
-			if boundaryEdgeIdx != -1:
-				tmp = vertex.edges[0]
-				vertex.edges[0] = vertex.edges[boundaryEdgeIdx]
-				vertex.edges[boundaryEdgeIdx] = tmp
-
-			# now re-order the vertex's adjacent edges
-			for i in range(0, len(vertex.edges)-1):
-				edgeIndex0 = vertex.edges[i]
-				found = False
-
-				for j in range(i+1, len(vertex.edges)):
-					edgeIndex1 = vertex.edges[j]
-					f0 = self.edges[edgeIndex0].faces[0]
-					f1 = self.edges[edgeIndex0].faces[1]
-					f2 = self.edges[edgeIndex1].faces[0]
-					f3 = self.edges[edgeIndex1].faces[1]
-					if f0 == f2 and f0 != -1 or f0 == f3 and f0 != -1 or\
-					f1 == f2 and f0 != -1 or f1 == f3 and f0 != -1:
-						found = True
-						break
-				if found: 
-					# swap
-					tmp = vertex.edges[i+1]; vertex.edges[i+1] = vertex.edges[j]; vertex.edges[j] = tmp
-				else:
-					# find the next boundary edge in the remaining edges
-					for j in range(i+1, len(vertex.edges)):
-						if self.edges[vertex.edges[j]].faces[0] == -1 or \
-						self.edges[vertex.edges[j]].faces[1] == -1:
-							tmp = vertex.edges[i+1]
-							vertex.edges[i+1] = vertex.edges[j]
-							vertex.edges[j] = tmp
-							break
-
-			# set idxAtVert list
-			for j in range(0, len(vertex.edges)):
-				idx = 0 if self.edges[vertex.edges[j]][0] == vi else 1
-				self.edges[vertex.edges[j]].idxAtVert[idx] = j
-		# check for boundary edges and verts
-		for edge in self.edges:
-			if edge.faces[1] == -1: 
-				edge.isBoundary = True
-				self.verts[edge[0]].isBoundary = True
-				self.verts[edge[1]].isBoundary = True
-
-	def __calcNormals(self):
+	# create Edge objects and fill face/vertex edge lists from an edge table (object mode);
+	# the vertex-face adjacency of the incremental updates is built along
+	def __bindEdgeTable(self, table, faceStart, faceVerts):
+		self.vertFaces = VertexFaces(faceStart, faceVerts, len(self.verts))
+		self.edges = []
+		edgeValid = table.valid.tolist()
+		for ei in range(0, len(table.verts)):
+			edge = Edge(table.verts[ei].tolist())
+			edge.faces = table.EdgeFaces(ei)
+			edge.idxAtVert = table.idxAtVert[ei].tolist()
+			edge.isBoundary = bool(table.isBoundary[ei])
+			edge.valid = edgeValid[ei]
+			self.edges.append(edge)
+		cornerEdge = table.cornerEdge.tolist(); starts = faceStart.tolist()
+		for fi in range(0, len(self.faces)):
+			self.faces[fi].edges = cornerEdge[starts[fi]:starts[fi+1]]
+		for vi in range(0, len(self.verts)):
+			self.verts[vi].edges = table.VertEdges(vi)
+			self.verts[vi].isBoundary = bool(table.vertBoundary[vi])
+
+	# edge table of the Edge objects, the inverse of __bindEdgeTable
+	def __objectEdgeTable(self):
+		table = EdgeTable()
+		table.verts = numpy.array([e.verts for e in self.edges], dtype=numpy.int64).reshape(-1, 2)
+		table.faces = numpy.array([e.faces[:2] for e in self.edges], dtype=numpy.int64).reshape(-1, 2)
+		table.extraFaces = dict((ei, self.edges[ei].faces[2:].tolist()) for ei in range(0, len(self.edges)) if len(self.edges[ei].faces) > 2)
+		table.idxAtVert = numpy.array([e.idxAtVert for e in self.edges], dtype=numpy.int64).reshape(-1, 2)
+		table.isBoundary = numpy.array([e.isBoundary for e in self.edges], dtype=bool)
+		table.valid = numpy.array([e.valid for e in self.edges], dtype=bool)
+		table.cornerEdge = numpy.array([ei for f in self.faces for ei in f.edges], dtype=numpy.int64)
+		table.vertEdgeStart = numpy.cumsum([0] + [len(v.edges) for v in self.verts], dtype=numpy.int64)
+		table.vertEdges = numpy.array([ei for v in self.verts for ei in v.edges], dtype=numpy.int64)
+		table.vertBoundary = numpy.array([v.isBoundary for v in self.verts], dtype=bool)
+		return table
+
+	# native container fields of the mesh, see utils/MLBMesh
+	def __saveFields(self):
+		fields = dict(); info = {'mtllib': self.mtllibFile}
+		info['givenNormals'] = '1' if (self.arrays.givenNormals if self.useArrays else self.givenNormals) else '0'
+		fields['lineStart'] = numpy.cumsum([0] + [len(l) for l in self.lines], dtype=numpy.int64)
+		fields['lineVerts'] = numpy.array([vi for l in self.lines for vi in l], dtype=numpy.int64)
+		if self.useArrays:
+			for name in ('positions', 'faces', 'normals', 'textures', 'colors', 'faceNormals', 'faceAreas', 'faceValid'):
+				if getattr(self.arrays, name) is not None: fields[name] = getattr(self.arrays, name)
+			if self.arrays.edgeTable is not None:
+				fields.update(MeshLib.utils.MLBMesh.EdgeTableFields(self.arrays.edgeTable))
+			return (fields, info)
+		fields['positions'] = numpy.array([(v.pos.x, v.pos.y, v.pos.z) for v in self.verts], dtype=REAL_TYPE).reshape(-1, 3)
+		colors = numpy.array([(v.color.x, v.color.y, v.color.z) if v.HasColor() else (1.0, 1.0, 1.0) for v in self.verts], dtype=REAL_TYPE).reshape(-1, 3)
+		if not (colors == 1.0).all(): fields['colors'] = colors
+		(fields['faceStart'], fields['faceVerts']) = self.__faceCorners()
+		if len(self.normals) != 0:
+			fields['normals'] = numpy.array([(n.x, n.y, n.z) for n in self.normals], dtype=REAL_TYPE).reshape(-1, 3)
+		if len(self.textures) != 0:
+			fields['textures'] = numpy.array([(t.x, t.y) for t in self.textures], dtype=REAL_TYPE).reshape(-1, 2)
+		fields['faceNormals'] = numpy.array([(f.normal.x, f.normal.y, f.normal.z) for f in self.faces], dtype=REAL_TYPE).reshape(-1, 3)
+		fields['faceAreas'] = numpy.array([f.area for f in self.faces], dtype=REAL_TYPE)
+		fields['faceValid'] = numpy.array([f.valid for f in self.faces], dtype=bool)
+		if len(self.edges) != 0:
+			fields.update(MeshLib.utils.MLBMesh.EdgeTableFields(self.__objectEdgeTable()))
+		return (fields, info)
+
+	# set the mesh from native container fields, the inverse of __saveFields
+	@Staged('fields', _meshInfo)
+	def __loadFields(self, fields, info, constructAdjacency):
+		self.mtllibFile = info.get('mtllib', self.mtllibFile)
+		lineStart = fields['lineStart'].tolist(); lineVerts = fields['lineVerts'].tolist()
+		self.lines = [lineVerts[lineStart[i]:lineStart[i+1]] for i in range(0, len(lineStart)-1)]
+		positions = fields['positions']
+		table = MeshLib.utils.MLBMesh.EdgeTableFromFields(fields)
+		if 'faces' in fields:
+			faces = fields['faces']
+			(faceStart, faceVerts) = TriangleCorners(faces)
+		else:
+			(faceStart, faceVerts) = (fields['faceStart'], fields['faceVerts'])
+			faces = faceVerts[FanTriangulate(faceStart)].reshape(-1, 3)
+			# the stored edge table is over polygons, not over their triangulation
+			if self.useArrays: table = None
+		hasNormals = 'faceNormals' in fields
+		givenNormals = 'normals' in fields and info.get('givenNormals', '1') == '1'
+
+		if self.useArrays:
+			self.arrays = MeshArrays(positions, faces, fields.get('normals'), fields.get('textures'), fields.get('colors'))
+			self.arrays.givenNormals = givenNormals
+			if hasNormals: (self.arrays.faceNormals, self.arrays.faceAreas) = (fields['faceNormals'], fields['faceAreas'])
+			if 'faceValid' in fields: self.arrays.faceValid = fields['faceValid']
+			if table is not None:
+				self.arrays.edgeTable = table
+				self.arrays.faceEdges = table.cornerEdge.reshape(-1, 3)
+				self.arrays.vertFaces = VertexFaces(faceStart, faceVerts, len(positions))
+				self.edges = EdgeList(table)
+			elif constructAdjacency: self.__construct()
+			if not hasNormals: self.arrays.CalcNormals()
+			self.__bindArrays()
+			self.__calcBounds(self.arrays.positions)
+			return
+
+		self.verts = [Vertex(Vector3D(*p)) for p in positions.tolist()]
+		if 'colors' in fields:
+			for (v, c) in zip(self.verts, fields['colors'].tolist()): v.color = Vector3D(*c)
+		faceVertList = faceVerts.tolist(); starts = faceStart.tolist()
+		self.faces = [Face(faceVertList[starts[i]:starts[i+1]]) for i in range(0, len(starts)-1)]
+		self.__linkObjects()
+		if 'faceValid' in fields:
+			for (f, valid) in zip(self.faces, fields['faceValid'].tolist()): f.valid = valid
+		self.normals = [Vector3D(*n) for n in fields['normals'].tolist()] if 'normals' in fields else []
+		self.givenNormals = givenNormals
+		self.textures = [Vector2D(*t) for t in fields['textures'].tolist()] if 'textures' in fields else []
+		if table is not None: self.__bindEdgeTable(table, faceStart, faceVerts)
+		elif constructAdjacency: self.__construct()
+		if hasNormals:
+			for (f, n, a) in zip(self.faces, fields['faceNormals'].tolist(), fields['faceAreas'].tolist()):
+				(f.normal, f.area) = (Vector3D(*n), a)
+		else: self.__calcNormals()
+		self.__calcBounds(positions)
+
+	@Staged('bbox')
+	def __calcBoundingBox(self):
+		owner = self.arrays if self.useArrays else self
+		owner.pending.discard('bbox')
+		moved = owner.moved.pop('bbox', None)
+		if moved is not None and self.__bounds is not None:
+			(vMin, vMax, minVert, maxVert) = self.__bounds
+			moved = numpy.fromiter(moved, dtype=numpy.int64)
+			# a moved extreme vertex may have shrunk the box
+			if not numpy.isin(numpy.concatenate((minVert, maxVert)), moved).any():
+				positions = self.arrays.positions[moved] if self.useArrays else VectorArray([self.verts[vi] for vi in moved], 3)
+				for k in range(0, 3):
+					(i, j) = (positions[:, k].argmin(), positions[:, k].argmax())
+					if positions[i, k] < vMin[k]: (vMin[k], minVert[k]) = (positions[i, k], moved[i])
+					if positions[j, k] > vMax[k]: (vMax[k], maxVert[k]) = (positions[j, k], moved[j])
+				self.__setBoundingBox(Vector3D(*vMin.tolist()), Vector3D(*vMax.tolist()))
+				return
+		self.__calcBounds(self.arrays.positions if self.useArrays else VectorArray(self.verts, 3))
+
+	# full bounding box pass, remembering the extreme vertices for the incremental updates
+	def __calcBounds(self, positions):
+		if len(positions) == 0:
+			self.__bounds = None
+			self.__setBoundingBox(Vector3D(1e30, 1e30, 1e30), Vector3D(-1e30, -1e30, -1e30))
+			return
+		(minVert, maxVert) = (positions.argmin(axis=0), positions.argmax(axis=0))
+		(vMin, vMax) = (positions[minVert, [0, 1, 2]], positions[maxVert, [0, 1, 2]])
+		self.__bounds = (vMin.astype(numpy.float64), vMax.astype(numpy.float64), minVert, maxVert)
+		self.__setBoundingBox(Vector3D(*vMin.tolist()), Vector3D(*vMax.tolist()))
+
+	def __setBoundingBox(self, vMin, vMax):
+		self.center = (vMax + vMin) / 2.0
+		self.scale = -1.0
+		for i in range(0, 3):
+			self.scale = max(self.scale, vMax[i] - vMin[i])
+		self.scale = 1.0 / self.scale
+
+	# recompute pending normals the way they were last computed, around the moved vertices only if any
+	def __deriveNormals(self):
+		if self.useArrays and 'normals' in self.arrays.moved: self.arrays.Derive('normals')
+		elif self.useArrays: self.__calcNormals(self.arrays.weighting, self.arrays.givenNormals)
+		elif 'normals' in self.moved: self.__updateNormals(self.moved['normals'])
+		else: self.__calcNormals(self.weighting, self.givenNormals)
+
+	# MeshArrays.UpdateNormals in object mode
+	def __updateNormals(self, verts):
+		self.pending.discard('normals')
+		self.moved.pop('normals', None)
+		# built with the adjacency, unless that was never constructed
+		if self.vertFaces is None: self.vertFaces = VertexFaces(*self.__faceCorners(), len(self.verts))
+		vertFaces = self.vertFaces
+		faces = numpy.unique(GatherRows(vertFaces, numpy.fromiter(verts, dtype=numpy.int64)))
+		(faceStart, faceVerts, ids, positions) = self.__localCorners(faces)
+		(faceNormals, faceAreas) = FaceNormals(positions, faceStart, faceVerts)
+		for (fi, n, a) in zip(faces.tolist(), faceNormals.tolist(), faceAreas.tolist()):
+			(self.faces[fi].normal, self.faces[fi].area) = (Vector3D(*n), a)
+		if self.givenNormals: return
+		ring = ids[numpy.unique(faceVerts)]
+		ringFaces = numpy.unique(GatherRows(vertFaces, ring))
+		(faceStart, faceVerts, ids, positions) = self.__localCorners(ringFaces)
+		faceNormals = VectorArray([self.faces[fi].normal for fi in ringFaces.tolist()], 3)
+		faceAreas = numpy.array([self.faces[fi].area for fi in ringFaces.tolist()], dtype=REAL_TYPE)
+		normals = RingNormals(positions, faceStart, faceVerts, faceNormals, faceAreas, numpy.searchsorted(ids, ring), self.weighting)
+		for (vi, n) in zip(ring.tolist(), normals.tolist()):
+			self.normals[vi] = Vector3D(*n)
+
+	# corners of some faces (object mode) over their own vertices: (faceStart, local faceVerts, vertex ids, positions)
+	def __localCorners(self, faces):
+		(faceStart, faceVerts) = PolygonCorners([self.faces[fi] for fi in faces.tolist()])
+		ids = numpy.unique(faceVerts)
+		positions = VectorArray([self.verts[vi] for vi in ids.tolist()], 3)
+		return (faceStart, numpy.searchsorted(ids, faceVerts), ids, positions)
+
+	@Staged('normals', _meshInfo)
+	def __calcNormals(self, weighting = 'area', keepNormals = True):
+		if self.useArrays:
+			self.arrays.CalcNormals(weighting, keepNormals)
+			self.__bindArrays()
+			return
+		self.pending.discard('normals')
+		self.weighting = weighting
 		# calculate face normals
-		faceNormals = []
-		for f in self.faces:
-			vec0 = self.verts[f[1]].pos - self.verts[f[0]].pos
-			vec1 = self.verts[f[-1]].pos - self.verts[f[0]].pos
-			f.normal = vec0 ^ vec1
-			f.area = f.normal.normalize() / 2.0
+		(faceStart, faceVerts) = self.__faceCorners()
+		positions = numpy.array([(v.pos.x, v.pos.y, v.pos.z) for v in self.verts], dtype=REAL_TYPE).reshape(-1, 3)
+		(faceNormals, faceAreas) = FaceNormals(positions, faceStart, faceVerts)
+		faceNormalList = faceNormals.tolist(); faceAreaList = faceAreas.tolist()
+		for fi in range(0, len(self.faces)):
+			self.faces[fi].normal = Vector3D(*faceNormalList[fi])
+			self.faces[fi].area = faceAreaList[fi]
 		# if no vertex normals, calculate them by average each vertex's adjacent faces' normals
-		if len(self.normals) != 0: return
-		# if adjacency is not built, then cannot calculate vertex normal
-		if len(self.edges) == 0: return
-		for v in self.verts:
-			vNorm = Vector3D()
-			totalArea = 0.0
-			for i in range(0, len(v.edges)):
-				e0 = v.edges[i]
-				e1 = v.edges[(i+1)%len(v.edges)]
-				fi = self.__edgeCoFace(e0, e1)
-				if fi == -1: continue
-				vNorm += self.faces[fi].normal * self.faces[fi].area
-				totalArea += self.faces[fi].area
-			if totalArea != 0.0:
-				vNorm /= totalArea; 
-				vNorm.normalize()
-			self.normals.append(vNorm)
-
-	# find common face of two edges
-	def __edgeCoFace(self, e0, e1):
-		for i in range(0, 2):
-			for j in range(0, 2):
-				if self.edges[e0].faces[i] == self.edges[e1].faces[j]:
-					return self.edges[e0].faces[i]
-		return -1
-		print(self.edges[e0][0], self.edges[e0][1])
-		print(self.edges[e1][0], self.edges[e1][1])
-		print(self.edges[e0].faces)
-		print(self.edges[e1].faces)
-		print(e0, e1)
-		assert False, 'edge %d and %d does not have common face.' % (e0, e1)
+		if keepNormals and len(self.normals) != 0: return
+		normals = VertexNormals(positions, faceStart, faceVerts, faceNormals, faceAreas, weighting)
+		self.normals = [Vector3D(*n) for n in normals.tolist()]
+		self.givenNormals = False
 
+def LoadMeshes(paths, workers = 1, rmReduntVerts = False, constructAdjacency = True, useArrays = False, useCache = False, ordered = True):
+	'''
+	Load many mesh files, yield (path, mesh, error) for each of them; error is None
+	or the traceback text of a file that failed to load, which does not stop the others.
+	With workers > 1 the files are parsed, their adjacency built and normals computed by
+	a pool of processes that hand the meshes back as arrays through shared memory,
+	up to 2 * workers files ahead of the caller.
+	ordered: yield in the order of paths, otherwise as the files complete
+	'''
+	if workers <= 1:
+		for path in paths:
+			try:
+				mesh = Mesh(useArrays)
+				mesh.LoadMesh(path, rmReduntVerts, constructAdjacency, useCache)
+				yield (path, mesh, None)
+			except Exception:
+				yield (path, None, traceback.format_exc())
+		return
+	paths = list(paths)
+	options = (rmReduntVerts, constructAdjacency, useArrays, useCache)
+	pool = MeshLib.utils.Parallel.SharedPool(workers)
+	# results as the workers complete them, and those taken from there ahead of their turn
+	(done, received) = (queue.Queue(), dict())
+	try:
+		submitted = 0
+		for k in range(0, len(paths)):
+			# a few files ahead of the caller only, so that stopping early leaves few meshes loaded for nothing
+			while submitted < min(len(paths), k + 2 * workers):
+				pool.apply_async(_loadMeshShared, ((submitted, paths[submitted], options),), callback=done.put)
+				submitted += 1
+			if ordered:
+				while k not in received:
+					result = done.get()
+					received[result[0]] = result
+				(i, shared, info, error) = received.pop(k)
+			else: (i, shared, info, error) = done.get()
+			if error is not None:
+				yield (paths[i], None, error)
+				continue
+			mesh = Mesh(useArrays)
+			mesh.FromFields(MeshLib.utils.Parallel.TakeArrays(shared), info, False)
+			yield (paths[i], mesh, None)
+	finally:
+		pool.terminate()
+		pool.join()
+		# free the shared arrays of the meshes loaded but not taken
+		results = list(received.values())
+		while not done.empty(): results.append(done.get())
+		for (i, shared, info, error) in results:
+			if shared is not None: MeshLib.utils.Parallel.FreeArrays(shared)
+
+# load a mesh in a LoadMeshes worker, return (index, shared array descriptors, info, error)
+def _loadMeshShared(args):
+	(index, path, (rmReduntVerts, constructAdjacency, useArrays, useCache)) = args
+	try:
+		mesh = Mesh(useArrays)
+		mesh.LoadMesh(path, rmReduntVerts, constructAdjacency, useCache)
+		(fields, info) = mesh.ToFields()
+		return (index, MeshLib.utils.Parallel.ShareArrays(fields), info, None)
+	except Exception:
+		return (index, None, None, traceback.format_exc())
 
-	
 	# test code
 if __name__ == '__main__':
 	# load .obj
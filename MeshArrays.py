@@ -0,0 +1,531 @@
+from MeshLib.Geometry import *
+from MeshLib.Topology import *
+from MeshLib.Normals import *
+from collections.abc import Sequence
+import numpy
+import itertools
+
+# dtypes used by the array storage
+# positions, normals, etc. are kept in double precision like Vector3D,
+# indices are kept in 32-bit to halve the memory of the connectivity tables
+REAL_TYPE = numpy.float64
+INDEX_TYPE = numpy.int32
+
+# Vector3DView class
+# a Vector3D whose x/y/z live in a row of an Nx3 array
+class Vector3DView(Vector3D):
+	__slots__ = ('array', 'index')
+
+	def __init__(self, array, index):
+		self.array = array
+		self.index = index
+
+	def __getx(self): return float(self.array[self.index, 0])
+	def __setx(self, value): self.array[self.index, 0] = value
+	def __gety(self): return float(self.array[self.index, 1])
+	def __sety(self, value): self.array[self.index, 1] = value
+	def __getz(self): return float(self.array[self.index, 2])
+	def __setz(self, value): self.array[self.index, 2] = value
+	x = property(__getx, __setx)
+	y = property(__gety, __sety)
+	z = property(__getz, __setz)
+
+# Vector2DView class
+# a Vector2D whose x/y live in a row of an Nx2 array
+class Vector2DView(Vector2D):
+	__slots__ = ('array', 'index')
+
+	def __init__(self, array, index):
+		self.array = array
+		self.index = index
+
+	def __getx(self): return float(self.array[self.index, 0])
+	def __setx(self, value): self.array[self.index, 0] = value
+	def __gety(self): return float(self.array[self.index, 1])
+	def __sety(self, value): self.array[self.index, 1] = value
+	x = property(__getx, __setx)
+	y = property(__gety, __sety)
+
+# VertexView class
+# behaves like MeshLib.Mesh.Vertex, but reads/writes the mesh arrays
+class VertexView:
+	__slots__ = ('arrays', 'index')
+
+	def __init__(self, arrays, index):
+		self.arrays = arrays
+		self.index = index
+
+	def __getitem__(self, key):
+		return float(self.arrays.positions[self.index, key])
+	def __setitem__(self, key, value):
+		self.arrays.positions[self.index, key] = value
+		self.arrays.MarkMoved((self.index,))
+
+	@property
+	def pos(self):
+		return Vector3DView(self.arrays.positions, self.index)
+	@pos.setter
+	def pos(self, value):
+		self.arrays.positions[self.index] = (value[0], value[1], value[2])
+		self.arrays.MarkMoved((self.index,))
+
+	@property
+	def color(self):
+		# colors are only allocated when some vertex is not the default white
+		if self.arrays.colors is None: return Vector3D(1.0, 1.0, 1.0)
+		return Vector3DView(self.arrays.colors, self.index)
+	@color.setter
+	def color(self, value):
+		if self.arrays.colors is None:
+			self.arrays.colors = numpy.ones((len(self.arrays.positions), 3), dtype=REAL_TYPE)
+		self.arrays.colors[self.index] = (value[0], value[1], value[2])
+
+	@property
+	def edges(self):
+		table = self.arrays.edgeTable
+		if table is None: return []
+		return table.vertEdges[table.vertEdgeStart[self.index]:table.vertEdgeStart[self.index+1]]
+
+	@property
+	def isBoundary(self):
+		if self.arrays.edgeTable is None: return False
+		return bool(self.arrays.edgeTable.vertBoundary[self.index])
+	@isBoundary.setter
+	def isBoundary(self, value):
+		self.arrays.edgeTable.vertBoundary[self.index] = value
+
+# FaceView class
+# behaves like MeshLib.Mesh.Face, but reads/writes the mesh arrays
+class FaceView:
+	__slots__ = ('arrays', 'index')
+
+	def __init__(self, arrays, index):
+		self.arrays = arrays
+		self.index = index
+
+	def __getitem__(self, key):
+		return int(self.arrays.faces[self.index, key])
+	def __setitem__(self, key, value):
+		self.arrays.faces[self.index, key] = value
+		self.arrays.Invalidate(False, True)
+	def __len__(self):
+		return 3
+	def __iter__(self):
+		return iter(self.arrays.faces[self.index].tolist())
+
+	@property
+	def verts(self):
+		return self.arrays.faces[self.index]
+
+	@property
+	def edges(self):
+		return self.arrays.faceEdges[self.index]
+
+	@property
+	def normal(self):
+		return Vector3DView(self.arrays.faceNormals, self.index)
+	@normal.setter
+	def normal(self, value):
+		self.arrays.faceNormals[self.index] = (value[0], value[1], value[2])
+
+	@property
+	def area(self):
+		return float(self.arrays.faceAreas[self.index])
+	@area.setter
+	def area(self, value):
+		self.arrays.faceAreas[self.index] = value
+
+	@property
+	def valid(self):
+		return bool(self.arrays.faceValid[self.index])
+	@valid.setter
+	def valid(self, value):
+		self.arrays.faceValid[self.index] = value
+
+# EdgeView class
+# behaves like MeshLib.Mesh.Edge, but reads/writes the mesh's EdgeTable
+class EdgeView:
+	__slots__ = ('table', 'index')
+
+	def __init__(self, table, index):
+		self.table = table
+		self.index = index
+
+	def __getitem__(self, key):
+		return int(self.table.verts[self.index, key])
+	def __setitem__(self, key, value):
+		self.table.verts[self.index, key] = value
+
+	@property
+	def verts(self):
+		return self.table.verts[self.index]
+
+	@property
+	def faces(self):
+		return self.table.EdgeFaces(self.index)
+	@faces.setter
+	def faces(self, value):
+		value = list(value)
+		self.table.faces[self.index] = (value + [-1, -1])[:2]
+		if len(value) > 2: self.table.extraFaces[self.index] = value[2:]
+		else: self.table.extraFaces.pop(self.index, None)
+
+	@property
+	def idxAtVert(self):
+		return self.table.idxAtVert[self.index]
+
+	@property
+	def isBoundary(self):
+		return bool(self.table.isBoundary[self.index])
+	@isBoundary.setter
+	def isBoundary(self, value):
+		self.table.isBoundary[self.index] = value
+
+	@property
+	def valid(self):
+		return bool(self.table.valid[self.index])
+	@valid.setter
+	def valid(self, value):
+		self.table.valid[self.index] = value
+
+# list-like containers handing out views, so that mesh.verts[i][k] keeps working
+class VertexList(Sequence):
+	def __init__(self, arrays):
+		self.arrays = arrays
+	def __len__(self):
+		return len(self.arrays.positions)
+	def __getitem__(self, key):
+		if isinstance(key, slice): return [self[i] for i in range(*key.indices(len(self)))]
+		if key < 0: key += len(self)
+		if key < 0 or key >= len(self): raise IndexError('vertex index out of range')
+		return VertexView(self.arrays, key)
+
+class FaceList(Sequence):
+	def __init__(self, arrays):
+		self.arrays = arrays
+	def __len__(self):
+		return len(self.arrays.faces)
+	def __getitem__(self, key):
+		if isinstance(key, slice): return [self[i] for i in range(*key.indices(len(self)))]
+		if key < 0: key += len(self)
+		if key < 0 or key >= len(self): raise IndexError('face index out of range')
+		return FaceView(self.arrays, key)
+
+class EdgeList(Sequence):
+	def __init__(self, table):
+		self.table = table
+	def __len__(self):
+		return len(self.table.verts)
+	def __getitem__(self, key):
+		if isinstance(key, slice): return [self[i] for i in range(*key.indices(len(self)))]
+		if key < 0: key += len(self)
+		if key < 0 or key >= len(self): raise IndexError('edge index out of range')
+		return EdgeView(self.table, key)
+
+class VectorList(Sequence):
+	'''
+	List of Vector2DView/Vector3DView over an Nx2/Nx3 array
+	'''
+	def __init__(self, array):
+		self.array = array
+		self.viewType = Vector2DView if array.shape[1] == 2 else Vector3DView
+	def __len__(self):
+		return len(self.array)
+	def __getitem__(self, key):
+		if isinstance(key, slice): return [self[i] for i in range(*key.indices(len(self)))]
+		if key < 0: key += len(self)
+		if key < 0 or key >= len(self): raise IndexError('vector index out of range')
+		return self.viewType(self.array, key)
+
+# property of a MeshArrays field that is derived by stage ('adjacency' or 'normals'),
+# computed on access while the stage is pending
+def _derivedField(field, stage):
+	def get(self):
+		if stage in self.pending: self.Derive(stage)
+		return self.__dict__[field]
+	def set(self, value):
+		self.__dict__[field] = value
+	return property(get, set)
+
+# MeshArrays class
+# fields:
+#     positions	---- Nx3 vertex positions
+#     faces	---- Fx3 vertex indices of triangles
+#     normals	---- Nx3 vertex normals or None
+#     textures	---- Nx2 vertex uvs or None
+#     colors	---- Nx3 vertex colors or None (all white)
+#     faceNormals	---- Fx3 face normals
+#     faceAreas	---- F face areas
+#     faceValid	---- F flags, False for removed faces
+#     faceEdges	---- Fx3 edge indices of faces (after adjacency construction)
+#     edgeTable	---- EdgeTable of edges, vertex edge lists and boundary flags (after adjacency construction)
+#     pending	---- derived attributes not computed yet, among 'adjacency', 'normals' and 'bbox';
+#                    adjacency and normals are computed when their fields are next read
+#     givenNormals	---- whether the vertex normals were given rather than computed; CalcNormals keeps given ones
+#     weighting	---- the weighting vertex normals are computed with
+#     edits	---- count of MarkMoved and Invalidate calls, telling caches built on the arrays when they are stale
+#     moved	---- dict of the vertices moved since the pending 'normals' and 'bbox' were last computed;
+#                    a pending stage without an entry is recomputed in full
+#     vertFaces	---- (indptr, indices) vertex-face adjacency of the incremental updates, built with the adjacency
+class MeshArrays:
+	edgeTable = _derivedField('edgeTable', 'adjacency')
+	faceEdges = _derivedField('faceEdges', 'adjacency')
+	normals = _derivedField('normals', 'normals')
+	faceNormals = _derivedField('faceNormals', 'normals')
+	faceAreas = _derivedField('faceAreas', 'normals')
+
+	def __init__(self, positions, faces, normals = None, textures = None, colors = None):
+		self.pending = set()
+		self.edits = 0
+		self.moved = dict()
+		self.vertFaces = None
+		self.weighting = 'area'
+		self.positions = numpy.ascontiguousarray(positions, dtype=REAL_TYPE).reshape(-1, 3)
+		self.faces = numpy.ascontiguousarray(faces, dtype=INDEX_TYPE).reshape(-1, 3)
+		self.normals = None if normals is None or len(normals) == 0 else \
+			numpy.ascontiguousarray(normals, dtype=REAL_TYPE).reshape(-1, 3)
+		self.textures = None if textures is None or len(textures) == 0 else \
+			numpy.ascontiguousarray(textures, dtype=REAL_TYPE).reshape(-1, 2)
+		self.colors = None if colors is None else \
+			numpy.ascontiguousarray(colors, dtype=REAL_TYPE).reshape(-1, 3)
+		self.givenNormals = self.normals is not None
+		nFace = len(self.faces)
+		self.faceNormals = numpy.zeros((nFace, 3), dtype=REAL_TYPE)
+		self.faceAreas = numpy.zeros(nFace, dtype=REAL_TYPE)
+		self.faceValid = numpy.ones(nFace, dtype=bool)
+		self.faceEdges = None
+		self.edgeTable = None
+
+	@staticmethod
+	def FromObjects(verts, faces, normals = [], textures = []):
+		'''
+		Build arrays from lists of Vertex/Face/Vector3D/Vector2D objects.
+		Polygonal faces are fan-triangulated.
+		'''
+		nVert = len(verts)
+		positions = numpy.empty((nVert, 3), dtype=REAL_TYPE)
+		colors = numpy.empty((nVert, 3), dtype=REAL_TYPE)
+		for i in range(0, nVert):
+			v = verts[i]
+			positions[i] = (v.pos.x, v.pos.y, v.pos.z)
+			colors[i] = (v.color.x, v.color.y, v.color.z) if v.HasColor() else (1.0, 1.0, 1.0)
+		if (colors == 1.0).all(): colors = None
+
+		triList = []
+		for f in faces:
+			for i in range(1, len(f)-1):
+				triList.append((f[0], f[i], f[i+1]))
+		triArray = numpy.array(triList, dtype=INDEX_TYPE).reshape(-1, 3)
+
+		normArray = numpy.array([(n.x, n.y, n.z) for n in normals], dtype=REAL_TYPE)
+		texArray = numpy.array([(t.x, t.y) for t in textures], dtype=REAL_TYPE)
+		return MeshArrays(positions, triArray, normArray, texArray, colors)
+
+	def ConstructAdjacency(self):
+		'''
+		Build edges, edge-face map, boundary flags and ordered vertex edge lists in bulk
+		'''
+		self.pending.discard('adjacency')
+		(faceStart, faceVerts) = TriangleCorners(self.faces)
+		table = BuildEdgeTable(faceStart, faceVerts, len(self.positions))
+		# the vertex-face adjacency of the incremental updates is built along
+		self.vertFaces = VertexFaces(faceStart, faceVerts, len(self.positions))
+		# keep the tables in the compact index type
+		for field in ('verts', 'faces', 'cornerEdge', 'vertEdges', 'idxAtVert'):
+			setattr(table, field, getattr(table, field).astype(INDEX_TYPE))
+		self.faceEdges = table.cornerEdge.reshape(-1, 3)
+		self.edgeTable = table
+		return table
+
+	def BoundingBox(self):
+
+		'''
+		Return (vMin, vMax) of the positions as Vector3D
+		'''
+		if len(self.positions) == 0:
+			return (Vector3D(1e30, 1e30, 1e30), Vector3D(-1e30, -1e30, -1e30))
+		vMin = self.positions.min(axis=0)
+		vMax = self.positions.max(axis=0)
+		return (Vector3D(*vMin), Vector3D(*vMax))
+
+	def CalcNormals(self, weighting = 'area', keepNormals = True):
+		'''
+		Calculate face normals and areas, and vertex normals unless loaded ones are kept.
+		weighting: 'area', 'angle' or 'uniform', see Normals.VertexNormals
+		'''
+		self.pending.discard('normals')
+		self.moved.pop('normals', None)
+		self.weighting = weighting
+		(faceStart, faceVerts) = TriangleCorners(self.faces)
+		(self.faceNormals, self.faceAreas) = FaceNormals(self.positions, faceStart, faceVerts)
+		if keepNormals and self.normals is not None: return
+		normals = VertexNormals(self.positions, faceStart, faceVerts, self.faceNormals, self.faceAreas, weighting)
+		# update in place, so that views of the normals stay valid
+		if self.normals is not None and self.normals.shape == normals.shape: self.normals[...] = normals
+		else: self.normals = normals
+		self.givenNormals = False
+
+	def Derive(self, stage):
+		'''
+		Compute a pending derived attribute: 'adjacency' or 'normals'
+		'''
+		if stage == 'adjacency': self.ConstructAdjacency()
+		elif stage == 'normals' and 'normals' in self.moved: self.UpdateNormals(self.moved['normals'])
+		elif stage == 'normals': self.CalcNormals(self.weighting, self.givenNormals)
+
+	def Invalidate(self, geometry = True, topology = False):
+		'''
+		Mark the attributes derived from the positions (geometry) or the faces (topology)
+		as pending after they were changed
+		'''
+		self.edits += 1
+		stages = set()
+		if geometry: stages.update(('normals', 'bbox'))
+		if topology:
+			stages.update(('adjacency', 'normals'))
+			self.vertFaces = None
+		self.pending.update(stages)
+		for stage in stages: self.moved.pop(stage, None)
+
+	def MarkMoved(self, verts):
+		'''
+		Mark normals and bounding box as pending after the positions of verts changed;
+		they are then updated around the moved vertices only
+		'''
+		self.edits += 1
+		for stage in ('normals', 'bbox'):
+			if stage not in self.pending:
+				self.pending.add(stage)
+				self.moved[stage] = set()
+			if stage in self.moved: self.moved[stage].update(verts)
+
+	def UpdateNormals(self, verts):
+		'''
+		Recalculate the normals and areas of the faces around verts and, unless given
+		normals are kept, the vertex normals of the vertices of those faces
+		'''
+		self.pending.discard('normals')
+		self.moved.pop('normals', None)
+		verts = numpy.unique(numpy.fromiter(verts, dtype=numpy.int64))
+		# built with the adjacency, unless that was never constructed
+		if self.vertFaces is None: self.vertFaces = VertexFaces(*TriangleCorners(self.faces), len(self.positions))
+		faces = numpy.unique(GatherRows(self.vertFaces, verts))
+		(faceStart, faceVerts) = TriangleCorners(self.faces[faces])
+		(self.faceNormals[faces], self.faceAreas[faces]) = FaceNormals(self.positions, faceStart, faceVerts)
+		if self.givenNormals or self.normals is None: return
+		ring = numpy.unique(faceVerts)
+		ringFaces = numpy.unique(GatherRows(self.vertFaces, ring))
+		(faceStart, faceVerts) = TriangleCorners(self.faces[ringFaces])
+		self.normals[ring] = RingNormals(self.positions, faceStart, faceVerts, \
+			self.faceNormals[ringFaces], self.faceAreas[ringFaces], ring, self.weighting)
+
+
+# primes of the spatial hash of grid cells
+_CELL_PRIMES = numpy.array([73856093, 19349663, 83492791], dtype=numpy.int64)
+# the 13 of the 26 neighbours of a cell that come after it; a pair of points in
+# neighbouring cells is met from the cell that comes first
+_FORWARD_CELLS = [d for d in itertools.product((-1, 0, 1), repeat=3) if d > (0, 0, 0)]
+
+def WeldPositions(positions, epsilon):
+	'''
+	Return (keep, realIndex) like UniqueRows for positions merged when closer than
+	epsilon, also through chains of close positions; each cluster is represented by its
+	first position. Pairs are found in a uniform grid of epsilon cells, hashed.
+	'''
+	if epsilon <= 0: return UniqueRows(positions)
+	points = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 3)
+	label = _closeClusters(points, float(epsilon))
+	keep = numpy.flatnonzero(label == numpy.arange(len(label)))
+	rank = numpy.empty(len(label), dtype=numpy.int64)
+	rank[keep] = numpy.arange(len(keep), dtype=numpy.int64)
+	return (keep, rank[label])
+
+# label every point with the lowest index of the points it is linked to by chains
+# of pairs closer than epsilon
+def _closeClusters(points, epsilon):
+	label = numpy.arange(len(points), dtype=numpy.int64)
+	if len(points) < 2: return label
+	cells = numpy.floor(points / epsilon).astype(numpy.int64)
+	# points and cells sorted into runs of equal hash keys, the buckets; pairs are found
+	# as positions in this order
+	order = numpy.argsort(_cellKeys(cells), kind='stable')
+	(points, cells) = (points[order], cells[order])
+	keys = _cellKeys(cells)
+	isStart = numpy.concatenate(([True], keys[1:] != keys[:-1]))
+	runStart = numpy.flatnonzero(isStart)
+	bucketKeys = keys[runStart]
+	bucketStart = numpy.append(runStart, len(order))
+	runEnd = numpy.repeat(bucketStart[1:], numpy.diff(bucketStart))
+	# the neighbours of a bucket are looked up from the cell of its first point; points of
+	# other cells that share the bucket by a hash collision look them up on their own, and
+	# may meet their own bucket as a neighbour
+	odd = numpy.zeros(0, dtype=numpy.int64)
+	changed = numpy.flatnonzero((cells[1:] != cells[:-1]).any(axis=1) & ~isStart[1:]) + 1
+	if len(changed) != 0:
+		candidates = numpy.flatnonzero(numpy.repeat(numpy.isin(runEnd[runStart], runEnd[changed]), numpy.diff(bucketStart)))
+		runOf = numpy.searchsorted(runStart, candidates, side='right') - 1
+		odd = candidates[(cells[candidates] != cells[runStart[runOf]]).any(axis=1)]
+	queryCells = cells[numpy.concatenate((runStart, odd))]
+	queryStart = numpy.concatenate((runStart, odd))
+	queryEnd = numpy.concatenate((bucketStart[1:], odd + 1))
+	limit = epsilon * epsilon
+	(pairI, pairJ) = ([], [])
+	# pairs within a bucket, the points d apart
+	first = numpy.arange(len(order))
+	for d in range(1, int(numpy.diff(bucketStart).max())):
+		first = first[first + d < runEnd[first]]
+		close = ((points[first] - points[first + d]) ** 2).sum(axis=1) <= limit
+		pairI.append(first[close]); pairJ.append(first[close] + d)
+	for offset in _FORWARD_CELLS:
+		neighbourKeys = _cellKeys(queryCells + offset)
+		bucket = numpy.minimum(numpy.searchsorted(bucketKeys, neighbourKeys), len(bucketKeys)-1)
+		found = numpy.flatnonzero(bucketKeys[bucket] == neighbourKeys)
+		bucket = bucket[found]
+		# every point of the query range against every point of the neighbour bucket
+		(a, b) = (queryEnd[found] - queryStart[found], bucketStart[bucket+1] - bucketStart[bucket])
+		counts = a * b
+		pairQuery = numpy.repeat(numpy.arange(len(found)), counts)
+		k = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+		b = b[pairQuery]
+		i = queryStart[found][pairQuery] + k // b
+		j = bucketStart[bucket][pairQuery] + k % b
+		close = ((points[i] - points[j]) ** 2).sum(axis=1) <= limit
+		pairI.append(i[close]); pairJ.append(j[close])
+	(i, j) = (order[numpy.concatenate(pairI)], order[numpy.concatenate(pairJ)])
+	# propagate the lowest label over the pairs, jumping labels to their own labels
+	while len(i) != 0:
+		low = numpy.minimum(label[i], label[j])
+		newLabel = label.copy()
+		numpy.minimum.at(newLabel, i, low)
+		numpy.minimum.at(newLabel, j, low)
+		newLabel = newLabel[newLabel]
+		if (newLabel == label).all(): break
+		label = newLabel
+	return label
+
+# hash keys of grid cells
+def _cellKeys(cells):
+	products = cells * _CELL_PRIMES
+	return products[:, 0] ^ products[:, 1] ^ products[:, 2]
+
+def UniqueRows(rows):
+	'''
+	Return (keep, realIndex): keep are the first occurrences of the distinct rows
+	in their original order, realIndex maps every row to its position in keep
+	'''
+	rows = numpy.ascontiguousarray(rows)
+	if len(rows) == 0: return (numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64))
+	rowView = rows.view(numpy.dtype((numpy.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+	(uniq, first, inverse) = numpy.unique(rowView, return_index=True, return_inverse=True)
+	order = numpy.argsort(first)
+	rank = numpy.empty(len(order), dtype=numpy.int64)
+	rank[order] = numpy.arange(len(order), dtype=numpy.int64)
+	return (first[order], rank[inverse.ravel()])
+
+def VectorArray(vectors, nCol):
+	'''
+	Return the Nx2 or Nx3 array of a list of Vector2D/Vector3D (or vertices)
+	'''
+	if nCol == 2: values = itertools.chain.from_iterable((v[0], v[1]) for v in vectors)
+	else: values = itertools.chain.from_iterable((v[0], v[1], v[2]) for v in vectors)
+	return numpy.fromiter(values, dtype=REAL_TYPE, count=nCol*len(vectors)).reshape(-1, nCol)
@@ -0,0 +1,81 @@
+from MeshLib.Topology import CornerLinks
+import numpy
+
+# Bulk normal computation.
+# Faces are given as a flat corner list (faceStart, faceVerts), see Topology.
+# Like Mesh.__calcNormals, the normal of a face is taken from its first, second
+# and last corners.
+
+# weighting modes of vertex normals
+WEIGHTINGS = ('area', 'angle', 'uniform')
+
+def FaceNormals(positions, faceStart, faceVerts):
+	'''
+	Return (normals, areas) of the faces; degenerate faces get a zero normal
+	'''
+	faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+	p0 = positions[faceVerts[faceStart[:-1]]]
+	p1 = positions[faceVerts[faceStart[:-1]+1]]
+	p2 = positions[faceVerts[faceStart[1:]-1]]
+	cross = numpy.cross(p1 - p0, p2 - p0)
+	length = numpy.sqrt((cross * cross).sum(axis=1))
+	normals = cross / numpy.where(length == 0.0, 1.0, length)[:, None]
+	return (normals, length / 2.0)
+
+def CornerAngles(positions, faceStart, faceVerts):
+	'''
+	Return the interior angle of every corner
+	'''
+	(cornerFace, nextCorner, prevCorner) = CornerLinks(numpy.asarray(faceStart, dtype=numpy.int64))
+	p = positions[faceVerts]
+	vec0 = positions[faceVerts[nextCorner]] - p
+	vec1 = positions[faceVerts[prevCorner]] - p
+	cross = numpy.cross(vec0, vec1)
+	return numpy.arctan2(numpy.sqrt((cross * cross).sum(axis=1)), (vec0 * vec1).sum(axis=1))
+
+def VertexNormals(positions, faceStart, faceVerts, faceNormals, faceAreas, weighting = 'area'):
+	'''
+	Return unit vertex normals by scatter-adding the normals of the adjacent faces,
+	weighted by face area, corner angle or uniformly.
+	Isolated vertices get a zero normal.
+	'''
+	faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+	cornerNormals = _cornerNormals(positions, faceStart, faceVerts, faceNormals, faceAreas, weighting)
+	return _sumNormals(faceVerts, cornerNormals, len(positions), positions.dtype)
+
+def RingNormals(positions, faceStart, faceVerts, faceNormals, faceAreas, verts, weighting = 'area'):
+	'''
+	Return the unit normals of the sorted vertices verts, given the faces around them
+	with their normals and areas; the corners of other vertices are ignored.
+	With all faces of verts given this equals VertexNormals(...)[verts], at a cost
+	proportional to the given faces.
+	'''
+	faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+	cornerNormals = _cornerNormals(positions, faceStart, faceVerts, faceNormals, faceAreas, weighting)
+	# the position of each corner's vertex in verts
+	index = numpy.minimum(numpy.searchsorted(verts, faceVerts), max(len(verts)-1, 0))
+	inRing = verts[index] == faceVerts if len(verts) != 0 else numpy.zeros(len(faceVerts), dtype=bool)
+	return _sumNormals(index[inRing], cornerNormals[inRing], len(verts), positions.dtype)
+
+# the weighted face normal at each corner
+def _cornerNormals(positions, faceStart, faceVerts, faceNormals, faceAreas, weighting):
+	assert weighting in WEIGHTINGS, 'Unknown normal weighting \'%s\'.' % weighting
+	faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+	cornerFace = numpy.repeat(numpy.arange(len(faceStart)-1), numpy.diff(faceStart))
+	if weighting == 'area':
+		weights = faceAreas[cornerFace]
+	elif weighting == 'angle':
+		weights = CornerAngles(positions, faceStart, faceVerts)
+	else:
+		# degenerate faces carry no direction
+		weights = (faceAreas[cornerFace] != 0.0).astype(positions.dtype)
+	return faceNormals[cornerFace] * weights[:, None]
+
+# scatter-add corner normals into nVert unit normals
+def _sumNormals(cornerVerts, cornerNormals, nVert, dtype):
+	normals = numpy.empty((nVert, 3), dtype=dtype)
+	for k in range(0, 3):
+		normals[:, k] = numpy.bincount(cornerVerts, cornerNormals[:, k], nVert)
+	length = numpy.sqrt((normals * normals).sum(axis=1))
+	normals /= numpy.where(length == 0.0, 1.0, length)[:, None]
+	return normals
@@ -0,0 +1,590 @@
+import numpy
+
+# Vectorized adjacency construction.
+# Faces are given as a flat corner list: the corners of face f are
+# faceVerts[faceStart[f]:faceStart[f+1]], so polygonal faces are supported.
+
+# EdgeTable class
+# fields:
+#     verts	---- Ex2 end points, oriented as in the first face using the edge
+#     faces	---- Ex2 first two adjacent faces; -1 for the missing face of a boundary edge
+#     extraFaces	---- dict edge -> list of further faces of a non-manifold edge
+#     isBoundary	---- E flags, True for edges with a single adjacent face
+#     cornerEdge	---- C edge of each corner, i.e. edge (corner, next corner)
+#     vertEdgeStart	---- N+1 offsets into vertEdges
+#     vertEdges	---- 2E edges around each vertex, ordered so that consecutive edges share a face,
+#                  a boundary edge (if any) first
+#     idxAtVert	---- Ex2 index of the edge in the edge list of its two end points
+#     vertBoundary	---- N flags, True for vertices on a boundary edge
+#     valid	---- E flags, False for removed edges
+class EdgeTable:
+	def __init__(self):
+		self.verts = None
+		self.faces = None
+		self.extraFaces = dict()
+		self.isBoundary = None
+		self.cornerEdge = None
+		self.vertEdgeStart = None
+		self.vertEdges = None
+		self.idxAtVert = None
+		self.vertBoundary = None
+		self.valid = None
+
+	def EdgeFaces(self, e):
+		'''
+		Return the face list of edge e, same as Edge.faces
+		'''
+		faces = [int(self.faces[e, 0]), int(self.faces[e, 1])]
+		if e in self.extraFaces: faces += self.extraFaces[e]
+		return faces
+
+	def VertEdges(self, v):
+		'''
+		Return the ordered edge list of vertex v, same as Vertex.edges
+		'''
+		return self.vertEdges[self.vertEdgeStart[v]:self.vertEdgeStart[v+1]].tolist()
+
+def TriangleCorners(faces):
+	'''
+	Return (faceStart, faceVerts) of an Fx3 triangle array
+	'''
+	faces = numpy.asarray(faces)
+	return (numpy.arange(0, 3*len(faces)+1, 3, dtype=numpy.int64), faces.ravel().astype(numpy.int64))
+
+def PolygonCorners(faces):
+	'''
+	Return (faceStart, faceVerts) of a list of (possibly polygonal) faces
+	'''
+	sizes = numpy.fromiter((len(f) for f in faces), dtype=numpy.int64, count=len(faces))
+	faceStart = numpy.zeros(len(faces)+1, dtype=numpy.int64)
+	numpy.cumsum(sizes, out=faceStart[1:])
+	faceVerts = numpy.fromiter((v for f in faces for v in f), dtype=numpy.int64, count=int(faceStart[-1]))
+	return (faceStart, faceVerts)
+
+def CornerLinks(faceStart):
+	'''
+	Return (cornerFace, nextCorner, prevCorner) for every corner
+	'''
+	nCorner = int(faceStart[-1])
+	sizes = numpy.diff(faceStart)
+	cornerFace = numpy.repeat(numpy.arange(len(sizes), dtype=numpy.int64), sizes)
+	corners = numpy.arange(nCorner, dtype=numpy.int64)
+	nextCorner = corners + 1
+	lastCorners = faceStart[1:][sizes > 0] - 1
+	nextCorner[lastCorners] = faceStart[:-1][sizes > 0]
+	prevCorner = numpy.empty(nCorner, dtype=numpy.int64)
+	prevCorner[nextCorner] = corners
+	return (cornerFace, nextCorner, prevCorner)
+
+def BuildEdgeTable(faceStart, faceVerts, nVert):
+	'''
+	Build the unique edge table, edge-face map, boundary flags and ordered
+	vertex edge lists of a mesh in bulk.
+	Edges are numbered in order of first appearance and vertex edges are ordered
+	as the incremental construction face by face ordered them (see _orderVertexEdges).
+	'''
+	table = EdgeTable()
+	faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+	faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+	(cornerFace, nextCorner, prevCorner) = CornerLinks(faceStart)
+	v0 = faceVerts; v1 = faceVerts[nextCorner]
+
+	# group corners by packed (min, max) vertex pair keys
+	key = numpy.minimum(v0, v1) * max(nVert, 1) + numpy.maximum(v0, v1)
+	order = numpy.argsort(key, kind='stable')
+	sortedKey = key[order]
+	isFirst = numpy.ones(len(order), dtype=bool)
+	isFirst[1:] = sortedKey[1:] != sortedKey[:-1]
+	groupStart = numpy.flatnonzero(isFirst)
+	groupOfSorted = numpy.cumsum(isFirst) - 1
+	groupSize = numpy.diff(numpy.append(groupStart, len(order)))
+	# number the edges by their first corner (stable sort keeps corners ascending in a group)
+	firstCorner = order[groupStart]
+	edgeOrder = numpy.argsort(firstCorner, kind='stable')
+	edgeOfGroup = numpy.empty(len(groupStart), dtype=numpy.int64)
+	edgeOfGroup[edgeOrder] = numpy.arange(len(groupStart), dtype=numpy.int64)
+	nEdge = len(groupStart)
+
+	cornerEdge = numpy.empty(len(order), dtype=numpy.int64)
+	cornerEdge[order] = edgeOfGroup[groupOfSorted]
+	table.cornerEdge = cornerEdge
+	table.verts = numpy.stack((v0[firstCorner[edgeOrder]], v1[firstCorner[edgeOrder]]), axis=1)
+
+	# edge -> faces
+	edgeSize = groupSize[edgeOrder]
+	edgeGroupStart = groupStart[edgeOrder]
+	table.faces = numpy.full((nEdge, 2), -1, dtype=numpy.int64)
+	table.faces[:, 0] = cornerFace[order[edgeGroupStart]]
+	hasSecond = numpy.flatnonzero(edgeSize > 1)
+	table.faces[hasSecond, 1] = cornerFace[order[edgeGroupStart[hasSecond]+1]]
+	for e in numpy.flatnonzero(edgeSize > 2).tolist():
+		s = edgeGroupStart[e]
+		table.extraFaces[e] = cornerFace[order[s+2:s+edgeSize[e]]].tolist()
+	table.isBoundary = edgeSize == 1
+	table.valid = numpy.ones(nEdge, dtype=bool)
+
+	table.vertBoundary = numpy.zeros(nVert, dtype=bool)
+	table.vertBoundary[table.verts[table.isBoundary].ravel()] = True
+
+	_orderVertexEdges(table, faceVerts, cornerEdge, prevCorner, nVert)
+	return table
+
+def _orderVertexEdges(table, faceVerts, cornerEdge, prevCorner, nVert):
+	'''
+	Order each vertex's edges into a fan: consecutive edges share a face and
+	a boundary edge (if exists) comes first. The order is that of the incremental
+	construction: it starts from the first edge, or the first boundary edge swapped
+	to the front, and steps to the neighbour coming first in the list so swapped,
+	the two boundary edges of a vertex counting as sharing the missing face.
+	'''
+	nEdge = len(table.verts)
+	edgeVerts = table.verts
+	# a node is an (end point, edge) pair; node e is (verts[e][0], e), node nEdge+e is (verts[e][1], e)
+	nodeVert = numpy.concatenate((edgeVerts[:, 0], edgeVerts[:, 1]))
+	nodeEdge = numpy.concatenate((numpy.arange(nEdge), numpy.arange(nEdge)))
+	nodeOrder = numpy.lexsort((nodeEdge, nodeVert))
+	degree = numpy.bincount(nodeVert, minlength=nVert)
+	vertEdgeStart = numpy.zeros(nVert+1, dtype=numpy.int64)
+	numpy.cumsum(degree, out=vertEdgeStart[1:])
+	# unordered lists, edges ascending, as the incremental construction appends them
+	vertNodes = nodeOrder
+
+	# every corner links the two edges it touches at its vertex
+	eOut = cornerEdge; eIn = cornerEdge[prevCorner]
+	nOut = numpy.where(edgeVerts[eOut, 0] == faceVerts, eOut, eOut + nEdge)
+	nIn = numpy.where(edgeVerts[eIn, 0] == faceVerts, eIn, eIn + nEdge)
+	linkSrc = numpy.concatenate((nOut, nIn))
+	linkDst = numpy.concatenate((nIn, nOut))
+	linkOrder = numpy.argsort(linkSrc, kind='stable')
+	linkSrc = linkSrc[linkOrder]; linkDst = linkDst[linkOrder]
+	linkCount = numpy.bincount(linkSrc, minlength=2*nEdge)
+	linkStart = numpy.zeros(2*nEdge+1, dtype=numpy.int64)
+	numpy.cumsum(linkCount, out=linkStart[1:])
+	slot = numpy.arange(len(linkSrc), dtype=numpy.int64) - linkStart[linkSrc]
+	nbr = numpy.full((2*nEdge, 2), -1, dtype=numpy.int64)
+	keep = slot < 2
+	nbr[linkSrc[keep], slot[keep]] = linkDst[keep]
+
+	# vertices whose fan is not a simple path/cycle are handled one by one afterwards
+	isLoop = edgeVerts[:, 0] == edgeVerts[:, 1]
+	badNode = (linkCount > 2) | (linkCount == 0) | numpy.concatenate((isLoop, isLoop))
+	irregular = numpy.zeros(nVert, dtype=bool)
+	irregular[nodeVert[badNode]] = True
+	nBoundaryNode = numpy.bincount(nodeVert[linkCount == 1], minlength=nVert)
+	irregular |= (nBoundaryNode != 0) & (nBoundaryNode != 2)
+
+	# start node: first boundary node of the vertex, or its first node
+	startNode = numpy.full(nVert, -1, dtype=numpy.int64)
+	sortedNodes = vertNodes
+	isBoundaryNode = linkCount[sortedNodes] == 1
+	boundaryPos = numpy.flatnonzero(isBoundaryNode)
+	(boundaryVert, firstPos) = numpy.unique(nodeVert[sortedNodes[boundaryPos]], return_index=True)
+	startNode[boundaryVert] = sortedNodes[boundaryPos[firstPos]]
+	hasEdges = degree > 0
+	noStart = hasEdges & (startNode == -1)
+	startNode[noStart] = sortedNodes[vertEdgeStart[:-1][noStart]]
+
+	# close the fans of boundary vertices: their two boundary edges are linked as well
+	boundaryNodes = sortedNodes[boundaryPos]
+	pairs = boundaryNodes[((nBoundaryNode == 2) & ~irregular)[nodeVert[boundaryNodes]]].reshape(-1, 2)
+	nbr[pairs[:, 0], 1] = pairs[:, 1]
+	nbr[pairs[:, 1], 1] = pairs[:, 0]
+	# the first step goes to the neighbour of the start coming first in the vertex's list once
+	# the start is swapped with the list head; the first link is taken first
+	nodeRank = numpy.empty(2*nEdge, dtype=numpy.int64)
+	nodeRank[sortedNodes] = numpy.arange(2*nEdge, dtype=numpy.int64) - vertEdgeStart[nodeVert[sortedNodes]]
+	starts = startNode[hasEdges]
+	head = sortedNodes[vertEdgeStart[:-1][hasEdges]]
+	listPos = lambda node: numpy.where(node == head, nodeRank[starts], nodeRank[node])
+	(c0, c1) = (nbr[starts, 0], nbr[starts, 1])
+	swap = (c0 != -1) & (c1 != -1) & (listPos(c1) < listPos(c0))
+	nbr[starts[swap]] = nbr[starts[swap]][:, ::-1]
+
+	# walk all regular fans simultaneously, the highest degree vertices first
+	walkVerts = numpy.flatnonzero(hasEdges & ~irregular)
+	walkVerts = walkVerts[numpy.argsort(-degree[walkVerts], kind='stable')]
+	walkDegree = degree[walkVerts]
+	ring = numpy.empty(2*nEdge, dtype=numpy.int64)
+	visited = numpy.zeros(2*nEdge, dtype=bool)
+	ok = numpy.ones(len(walkVerts), dtype=bool)
+	cur = startNode[walkVerts]; prev = numpy.full(len(walkVerts), -1, dtype=numpy.int64)
+	base = vertEdgeStart[walkVerts]
+	ring[base] = cur
+	visited[cur] = True
+	nActive = len(walkVerts)
+	step = 1
+	while True:
+		nActive = int(numpy.searchsorted(-walkDegree, -step, side='left'))
+		if nActive == 0: break
+		cur = cur[:nActive]; prev = prev[:nActive]
+		n0 = nbr[cur, 0]; n1 = nbr[cur, 1]
+		nxt = numpy.where(n0 != prev, n0, n1)
+		bad = (nxt == -1)
+		nxt = numpy.where(bad, cur, nxt)
+		bad |= visited[nxt]
+		ok[:nActive] &= ~bad
+		visited[nxt] = True
+		ring[base[:nActive] + step] = nxt
+		prev = cur; cur = nxt
+		step += 1
+	irregular[walkVerts[~ok]] = True
+	vertEdges = numpy.empty(2*nEdge, dtype=numpy.int64)
+	vertEdges[:] = ring
+	# fall back to the greedy ordering for the irregular vertices
+	for v in numpy.flatnonzero(irregular & hasEdges).tolist():
+		s = vertEdgeStart[v]; t = vertEdgeStart[v+1]
+		edgeList = (vertNodes[s:t] % nEdge).tolist()
+		vertEdges[s:t] = _greedyOrder(table, edgeList)
+	walked = numpy.zeros(nVert, dtype=bool)
+	walked[walkVerts[ok]] = True
+	walkedSlots = numpy.repeat(walked, degree)
+	vertEdges[walkedSlots] %= nEdge
+
+	# set idxAtVert
+	slotVert = numpy.repeat(numpy.arange(nVert, dtype=numpy.int64), degree)
+	slotIndex = numpy.arange(2*nEdge, dtype=numpy.int64) - vertEdgeStart[slotVert]
+	side = (edgeVerts[vertEdges, 0] != slotVert).astype(numpy.int64)
+	table.idxAtVert = numpy.full((nEdge, 2), -1, dtype=numpy.int64)
+	table.idxAtVert[vertEdges, side] = slotIndex
+	table.vertEdgeStart = vertEdgeStart
+	table.vertEdges = vertEdges
+
+def _greedyOrder(table, edgeList):
+	'''
+	Order one vertex's edges greedily: a boundary edge first, then repeatedly
+	an edge sharing a face with the previous one, else the next boundary edge.
+	Used for non-manifold vertices; as in the incremental construction, only the
+	first two faces of an edge count and two boundary edges share the missing face.
+	'''
+	edgeList = edgeList[:]
+	faces = dict((e, table.faces[e].tolist()) for e in edgeList)
+	isBoundary = lambda e: faces[e][0] == -1 or faces[e][1] == -1
+	for i in range(0, len(edgeList)):
+		if isBoundary(edgeList[i]):
+			edgeList[0], edgeList[i] = edgeList[i], edgeList[0]
+			break
+	for i in range(0, len(edgeList)-1):
+		(f0, f1) = faces[edgeList[i]]
+		found = -1
+		for j in range(i+1, len(edgeList)):
+			if f0 != -1 and (f0 in faces[edgeList[j]] or f1 in faces[edgeList[j]]):
+				found = j
+				break
+		if found == -1:
+			for j in range(i+1, len(edgeList)):
+				if isBoundary(edgeList[j]):
+					found = j
+					break
+		if found != -1:
+			edgeList[i+1], edgeList[found] = edgeList[found], edgeList[i+1]
+	return edgeList
+
+# HalfEdgeMesh class
+# Half-edge connectivity in flat integer arrays. Half-edge h is the corner h of
+# the face list, running from its corner vertex to the next corner's vertex.
+# fields:
+#     vertex	---- H target vertex of each half-edge
+#     face	---- H face of each half-edge
+#     next	---- H next half-edge in the same face
+#     twin	---- H opposite half-edge; -1 on boundary, non-manifold or inconsistently oriented edges
+#     vertHalfEdge	---- N one outgoing half-edge per vertex (a boundary one if exists); -1 for isolated vertices
+#     faceHalfEdge	---- F first half-edge of each face
+class HalfEdgeMesh:
+	def __init__(self, faceStart, faceVerts, nVert):
+		faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+		faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+		(cornerFace, nextCorner, prevCorner) = CornerLinks(faceStart)
+		origin = faceVerts; target = faceVerts[nextCorner]
+		nHalfEdge = len(faceVerts)
+		self.vertex = target.astype(numpy.int32)
+		self.face = cornerFace.astype(numpy.int32)
+		self.next = nextCorner.astype(numpy.int32)
+		self.faceHalfEdge = faceStart[:-1].astype(numpy.int32)
+
+		# pair up the two half-edges of every manifold, consistently oriented edge
+		key = numpy.minimum(origin, target) * max(nVert, 1) + numpy.maximum(origin, target)
+		order = numpy.argsort(key, kind='stable')
+		sortedKey = key[order]
+		isFirst = numpy.ones(nHalfEdge, dtype=bool)
+		isFirst[1:] = sortedKey[1:] != sortedKey[:-1]
+		groupStart = numpy.flatnonzero(isFirst)
+		groupSize = numpy.diff(numpy.append(groupStart, nHalfEdge))
+		pairStart = groupStart[groupSize == 2]
+		h0 = order[pairStart]; h1 = order[pairStart+1]
+		opposite = (origin[h0] == target[h1]) & (origin[h1] == target[h0]) & (origin[h0] != target[h0])
+		h0 = h0[opposite]; h1 = h1[opposite]
+		self.twin = numpy.full(nHalfEdge, -1, dtype=numpy.int32)
+		self.twin[h0] = h1; self.twin[h1] = h0
+
+		# outgoing half-edge per vertex, boundary ones take precedence
+		self.vertHalfEdge = numpy.full(nVert, -1, dtype=numpy.int32)
+		halfEdges = numpy.arange(nHalfEdge, dtype=numpy.int32)
+		self.vertHalfEdge[origin] = halfEdges
+		isBoundary = self.twin == -1
+		self.vertHalfEdge[origin[isBoundary]] = halfEdges[isBoundary]
+
+	def Prev(self, h):
+		'''
+		Previous half-edge in the same face
+		'''
+		p = h
+		while True:
+			n = self.next[p]
+			if n == h: return p
+			p = n
+
+	def Origin(self, h):
+		'''
+		Source vertex of half-edge h
+		'''
+		return int(self.vertex[self.Prev(h)])
+
+	def VertexOutgoing(self, v):
+		'''
+		Iterate the outgoing half-edges of vertex v in fan order
+		'''
+		h0 = int(self.vertHalfEdge[v])
+		if h0 == -1: return
+		h = h0
+		while True:
+			yield h
+			h = int(self.twin[self.Prev(h)])
+			if h == -1 or h == h0: return
+
+	def VertexFaces(self, v):
+		'''
+		Iterate the faces around vertex v
+		'''
+		for h in self.VertexOutgoing(v):
+			yield int(self.face[h])
+
+	def VertexVertices(self, v):
+		'''
+		Iterate the vertices adjacent to vertex v
+		'''
+		h = -1
+		for h in self.VertexOutgoing(v):
+			yield int(self.vertex[h])
+		# the fan of a boundary vertex ends at an incoming boundary half-edge
+		if h != -1:
+			p = self.Prev(h)
+			if self.twin[p] == -1: yield self.Origin(p)
+
+	def FaceHalfEdges(self, f):
+		'''
+		Iterate the half-edges of face f
+		'''
+		h0 = int(self.faceHalfEdge[f])
+		h = h0
+		while True:
+			yield h
+			h = int(self.next[h])
+			if h == h0: return
+
+	def FaceNeighbors(self, f):
+		'''
+		Iterate the faces sharing an edge with face f
+		'''
+		for h in self.FaceHalfEdges(f):
+
+			t = self.twin[h]
+			if t != -1: yield int(self.face[t])
+
+	def BoundaryWalk(self, h0):
+		'''
+		Iterate the boundary half-edges of the loop containing boundary half-edge h0
+		'''
+		assert self.twin[h0] == -1, 'half-edge %d is not on the boundary.' % h0
+		h = h0
+		for i in range(0, len(self.twin)):
+			yield h
+			# rotate around the target vertex until the next boundary half-edge
+			h = int(self.next[h])
+			while self.twin[h] != -1:
+				h = int(self.next[self.twin[h]])
+			if h == h0: return
+
+	def BoundaryLoops(self):
+		'''
+		Return all boundary loops as lists of vertices
+		'''
+		loops = []
+		visited = set()
+		for h0 in numpy.flatnonzero(self.twin == -1).tolist():
+			if h0 in visited: continue
+			loop = []
+			for h in self.BoundaryWalk(h0):
+				if h in visited: break
+				visited.add(h)
+				loop.append(self.Origin(h))
+			loops.append(loop)
+		return loops
+
+# CSRAdjacency class
+# Adjacency in compressed sparse row form: the neighbors of row i are
+# indices[indptr[i]:indptr[i+1]], sorted ascending. (indptr, indices) can be
+# handed to scipy.sparse.csr_matrix without copying.
+# fields:
+#     vertVerts	---- (indptr, indices) of vertex-vertex adjacency (vertices sharing an edge)
+#     vertFaces	---- (indptr, indices) of vertex-face adjacency
+#     faceFaces	---- (indptr, indices) of face-face adjacency (faces sharing an edge)
+class CSRAdjacency:
+	def __init__(self, faceStart, faceVerts, nVert):
+		faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+		faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+		nFace = len(faceStart) - 1
+		(cornerFace, nextCorner, prevCorner) = CornerLinks(faceStart)
+		origin = faceVerts; target = faceVerts[nextCorner]
+
+		self.vertFaces = VertexFaces(faceStart, faceVerts, nVert)
+		notLoop = origin != target
+		self.vertVerts = _csrFromPairs(numpy.concatenate((origin[notLoop], target[notLoop])), \
+			numpy.concatenate((target[notLoop], origin[notLoop])), nVert, nVert)
+
+		# faces sharing an edge are the corners grouped by undirected edge key
+		key = numpy.minimum(origin, target) * max(nVert, 1) + numpy.maximum(origin, target)
+		order = numpy.argsort(key, kind='stable')
+		sortedKey = key[order]
+		isFirst = numpy.ones(len(order), dtype=bool)
+		isFirst[1:] = sortedKey[1:] != sortedKey[:-1]
+		groupStart = numpy.flatnonzero(isFirst)
+		groupSize = numpy.diff(numpy.append(groupStart, len(order)))
+		pairStart = groupStart[groupSize == 2]
+		f0 = [cornerFace[order[pairStart]]]; f1 = [cornerFace[order[pairStart+1]]]
+		# non-manifold edges link every pair of their faces
+		for s, size in zip(groupStart[groupSize > 2].tolist(), groupSize[groupSize > 2].tolist()):
+			faces = cornerFace[order[s:s+size]]
+			(i, j) = numpy.triu_indices(size, 1)
+			f0.append(faces[i]); f1.append(faces[j])
+		f0 = numpy.concatenate(f0); f1 = numpy.concatenate(f1)
+		notSelf = f0 != f1
+		f0 = f0[notSelf]; f1 = f1[notSelf]
+		self.faceFaces = _csrFromPairs(numpy.concatenate((f0, f1)), numpy.concatenate((f1, f0)), nFace, nFace)
+
+	@staticmethod
+	def Row(csr, i):
+		'''
+		Return the neighbors of row i of an (indptr, indices) pair
+		'''
+		(indptr, indices) = csr
+		return indices[indptr[i]:indptr[i+1]]
+
+def VertexFaces(faceStart, faceVerts, nVert):
+	'''
+	Return the vertex-face adjacency as (indptr, indices), see CSRAdjacency
+	'''
+	faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+	faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+	cornerFace = numpy.repeat(numpy.arange(len(faceStart)-1), numpy.diff(faceStart))
+	# corners are in face order, so a stable sort by vertex keeps each row ascending
+	order = numpy.argsort(faceVerts, kind='stable')
+	(rows, cols) = (faceVerts[order], cornerFace[order])
+	# a face repeating a vertex is listed once
+	keep = numpy.ones(len(rows), dtype=bool)
+	keep[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+	indptr = numpy.zeros(nVert+1, dtype=numpy.int64)
+	numpy.cumsum(numpy.bincount(rows[keep], minlength=nVert), out=indptr[1:])
+	return (indptr, cols[keep].astype(numpy.int32))
+
+def GatherRows(csr, rows):
+	'''
+	Return the rows of an (indptr, indices) pair concatenated, in the order of rows
+	'''
+	(indptr, indices) = csr
+	rows = numpy.asarray(rows, dtype=numpy.int64)
+	start = indptr[rows]
+	counts = indptr[rows+1] - start
+	# offset of every gathered entry into indices
+	offsets = numpy.repeat(start - (numpy.cumsum(counts) - counts), counts) + numpy.arange(counts.sum())
+	return indices[offsets]
+
+def _csrFromPairs(rows, cols, nRows, nCols):
+	'''
+	Build (indptr, indices) from (row, col) pairs, dropping duplicates
+	'''
+	key = numpy.unique(rows.astype(numpy.int64) * max(nCols, 1) + cols)
+	rows = key // max(nCols, 1)
+	indptr = numpy.zeros(nRows+1, dtype=numpy.int64)
+	numpy.cumsum(numpy.bincount(rows, minlength=nRows), out=indptr[1:])
+	indices = (key - rows * max(nCols, 1)).astype(numpy.int32)
+	return (indptr, indices)
+
+def SplitNonManifoldVerts(faceStart, faceVerts, nVert):
+	'''
+	Split every vertex whose faces form more than one edge-connected fan.
+	The fan with the lowest corner keeps the vertex, each further fan gets a
+	new vertex numbered from nVert on.
+	Return (newFaceVerts, sourceVert), sourceVert[i] being the original
+	vertex of new vertex nVert+i.
+	'''
+	faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+	faceVerts = numpy.asarray(faceVerts, dtype=numpy.int64)
+	nCorner = len(faceVerts)
+	(cornerFace, nextCorner, prevCorner) = CornerLinks(faceStart)
+	v0 = faceVerts; v1 = faceVerts[nextCorner]
+
+	# corners at the same vertex are linked across every manifold edge
+	key = numpy.minimum(v0, v1) * max(nVert, 1) + numpy.maximum(v0, v1)
+	order = numpy.argsort(key, kind='stable')
+	sortedKey = key[order]
+	isFirst = numpy.ones(nCorner, dtype=bool)
+	isFirst[1:] = sortedKey[1:] != sortedKey[:-1]
+	groupStart = numpy.flatnonzero(isFirst)
+	groupSize = numpy.diff(numpy.append(groupStart, nCorner))
+	pairStart = groupStart[groupSize == 2]
+	a = order[pairStart]; b = order[pairStart+1]
+	notLoop = v0[a] != v1[a]
+	a = a[notLoop]; b = b[notLoop]
+	same = faceVerts[a] == faceVerts[b]
+	linkA = numpy.concatenate((a, nextCorner[a]))
+	linkB = numpy.concatenate((numpy.where(same, b, nextCorner[b]), numpy.where(same, nextCorner[b], b)))
+
+	# connected components of the corners by min-label propagation with pointer jumping
+	label = numpy.arange(nCorner, dtype=numpy.int64)
+	while True:
+		m = numpy.minimum(label[linkA], label[linkB])
+		newLabel = label.copy()
+		numpy.minimum.at(newLabel, linkA, m)
+		numpy.minimum.at(newLabel, linkB, m)
+		newLabel = newLabel[newLabel]
+		if numpy.array_equal(newLabel, label): break
+		label = newLabel
+
+	# number the fans of each vertex
+	(fanKey, inverse) = numpy.unique(faceVerts * max(nCorner, 1) + label, return_inverse=True)
+	fanVert = fanKey // max(nCorner, 1)
+	isFirstFan = numpy.ones(len(fanKey), dtype=bool)
+	isFirstFan[1:] = fanVert[1:] != fanVert[:-1]
+	fanId = fanVert.copy()
+	extra = numpy.flatnonzero(~isFirstFan)
+	fanId[extra] = nVert + numpy.arange(len(extra), dtype=numpy.int64)
+	return (fanId[inverse.ravel()], fanVert[extra])
+
+def FanTriangulate(faceStart):
+	'''
+	Return the Tx3 corner indices of the fan triangulation of the faces
+	'''
+	faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+	nTri = numpy.maximum(numpy.diff(faceStart) - 2, 0)
+	triFace = numpy.repeat(numpy.arange(len(nTri), dtype=numpy.int64), nTri)
+	triStart = numpy.cumsum(nTri) - nTri
+	i = numpy.arange(len(triFace), dtype=numpy.int64) - triStart[triFace] + 1
+	s = faceStart[:-1][triFace]
+	return numpy.stack((s, s + i, s + i + 1), axis=1)
+
+def RemapFaces(faceStart, faceVerts, realIndex):
+	'''
+	Return (faceStart, faceVerts, kept) of the faces with their vertices mapped through realIndex.
+	A corner mapped to the same vertex as the next one is dropped, and so are the faces left
+	with fewer than three corners; kept flags the faces that remain.
+	'''
+	faceStart = numpy.asarray(faceStart, dtype=numpy.int64)
+	faceVerts = numpy.asarray(realIndex)[faceVerts]
+	(cornerFace, nextCorner, prevCorner) = CornerLinks(faceStart)
+	keepCorner = faceVerts != faceVerts[nextCorner]
+	sizes = numpy.bincount(cornerFace[keepCorner], minlength=len(faceStart)-1)
+	kept = sizes >= 3
+	keepCorner &= kept[cornerFace]
+	newStart = numpy.zeros(int(kept.sum())+1, dtype=numpy.int64)
+	numpy.cumsum(sizes[kept], out=newStart[1:])
+	return (newStart, faceVerts[keepCorner], kept)
@@ -0,0 +1,93 @@
+import numpy
+
+# Batched affine transforms.
+# Transforms are 4x4 matrices acting on column vectors: p' = M[:3, :3] p + M[:3, 3].
+# They compose with @, the right-hand matrix applied first:
+#     matrix = TranslationMatrix(offset) @ QuaternionMatrix(q)
+#     TransformPoints(matrix, positions, out=positions)
+# Normals transform with the inverse-transpose of the linear part (NormalMatrix).
+# Angles are in degrees, like Geometry.Rotate.
+
+# rows transformed at a time, bounding the temporaries and letting out be the input
+TRANSFORM_BLOCK = 1 << 16
+
+def TranslationMatrix(offset):
+	'''
+	Return the 4x4 matrix of a translation by offset
+	'''
+	matrix = numpy.eye(4)
+	matrix[:3, 3] = numpy.asarray(offset, dtype=numpy.float64).reshape(3)
+	return matrix
+
+def ScaleMatrix(factors):
+	'''
+	Return the 4x4 matrix of a scaling by one factor or by three per-axis factors
+	'''
+	matrix = numpy.eye(4)
+	matrix[[0, 1, 2], [0, 1, 2]] = numpy.broadcast_to(numpy.asarray(factors, dtype=numpy.float64), 3)
+	return matrix
+
+def AxisAngleMatrix(axis, angle):
+	'''
+	Return the 4x4 matrix of a rotation by angle degrees around axis, right-handed
+	'''
+	axis = numpy.asarray(axis, dtype=numpy.float64).reshape(3)
+	axis = axis / numpy.sqrt((axis * axis).sum())
+	half = numpy.radians(angle) / 2.0
+	return QuaternionMatrix(numpy.concatenate(([numpy.cos(half)], numpy.sin(half) * axis)))
+
+def QuaternionMatrix(q):
+	'''
+	Return the 4x4 matrix of the rotation of quaternion q given as (w, x, y, z);
+	q need not be normalized
+	'''
+	(w, x, y, z) = numpy.asarray(q, dtype=numpy.float64).reshape(4) / numpy.sqrt(numpy.square(q).sum())
+	matrix = numpy.eye(4)
+	matrix[:3, :3] = [[1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y)], \
+		[2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x)], \
+		[2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y)]]
+	return matrix
+
+def NormalMatrix(matrix):
+	'''
+	Return the 3x3 inverse-transpose of the linear part of a 4x4 matrix
+	'''
+	return numpy.linalg.inv(numpy.asarray(matrix, dtype=numpy.float64)[:3, :3]).T
+
+def IsSimilarity(matrix, tolerance = 1e-9):
+	'''
+	Whether a 4x4 matrix only rotates, reflects, scales uniformly and translates,
+	so that it keeps angles and area ratios
+	'''
+	linear = numpy.asarray(matrix, dtype=numpy.float64)[:3, :3]
+	gram = linear.T @ linear
+	return bool(numpy.abs(gram - numpy.eye(3) * numpy.trace(gram) / 3.0).max() <= tolerance * max(numpy.trace(gram), 1e-300))
+
+def TransformPoints(matrix, points, out = None):
+	'''
+	Return the Nx3 points transformed by a 4x4 matrix; out may be points itself to
+	transform them in place, or another Nx3 array, otherwise a new array is returned
+	'''
+	matrix = numpy.asarray(matrix, dtype=numpy.float64)
+	(linear, offset) = (matrix[:3, :3].T, matrix[:3, 3])
+	return _transformRows(points, out, lambda rows: rows @ linear + offset)
+
+def TransformNormals(matrix, normals, out = None):
+	'''
+	Return the Nx3 unit normals transformed by a 4x4 matrix: by the inverse-transpose
+	of its linear part and renormalized, zero normals staying zero; out as in TransformPoints
+	'''
+	linear = NormalMatrix(matrix).T
+	def transform(rows):
+		rows = rows @ linear
+		length = numpy.sqrt((rows * rows).sum(axis=1))
+		return rows / numpy.where(length == 0.0, 1.0, length)[:, None]
+	return _transformRows(normals, out, transform)
+
+# apply transform to blocks of rows into out, or into a new array of the dtype of rows
+def _transformRows(rows, out, transform):
+	rows = numpy.asarray(rows).reshape(-1, 3)
+	if out is None: out = numpy.empty(rows.shape, dtype=rows.dtype if rows.dtype.kind == 'f' else numpy.float64)
+	for start in range(0, len(rows), TRANSFORM_BLOCK):
+		out[start:start+TRANSFORM_BLOCK] = transform(rows[start:start+TRANSFORM_BLOCK].astype(numpy.float64))
+	return out
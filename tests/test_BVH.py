@@ -0,0 +1,137 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.BVH import BVH, _triangleBoxOverlap
+from MeshLib.Topology import FanTriangulate
+import numpy
+import os
+import unittest
+
+# BVH queries against brute force over every triangle.
+#     python -m unittest MeshLib.tests.test_BVH
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+# the triangles of the valid faces and the face of each
+def _triangles(faceStart, faceVerts, faceValid):
+	tris = faceVerts[FanTriangulate(faceStart)].reshape(-1, 3)
+	triFace = numpy.repeat(numpy.arange(len(faceStart) - 1), numpy.diff(faceStart) - 2)
+	keep = numpy.asarray(faceValid, dtype=bool)[triFace]
+	return (tris[keep], triFace[keep])
+
+# ray parameters of a ray through all triangles, inf where it misses
+def _rayAll(o, d, a, b, c):
+	(e1, e2) = (b - a, c - a)
+	n = numpy.cross(e1, e2)
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		t = ((a - o) * n).sum(axis=1) / (n @ d)
+		p = o + t[:, None] * d
+		# inside when on the inner side of all three edges
+		inside = numpy.ones(len(a), dtype=bool)
+		for (u, v) in ((a, b), (b, c), (c, a)):
+			inside &= (numpy.cross(v - u, p - u) * n).sum(axis=1) >= -1e-12 * (n * n).sum(axis=1)
+	return numpy.where(inside & (t >= 0.0), t, numpy.inf)
+
+# distances of a point to all triangles: to the plane inside, to the nearest edge outside
+def _distanceAll(p, a, b, c):
+	n = numpy.cross(b - a, c - a)
+	n /= numpy.sqrt((n * n).sum(axis=1))[:, None]
+	foot = p - ((p - a) * n).sum(axis=1)[:, None] * n
+	inside = numpy.ones(len(a), dtype=bool)
+	for (u, v) in ((a, b), (b, c), (c, a)):
+		inside &= (numpy.cross(v - u, foot - u) * n).sum(axis=1) >= 0.0
+	dist = numpy.where(inside, numpy.sqrt(((p - foot) ** 2).sum(axis=1)), numpy.inf)
+	for (u, v) in ((a, b), (b, c), (c, a)):
+		s = numpy.clip(((p - u) * (v - u)).sum(axis=1) / ((v - u) ** 2).sum(axis=1), 0.0, 1.0)
+		dist = numpy.minimum(dist, numpy.sqrt(((u + s[:, None] * (v - u) - p) ** 2).sum(axis=1)))
+	return dist
+
+# a grid of non-planar quads, some of them invalid; return (positions, faceStart, faceVerts, faceValid)
+def _quadGrid(n, seed):
+	rng = numpy.random.default_rng(seed)
+	(x, y) = numpy.meshgrid(numpy.arange(n), numpy.arange(n))
+	positions = numpy.stack((x.ravel(), y.ravel(), rng.random(n * n)), axis=1).astype(numpy.float64)
+	quads = (numpy.arange(n - 1)[None, :] + n * numpy.arange(n - 1)[:, None]).ravel()
+	faceVerts = numpy.stack((quads, quads + 1, quads + n + 1, quads + n), axis=1).ravel()
+	faceStart = numpy.arange(0, len(faceVerts) + 1, 4)
+	return (positions, faceStart, faceVerts, rng.random(len(quads)) > 0.1)
+
+class BVHTest(unittest.TestCase):
+	def cases(self):
+		mesh = Mesh(True)
+		mesh.LoadMesh(os.path.join(MODEL_DIR, 'fandisk.m'))
+		faces = mesh.arrays.faces
+		yield (mesh.arrays.positions, numpy.arange(0, 3 * len(faces) + 1, 3), faces.ravel(), numpy.ones(len(faces), dtype=bool))
+		yield _quadGrid(30, 0)
+
+	def setUpCase(self, positions, faceStart, faceVerts, faceValid):
+		bvh = BVH(positions, faceStart, faceVerts, faceValid, leafSize = 4)
+		(tris, triFace) = _triangles(faceStart, faceVerts, faceValid)
+		corners = (positions[tris[:, 0]], positions[tris[:, 1]], positions[tris[:, 2]])
+		(lo, hi) = (positions.min(axis=0), positions.max(axis=0))
+		return (bvh, triFace, corners, lo, hi, numpy.random.default_rng(len(faceStart)))
+
+	def testRays(self):
+		for case in self.cases():
+			(bvh, triFace, corners, lo, hi, rng) = self.setUpCase(*case)
+			origins = lo + (rng.random((200, 3)) * 1.6 - 0.3) * (hi - lo)
+			directions = lo + rng.random((200, 3)) * (hi - lo) - origins
+			# some rays parallel to the axes, some stopped short
+			directions[:20, :2] = 0.0
+			tMax = numpy.where(numpy.arange(200) % 3 == 0, 0.5, numpy.inf)
+			(faces, t, verts, bary) = bvh.RayIntersect(origins, directions, tMax)
+			self.assertTrue(numpy.isfinite(t).any() and not numpy.isfinite(t).all())
+			for q in range(0, 200):
+				tAll = _rayAll(origins[q], directions[q], *corners)
+				tAll[tAll > tMax[q]] = numpy.inf
+				self.assertAlmostEqual(t[q], tAll.min(), delta=1e-9 * max(1.0, tAll.min()) if numpy.isfinite(tAll.min()) else 0.0)
+				if numpy.isfinite(t[q]):
+					self.assertIn(faces[q], triFace[numpy.abs(tAll - t[q]) <= 1e-9 * max(1.0, t[q])])
+					self.assertTrue(numpy.allclose(bary[q] @ case[0][verts[q]], origins[q] + t[q] * directions[q]))
+				else: self.assertEqual(faces[q], -1)
+
+	def testClosestPoints(self):
+		for case in self.cases():
+			(bvh, triFace, corners, lo, hi, rng) = self.setUpCase(*case)
+			points = lo + (rng.random((200, 3)) * 1.4 - 0.2) * (hi - lo)
+			maxDistance = 0.05 * numpy.sqrt(((hi - lo) ** 2).sum())
+			for limit in (numpy.inf, maxDistance):
+				(faces, closest, verts, bary, distances) = bvh.ClosestPoints(points, limit)
+				for q in range(0, 200):
+					dAll = _distanceAll(points[q], *corners)
+					if dAll.min() > limit:
+						self.assertEqual(faces[q], -1)
+						continue
+					self.assertAlmostEqual(distances[q], dAll.min(), delta=1e-9)
+					self.assertIn(faces[q], triFace[dAll <= dAll.min() + 1e-9])
+					self.assertTrue((bary[q] >= -1e-12).all())
+					self.assertTrue(numpy.allclose(bary[q] @ case[0][verts[q]], closest[q]))
+
+	def testBoxes(self):
+		for case in self.cases():
+			(bvh, triFace, corners, lo, hi, rng) = self.setUpCase(*case)
+			centers = lo + rng.random((100, 3)) * (hi - lo)
+			sizes = rng.random((100, 3)) * 0.2 * (hi - lo)
+			(indptr, faces) = bvh.BoxFaces(centers - sizes, centers + sizes)
+			for q in range(0, 100):
+				(boxMin, boxMax) = (numpy.tile(centers[q] - sizes[q], (len(triFace), 1)), numpy.tile(centers[q] + sizes[q], (len(triFace), 1)))
+				expected = numpy.unique(triFace[_triangleBoxOverlap(*corners, boxMin, boxMax)])
+				self.assertEqual(faces[indptr[q]:indptr[q+1]].tolist(), expected.tolist())
+				# a face with a corner in the box is found
+				for corner in corners:
+					inBox = ((corner >= boxMin) & (corner <= boxMax)).all(axis=1)
+					self.assertTrue(numpy.isin(triFace[inBox], expected).all())
+
+	def testMeshBVH(self):
+		for useArrays in (False, True):
+			mesh = Mesh(useArrays)
+			mesh.LoadMesh(os.path.join(MODEL_DIR, 'fandisk.m'))
+			bvh = mesh.BVH()
+			self.assertIs(mesh.BVH(), bvh)
+			before = bvh.positions[0].copy()
+			# rebuilt after an edit, on the moved positions
+			mesh.verts[0].pos = mesh.verts[0].pos * 2.0
+			mesh.MarkMoved([0])
+			self.assertIsNot(mesh.BVH(), bvh)
+			self.assertTrue(numpy.allclose(mesh.BVH().positions[0], before * 2.0))
+
+if __name__ == '__main__':
+	unittest.main()
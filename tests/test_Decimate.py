@@ -0,0 +1,113 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.Decimate import QuadricDecimator, ClusterFaces, LODPyramid, _faceQuadrics, _SYMMETRIC
+from MeshLib.MeshArrays import VectorArray
+import numpy
+import os
+import unittest
+
+# Quadric decimation and vertex clustering against the invariants they keep and
+# against quadric errors and clusterings recomputed from the original mesh.
+#     python -m unittest MeshLib.tests.test_Decimate
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+def _load(name, useArrays = True):
+	mesh = Mesh(useArrays)
+	mesh.LoadMesh(os.path.join(MODEL_DIR, name))
+	return mesh
+
+# (edges as sorted vertex pairs, number of triangles on each) of Nx3 triangles
+def _edgeCounts(faces):
+	pairs = numpy.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+	return numpy.unique(pairs, axis=0, return_counts=True)
+
+class DecimateTest(unittest.TestCase):
+	def assertValid(self, positions, faces, before):
+		# indices in range, no degenerate or repeated triangles
+		self.assertTrue(((faces >= 0) & (faces < len(positions))).all())
+		self.assertTrue(((faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])).all())
+		self.assertEqual(len(numpy.unique(numpy.sort(faces, axis=1), axis=0)), len(faces))
+		# the same boundary edge structure and Euler characteristic
+		(edges, counts) = _edgeCounts(faces)
+		(edgesBefore, countsBefore) = _edgeCounts(before)
+		self.assertTrue(((counts == 1) | (counts == 2)).all())
+		self.assertEqual(int((counts == 1).sum()), int((countsBefore == 1).sum()))
+		used = len(numpy.unique(faces))
+		self.assertEqual(used - len(edges) + len(faces), len(numpy.unique(before)) - len(edgesBefore) + len(before))
+
+	def testQuadricErrors(self):
+		mesh = _load('fandisk.m')
+		(positions, faces) = (mesh.arrays.positions, mesh.arrays.faces)
+		for (target, limit) in ((2000, None), (None, 1e-6)):
+			decimator = QuadricDecimator(positions, faces)
+			left = decimator.Collapse(target, limit)
+			(newPositions, newFaces, textures, keep, vertMap) = decimator.Result()
+			if target is not None: self.assertTrue(target - 1 <= left <= target)
+			else: self.assertLessEqual(decimator.maxError, limit)
+			self.assertEqual(len(newFaces), left)
+			self.assertValid(newPositions, newFaces, faces)
+			self.assertEqual(vertMap[keep].tolist(), list(range(len(keep))))
+			# the error of a vertex left is that of its position on the planes of all the vertices merged into it
+			quadrics = numpy.zeros((len(keep), 10))
+			numpy.add.at(quadrics, vertMap, _faceQuadrics(positions, faces, len(positions)))
+			point = numpy.hstack((newPositions, numpy.ones((len(keep), 1))))
+			errors = numpy.einsum('ki,kij,kj->k', point, quadrics[:, _SYMMETRIC].reshape(-1, 4, 4), point)
+			self.assertLessEqual(errors.max(), decimator.maxError * (1.0 + 1e-6) + 1e-15)
+			# no face folded over: each normal agrees with the original surface nearby
+			corners = newPositions[newFaces]
+			normals = numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+			(nearFaces, closest, verts, bary, distances) = mesh.BVH().ClosestPoints(corners.mean(axis=1))
+			agree = (normals * mesh.arrays.faceNormals[nearFaces]).sum(axis=1) > 0.0
+			self.assertGreater(agree.mean(), 0.99)
+
+	def testMeshDecimate(self):
+		results = []
+		for useArrays in (False, True):
+			mesh = _load('fandisk_cut.harmonicmap.obj', useArrays)
+			before = numpy.array([[f[0], f[1], f[2]] for f in mesh.faces])
+			positions = VectorArray(mesh.verts, 3).copy()
+			(edges, counts) = _edgeCounts(before)
+			boundary = numpy.unique(edges[counts == 1])
+			mesh.Decimate(3000)
+			faces = numpy.array([[f[0], f[1], f[2]] for f in mesh.faces])
+			newPositions = VectorArray(mesh.verts, 3)
+			self.assertTrue(2999 <= len(faces) <= 3000)
+			self.assertValid(newPositions, faces, before)
+			self.assertEqual(len(mesh.textures), len(mesh.verts))
+			# boundary vertices stay where they are
+			rows = set(map(tuple, newPositions.tolist()))
+			self.assertTrue(all(tuple(p) in rows for p in positions[boundary].tolist()))
+			# derived fields are recomputed on the new faces
+			self.assertEqual(len(mesh.edges), len(_edgeCounts(faces)[0]))
+			results.append((newPositions.copy(), faces, VectorArray(mesh.textures, 2).copy()))
+		for (a, b) in zip(*results):
+			self.assertTrue(numpy.array_equal(a, b))
+
+	def testClusterFaces(self):
+		mesh = _load('fandisk.m')
+		(positions, faces) = (mesh.arrays.positions, mesh.arrays.faces)
+		cellSize = 0.05
+		# every used vertex snapped onto the used vertex of its cell closest to the cell mean
+		used = numpy.unique(faces)
+		origin = positions[used].min(axis=0)
+		cells = dict()
+		for v in used.tolist():
+			cells.setdefault(tuple(numpy.floor((positions[v] - origin) / cellSize).astype(int).tolist()), []).append(v)
+		snap = numpy.arange(len(positions))
+		for members in cells.values():
+			mean = positions[members].mean(axis=0)
+			snap[members] = members[int(((positions[members] - mean) ** 2).sum(axis=1).argmin())]
+		expected = []; seen = set()
+		for f in snap[faces].tolist():
+			key = tuple(sorted(f))
+			if len(set(f)) == 3 and key not in seen:
+				seen.add(key); expected.append(f)
+		self.assertEqual(ClusterFaces(positions, faces, cellSize).tolist(), expected)
+		levels = LODPyramid(positions, faces, 1000)
+		self.assertTrue(numpy.array_equal(levels[0], faces))
+		for (fine, coarse) in zip(levels[:-1], levels[1:]):
+			self.assertLess(len(coarse), len(fine))
+			self.assertTrue(numpy.isin(coarse, fine).all())
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,51 @@
+from MeshLib.utils.FastText import ParseNumbers, TokensPerLine
+from MeshLib.utils.OBJMesh import LoadOBJFile
+from MeshLib.utils.OFFMesh import LoadOFFFile
+from MeshLib.utils.MMesh import LoadMFile
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+# Bulk number parsing: every token is a number or the parse fails, never a
+# shorter array.
+#     python -m unittest MeshLib.tests.test_FastText
+
+class ParseNumbersTest(unittest.TestCase):
+	def setUp(self):
+		self.workDir = tempfile.mkdtemp(prefix='meshtest')
+
+	def tearDown(self):
+		shutil.rmtree(self.workDir, ignore_errors=True)
+
+	def write(self, name, text):
+		fileName = os.path.join(self.workDir, name)
+		output = open(fileName, 'w')
+		output.write(text)
+		output.close()
+		return fileName
+
+	def testNumbers(self):
+		self.assertEqual(ParseNumbers(b' 1 -2.5\t3e2\r\n4 nan\n', numpy.float64)[:4].tolist(), [1.0, -2.5, 300.0, 4.0])
+		self.assertEqual(ParseNumbers(b'1 2\n3', numpy.int64).tolist(), [1, 2, 3])
+		self.assertEqual(len(ParseNumbers(b'  \n', numpy.float64)), 0)
+		data = b'3 0 1 2\n4 0 1 2 3\n'
+		self.assertEqual(len(ParseNumbers(data, numpy.float64, int(TokensPerLine(data).sum()))), 9)
+
+	def testMalformed(self):
+		for data in (b'1 2 x 4\n', b'1 2 3,\n', b'1.0 2.0 3.0abc\n', b'v 1 2 3\n'):
+			self.assertRaises(AssertionError, ParseNumbers, data, numpy.float64)
+		self.assertRaises(AssertionError, ParseNumbers, b'1 2 3\n', numpy.float64, 4)
+
+	def testMalformedFiles(self):
+		obj = self.write('bad.obj', 'v 0 0 0\nv 1 0 0\nv 1 x 0\nf 1 2 3\n')
+		off = self.write('bad.off', 'OFF\n3 1 0\n0 0 0\n1 0 0\n1 1 O\n3 0 1 2\n')
+		m = self.write('bad.m', 'Vertex 1 0 0 0\nVertex 2 1 0 0\nVertex 3 1 1 0,5\nFace 1 1 2 3\n')
+		for workers in (1, 2):
+			self.assertRaises(AssertionError, LoadOBJFile, obj, False, workers)
+			self.assertRaises(AssertionError, LoadOFFFile, off, False, workers)
+			self.assertRaises(AssertionError, LoadMFile, m, False, workers)
+
+if __name__ == '__main__':
+	unittest.main()
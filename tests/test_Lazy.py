@@ -0,0 +1,85 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.MeshArrays import VectorArray
+from MeshLib.Geometry import Vector3D
+from MeshLib.utils.Instrument import AddHook, RemoveHook
+import numpy
+import os
+import unittest
+
+# Lazy loads and incremental updates against eager loads and full recomputations,
+# in object and array mode.
+#     python -m unittest MeshLib.tests.test_Lazy
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+def _load(useArrays, lazy, name = 'fandisk_cut.m'):
+	mesh = Mesh(useArrays)
+	mesh.LoadMesh(os.path.join(MODEL_DIR, name), lazy = lazy)
+	return mesh
+
+# the per-vertex and per-face fields, read straight from the vertices and faces
+def _fields(mesh):
+	return dict(isBoundary = [bool(v.isBoundary) for v in mesh.verts], \
+		vertEdges = [sorted(v.edges) for v in mesh.verts], \
+		faceEdges = [list(f.edges) for f in mesh.faces], \
+		faceNormals = VectorArray([f.normal for f in mesh.faces], 3), \
+		faceAreas = numpy.array([f.area for f in mesh.faces]))
+
+class LazyTest(unittest.TestCase):
+	def assertSameFields(self, a, b):
+		for name in ('isBoundary', 'vertEdges', 'faceEdges'):
+			self.assertEqual(a[name], b[name], name)
+		self.assertTrue(numpy.allclose(a['faceNormals'], b['faceNormals'], atol=1e-12))
+		self.assertTrue(numpy.allclose(a['faceAreas'], b['faceAreas'], rtol=1e-12))
+
+	def testNothingDerivedWhileLoading(self):
+		for useArrays in (False, True):
+			reports = []
+			AddHook(reports.append)
+			try: mesh = _load(useArrays, True)
+			finally: RemoveHook(reports.append)
+			stages = [r.stage for r in reports]
+			self.assertIn('load', stages)
+			self.assertNotIn('load.construct', stages)
+			self.assertNotIn('load.normals', stages)
+			self.assertTrue(all(r.info.get('edges') is None for r in reports))
+			# nor is anything derived by the report
+			reports = []
+			AddHook(reports.append)
+			try: mesh.edges
+			finally: RemoveHook(reports.append)
+			self.assertIn('construct', [r.stage for r in reports])
+
+	def testFieldsDeriveOnRead(self):
+		for useArrays in (False, True):
+			eager = _fields(_load(useArrays, False))
+			lazy = _load(useArrays, True)
+			# read from the vertices and faces first, never from mesh.edges or mesh.normals
+			self.assertEqual(sum(bool(v.isBoundary) for v in lazy.verts), sum(eager['isBoundary']))
+			self.assertSameFields(_fields(lazy), eager)
+			lazy = _load(useArrays, True)
+			self.assertEqual(lazy.faces[0].area, eager['faceAreas'][0])
+			self.assertSameFields(_fields(lazy), eager)
+
+	def testMovedAgainstFullRecompute(self):
+		for useArrays in (False, True):
+			mesh = _load(useArrays, True)
+			rng = numpy.random.default_rng(3)
+			for step in range(0, 3):
+				moved = rng.choice(len(mesh.verts), 20, replace=False).tolist()
+				for vi in moved:
+					mesh.verts[vi].pos = mesh.verts[vi].pos + Vector3D(*rng.normal(0, 0.01, 3).tolist())
+				mesh.MarkMoved(moved)
+				if step == 1: mesh.Refresh()
+				# the faces around the moved vertices read updated without a Refresh
+				incremental = (_fields(mesh), VectorArray(mesh.normals, 3).copy(), mesh.center, mesh.scale)
+				mesh.CalcNormals()
+				full = _fields(mesh)
+				self.assertSameFields(incremental[0], full)
+				self.assertTrue(numpy.allclose(incremental[1], VectorArray(mesh.normals, 3), atol=1e-12))
+				positions = VectorArray(mesh.verts, 3)
+				center = (positions.min(axis=0) + positions.max(axis=0)) / 2.0
+				self.assertTrue(numpy.allclose([incremental[2].x, incremental[2].y, incremental[2].z], center))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,74 @@
+from MeshLib.Mesh import Mesh, LoadMeshes
+from MeshLib.MeshArrays import VectorArray
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+# The batch loader with a pool of workers against loading the files one by one.
+#     python -m unittest MeshLib.tests.test_LoadMeshes
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+# the vertices, faces and derived fields of a mesh as lists and arrays
+def _contents(mesh):
+	return dict(positions = VectorArray(mesh.verts, 3), faces = [list(f) for f in mesh.faces], \
+		normals = VectorArray(mesh.normals, 3), textures = VectorArray(mesh.textures, 2), \
+		faceNormals = VectorArray([f.normal for f in mesh.faces], 3), faceAreas = numpy.array([f.area for f in mesh.faces]), \
+		edges = [(list(e.verts), list(e.faces)) for e in mesh.edges], isBoundary = [bool(v.isBoundary) for v in mesh.verts], \
+		lines = mesh.lines, center = (mesh.center.x, mesh.center.y, mesh.center.z), scale = mesh.scale)
+
+class LoadMeshesTest(unittest.TestCase):
+	def setUp(self):
+		self.workDir = tempfile.mkdtemp(prefix='meshtest')
+		broken = os.path.join(self.workDir, 'broken.off')
+		output = open(broken, 'w')
+		output.write('OFF\n4 2 0\n0 0 0\n1 0 0\n')
+		output.close()
+		self.paths = [os.path.join(MODEL_DIR, 'fandisk.m'), os.path.join(MODEL_DIR, 'fandisk_cut.harmonicmap.obj'), \
+			os.path.join(self.workDir, 'missing.obj'), broken, os.path.join(MODEL_DIR, 'fandisk_cut.m')]
+
+	def tearDown(self):
+		shutil.rmtree(self.workDir, ignore_errors=True)
+
+	def assertSameResults(self, results, reference):
+		self.assertEqual([path for (path, mesh, error) in results], [path for (path, mesh, error) in reference])
+		for ((path, mesh, error), (refPath, refMesh, refError)) in zip(results, reference):
+			self.assertEqual(error is None, refError is None, path)
+			if error is not None:
+				self.assertIsNone(mesh)
+				self.assertEqual(error.strip().splitlines()[-1], refError.strip().splitlines()[-1])
+				continue
+			(a, b) = (_contents(mesh), _contents(refMesh))
+			for key in a.keys():
+				if isinstance(a[key], numpy.ndarray): self.assertTrue(numpy.array_equal(a[key], b[key]), '%s %s' % (path, key))
+				else: self.assertEqual(a[key], b[key], '%s %s' % (path, key))
+
+	def testAgainstSerial(self):
+		for useArrays in (False, True):
+			for constructAdjacency in (True, False):
+				options = dict(useArrays = useArrays, constructAdjacency = constructAdjacency, rmReduntVerts = useArrays)
+				serial = list(LoadMeshes(self.paths, 1, **options))
+				self.assertEqual([error is None for (path, mesh, error) in serial], [True, True, False, False, True])
+				self.assertAlmostEqual(len(serial[0][1].edges), len(serial[0][1].faces) * 1.5 if constructAdjacency else 0)
+				self.assertSameResults(list(LoadMeshes(self.paths, 2, **options)), serial)
+				unordered = list(LoadMeshes(self.paths, 3, ordered = False, **options))
+				unordered.sort(key = lambda result: self.paths.index(result[0]))
+				self.assertSameResults(unordered, serial)
+
+	def testAgainstLoadMesh(self):
+		for useArrays in (False, True):
+			for (path, mesh, error) in LoadMeshes(self.paths[:2], 2, useArrays = useArrays):
+				single = Mesh(useArrays)
+				single.LoadMesh(path)
+				self.assertSameResults([(path, mesh, error)], [(path, single, None)])
+
+	def testEarlyStop(self):
+		for (path, mesh, error) in LoadMeshes(self.paths * 2, 2, useArrays = True):
+			break
+		self.assertEqual(path, self.paths[0])
+		self.assertEqual(len(mesh.faces), len(list(LoadMeshes(self.paths[:1], 1, useArrays = True))[0][1].faces))
+
+if __name__ == '__main__':
+	unittest.main()
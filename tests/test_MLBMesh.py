@@ -0,0 +1,128 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.MeshArrays import VectorArray
+from MeshLib.utils.Instrument import AddHook, RemoveHook
+import MeshLib.utils.MLBMesh
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+# The .mlb container and the sidecar cache, against meshes parsed from their source.
+#     python -m unittest MeshLib.tests.test_MLBMesh
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+# the vertices, faces and derived fields of a mesh as lists and arrays
+def _contents(mesh):
+	return dict(positions = VectorArray(mesh.verts, 3), faces = [list(f) for f in mesh.faces], \
+		normals = VectorArray(mesh.normals, 3), textures = VectorArray(mesh.textures, 2), \
+		faceNormals = VectorArray([f.normal for f in mesh.faces], 3), faceAreas = numpy.array([f.area for f in mesh.faces]), \
+		edges = [(list(e.verts), list(e.faces), bool(e.isBoundary)) for e in mesh.edges], \
+		vertEdges = [list(v.edges) for v in mesh.verts], isBoundary = [bool(v.isBoundary) for v in mesh.verts], \
+		lines = mesh.lines, center = (mesh.center.x, mesh.center.y, mesh.center.z), scale = mesh.scale)
+
+class MLBTest(unittest.TestCase):
+	def setUp(self):
+		self.workDir = tempfile.mkdtemp(prefix='meshtest')
+
+	def tearDown(self):
+		MeshLib.utils.MLBMesh.CACHE_DIR = None
+		shutil.rmtree(self.workDir, ignore_errors=True)
+
+	def copy(self, name):
+		fileName = os.path.join(self.workDir, name)
+		shutil.copy(os.path.join(MODEL_DIR, name), fileName)
+		return fileName
+
+	def assertSameContents(self, a, b):
+		self.assertEqual(sorted(a.keys()), sorted(b.keys()))
+		for key in a.keys():
+			if isinstance(a[key], numpy.ndarray): self.assertTrue(numpy.array_equal(a[key], b[key]), key)
+			else: self.assertEqual(a[key], b[key], key)
+
+	# load a mesh with a hook, return (mesh, names of the stages run)
+	def load(self, fileName, useArrays, **options):
+		reports = []
+		AddHook(reports.append)
+		try:
+			mesh = Mesh(useArrays)
+			mesh.LoadMesh(fileName, **options)
+		finally: RemoveHook(reports.append)
+		return (mesh, [r.stage for r in reports])
+
+	def testFile(self):
+		rng = numpy.random.default_rng(0)
+		fields = dict(a = rng.random((5, 3)), b = numpy.arange(7, dtype='>i2'), c = numpy.zeros((0, 4), dtype=numpy.int64), \
+			d = rng.random((2, 3, 4)).astype(numpy.float32), e = numpy.array([True, False, True]))
+		info = dict(name = 'a b  c', empty = '')
+		fileName = os.path.join(self.workDir, 'fields.mlb')
+		MeshLib.utils.MLBMesh.SaveMLBFile(fileName, fields, info)
+		for useMemmap in (True, False):
+			(loaded, loadedInfo) = MeshLib.utils.MLBMesh.LoadMLBFile(fileName, useMemmap)
+			self.assertEqual(loadedInfo, info)
+			self.assertEqual(sorted(loaded.keys()), sorted(fields.keys()))
+			for (name, array) in fields.items():
+				self.assertEqual(loaded[name].dtype, array.dtype)
+				self.assertTrue(numpy.array_equal(loaded[name], array))
+			# copy on write, the file is left as it is
+			loaded['a'][0, 0] = -1.0
+		self.assertTrue(numpy.array_equal(MeshLib.utils.MLBMesh.LoadMLBFile(fileName)[0]['a'], fields['a']))
+
+	def testSaveLoad(self):
+		for (name, useArrays) in (('fandisk_cut.harmonicmap.obj', False), ('fandisk_cut.harmonicmap.obj', True), ('fandisk_cut.m', False), ('fandisk_cut.m', True)):
+			(parsed, stages) = self.load(self.copy(name), useArrays)
+			fileName = os.path.join(self.workDir, 'saved.mlb')
+			parsed.SaveMesh(fileName)
+			(loaded, stages) = self.load(fileName, useArrays)
+			self.assertNotIn('load.construct', stages)
+			self.assertSameContents(_contents(loaded), _contents(parsed))
+
+	def testPolygons(self):
+		fileName = os.path.join(self.workDir, 'quads.off')
+		output = open(fileName, 'w')
+		output.write('OFF\n6 2 0\n0 0 0\n1 0 0\n2 0 0\n0 1 0\n1 1 0\n2 1 0\n4 0 1 4 3\n4 1 2 5 4\n')
+		output.close()
+		for useArrays in (False, True):
+			(parsed, stages) = self.load(fileName, useArrays)
+			parsed.SaveMesh(os.path.join(self.workDir, 'quads.mlb'))
+			(loaded, stages) = self.load(os.path.join(self.workDir, 'quads.mlb'), useArrays)
+			self.assertSameContents(_contents(loaded), _contents(parsed))
+
+	def testCache(self):
+		fileName = self.copy('fandisk_cut.m')
+		for useArrays in (False, True):
+			for lazy in (False, True):
+				cacheName = MeshLib.utils.MLBMesh.CacheFileName(fileName)
+				if os.path.exists(cacheName): os.remove(cacheName)
+				(parsed, stages) = self.load(fileName, useArrays, useCache = True, lazy = lazy)
+				self.assertIn('load.parse', stages)
+				self.assertTrue(os.path.exists(cacheName))
+				(cached, stages) = self.load(fileName, useArrays, useCache = True)
+				self.assertNotIn('load.parse', stages)
+				self.assertSameContents(_contents(cached), _contents(parsed))
+				# other options have their own key
+				(other, stages) = self.load(fileName, useArrays, useCache = True, rmReduntVerts = True)
+				self.assertIn('load.parse', stages)
+		# a changed source is parsed again and cached anew
+		with open(fileName, 'a') as output: output.write('Vertex 99999 0 0 0\n')
+		(changed, stages) = self.load(fileName, True, useCache = True)
+		self.assertIn('load.parse', stages)
+		self.assertEqual(len(changed.verts), len(cached.verts) + 1)
+		self.assertNotIn('load.parse', self.load(fileName, True, useCache = True)[1])
+		# a broken cache is parsed over
+		with open(MeshLib.utils.MLBMesh.CacheFileName(fileName), 'r+b') as output: output.write(b'xxx')
+		(broken, stages) = self.load(fileName, True, useCache = True)
+		self.assertIn('load.parse', stages)
+		self.assertSameContents(_contents(broken), _contents(changed))
+
+	def testCacheDir(self):
+		fileName = self.copy('fandisk.m')
+		MeshLib.utils.MLBMesh.CACHE_DIR = os.path.join(self.workDir, 'cache')
+		self.load(fileName, True, useCache = True)
+		self.assertFalse(os.path.exists(fileName + '.mlb'))
+		self.assertEqual(len(os.listdir(MeshLib.utils.MLBMesh.CACHE_DIR)), 1)
+		self.assertNotIn('load.parse', self.load(fileName, True, useCache = True)[1])
+
+if __name__ == '__main__':
+	unittest.main()
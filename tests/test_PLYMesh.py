@@ -0,0 +1,85 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.utils.PLYMesh import LoadPLYElements, ReadPLYChunks
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+# Binary .ply face elements whose lists vary in length and that carry scalar
+# properties around the list, read whole and in chunks.
+#     python -m unittest MeshLib.tests.test_PLYMesh
+
+# write a binary .ply of random polygons with 3..6 corners, or with the given sizes,
+# scalars before and after the list; return the corner lists
+def _writeMixedPLY(fileName, nVert, nFace, seed, byteOrder = '<', countType = 'uchar', sizes = None):
+	rng = numpy.random.default_rng(seed)
+	countDtype = numpy.dtype(byteOrder + {'uchar':'u1', 'ushort':'u2', 'int':'i4'}[countType])
+	if sizes is None: sizes = rng.integers(3, 7, nFace)
+	faces = [rng.choice(nVert, k, replace=False) for k in sizes.tolist()]
+	header = ['ply', 'format %s 1.0' % ('binary_little_endian' if byteOrder == '<' else 'binary_big_endian'), \
+		'element vertex %d' % nVert, 'property float x', 'property float y', 'property float z', \
+		'element face %d' % nFace, 'property short group', 'property list %s int vertex_indices' % countType, \
+		'property uchar flags', 'property uchar label', 'end_header']
+	parts = [('\n'.join(header) + '\n').encode(), rng.random((nVert, 3)).astype(byteOrder + 'f4').tobytes()]
+	for (i, f) in enumerate(faces):
+		parts.append(numpy.array([i % 7], dtype=byteOrder + 'i2').tobytes())
+		parts.append(numpy.array([len(f)], dtype=countDtype).tobytes() + f.astype(byteOrder + 'i4').tobytes())
+		parts.append(bytes([i % 256, 255]))
+	output = open(fileName, 'wb')
+	output.write(b''.join(parts))
+	output.close()
+	return faces
+
+class MixedFaceListTest(unittest.TestCase):
+	def setUp(self):
+		self.workDir = tempfile.mkdtemp(prefix='meshtest')
+		self.fileName = os.path.join(self.workDir, 'mixed.ply')
+
+	def tearDown(self):
+		shutil.rmtree(self.workDir, ignore_errors=True)
+
+	def assertFaces(self, faceStart, faceVerts, faces):
+		self.assertEqual(numpy.diff(faceStart).tolist(), [len(f) for f in faces])
+		self.assertEqual(faceVerts.tolist(), numpy.concatenate(faces).tolist())
+
+	def testLoadElements(self):
+		for (seed, byteOrder, countType) in ((0, '<', 'uchar'), (2, '<', 'uchar'), (1, '>', 'ushort'), (3, '<', 'int')):
+			faces = _writeMixedPLY(self.fileName, 5000, 150000, seed, byteOrder, countType)
+			(vertexRecords, faceStart, faceVerts) = LoadPLYElements(self.fileName)
+			self.assertEqual(len(vertexRecords), 5000)
+			self.assertFaces(faceStart, faceVerts, faces)
+
+	def testRuns(self):
+		# runs of one size broken by single polygons of others, and blocks of sizes
+		rng = numpy.random.default_rng(7)
+		for sizes in (numpy.where(rng.random(100000) < 0.01, 4, 3), numpy.where(rng.random(100000) < 0.0005, 6, 3), \
+			numpy.repeat([3, 4, 3, 5, 4], [40000, 3, 20000, 70000, 15]), numpy.repeat([5, 3], [20, 1])):
+			faces = _writeMixedPLY(self.fileName, 500, len(sizes), 8, sizes = sizes)
+			(vertexRecords, faceStart, faceVerts) = LoadPLYElements(self.fileName)
+			self.assertFaces(faceStart, faceVerts, faces)
+
+	def testChunks(self):
+		faces = _writeMixedPLY(self.fileName, 500, 20000, 4)
+		chunks = [c for c in ReadPLYChunks(self.fileName, 1 << 14) if c.NumFaces() != 0]
+		self.assertGreater(len(chunks), 1)
+		lengths = numpy.concatenate([numpy.diff(c.faceStart) for c in chunks])
+		faceStart = numpy.concatenate(([0], numpy.cumsum(lengths)))
+		self.assertFaces(faceStart, numpy.concatenate([c.faceVerts for c in chunks]), faces)
+
+	def testLoadMesh(self):
+		faces = _writeMixedPLY(self.fileName, 500, 20000, 5)
+		for useArrays in (True, False):
+			mesh = Mesh(useArrays)
+			mesh.LoadMesh(self.fileName, False, False)
+			self.assertEqual(len(mesh.verts), 500)
+			self.assertEqual(len(mesh.faces), sum(len(f) - 2 for f in faces) if useArrays else len(faces))
+
+	def testTruncated(self):
+		_writeMixedPLY(self.fileName, 500, 2000, 6)
+		size = os.path.getsize(self.fileName)
+		with open(self.fileName, 'r+b') as output: output.truncate(size - 20)
+		self.assertRaises(AssertionError, LoadPLYElements, self.fileName)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,122 @@
+from MeshLib.utils.OBJMesh import LoadOBJFile, LoadOBJArrays
+from MeshLib.utils.OFFMesh import LoadOFFFile, LoadOFFArrays, ReadOFFChunks
+from MeshLib.utils.MMesh import LoadMFile, LoadMArrays
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+# Text meshes parsed serially and in parallel byte ranges, against each other and
+# against the expected vertices and faces.
+#     python -m unittest MeshLib.tests.test_ParallelParse
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+# a grid of triangles whose vertices are all written twice, the second copy with
+# differently formatted numbers; return (text of the vertices, positions, triangles
+# over the first copies, triangles over the second copies)
+def _duplicatedGrid(n, seed):
+	rng = numpy.random.default_rng(seed)
+	(x, y) = numpy.meshgrid(numpy.arange(n), numpy.arange(n))
+	positions = numpy.stack((x.ravel(), y.ravel(), rng.integers(0, 4, n * n)), axis=1).astype(numpy.float64) / 4.0
+	quads = (numpy.arange(n - 1)[None, :] + n * numpy.arange(n - 1)[:, None]).ravel()
+	tris = numpy.concatenate((numpy.stack((quads, quads + 1, quads + n + 1), axis=1), numpy.stack((quads, quads + n + 1, quads + n), axis=1)))
+	# first copies formatted %g, second ones %.6f
+	text = ['%g %g %g' % tuple(p) for p in positions.tolist()] + ['%.6f %.6f %.6f' % tuple(p) for p in positions.tolist()]
+	return (text, positions, tris, tris + n * n)
+
+def _faceLists(faces):
+	return [list(f) for f in faces]
+
+class ParallelParseTest(unittest.TestCase):
+	def setUp(self):
+		self.workDir = tempfile.mkdtemp(prefix='meshtest')
+
+	def tearDown(self):
+		shutil.rmtree(self.workDir, ignore_errors=True)
+
+	def write(self, name, text):
+		fileName = os.path.join(self.workDir, name)
+		output = open(fileName, 'w')
+		output.write(text)
+		output.close()
+		return fileName
+
+	def assertSameObjects(self, a, b):
+		self.assertEqual([(v[0], v[1], v[2]) for v in a[0]], [(v[0], v[1], v[2]) for v in b[0]])
+		self.assertEqual(_faceLists(a[1]), _faceLists(b[1]))
+		self.assertEqual([(t[0], t[1]) for t in a[3]], [(t[0], t[1]) for t in b[3]])
+
+	def checkDuplicates(self, fileName, load, positions, tris):
+		for rmReduntVerts in (False, True):
+			serial = load(fileName, rmReduntVerts, 1)
+			parallel = load(fileName, rmReduntVerts, 2)
+			self.assertSameObjects(serial, parallel)
+		# welded by value: the second copies map onto the first ones
+		self.assertEqual(len(serial[0]), len(positions))
+		self.assertTrue(numpy.allclose([(v[0], v[1], v[2]) for v in serial[0]], positions))
+		self.assertEqual(_faceLists(serial[1]), tris.tolist() * 2)
+
+	def testOBJDuplicates(self):
+		(text, positions, tris, tris2) = _duplicatedGrid(30, 0)
+		faces = ['f %d %d %d' % tuple(f) for f in (numpy.concatenate((tris, tris2)) + 1).tolist()]
+		fileName = self.write('dup.obj', '\n'.join(['v ' + t for t in text] + faces) + '\n')
+		self.checkDuplicates(fileName, lambda *args: LoadOBJFile(*args)[:5], positions, tris)
+
+	def testOFFDuplicates(self):
+		(text, positions, tris, tris2) = _duplicatedGrid(30, 1)
+		faces = ['3 %d %d %d' % tuple(f) for f in numpy.concatenate((tris, tris2)).tolist()]
+		fileName = self.write('dup.off', 'OFF\n%d %d 0\n' % (len(text), len(faces)) + '\n'.join(text + faces) + '\n')
+		self.checkDuplicates(fileName, LoadOFFFile, positions, tris)
+
+	def testMDuplicates(self):
+		(text, positions, tris, tris2) = _duplicatedGrid(30, 2)
+		verts = ['Vertex %d %s' % (i + 1, t) for (i, t) in enumerate(text)]
+		faces = ['Face %d %d %d %d' % ((i + 1,) + tuple(f)) for (i, f) in enumerate((numpy.concatenate((tris, tris2)) + 1).tolist())]
+		fileName = self.write('dup.m', '\n'.join(verts + faces) + '\n')
+		self.checkDuplicates(fileName, LoadMFile, positions, tris)
+
+	def testTexturesWithoutNormals(self):
+		fileName = os.path.join(MODEL_DIR, 'fandisk_cut.harmonicmap.obj')
+		for rmReduntVerts in (False, True):
+			serial = LoadOBJFile(fileName, rmReduntVerts, 1)
+			self.assertEqual(len(serial[3]), len(serial[0]))
+			self.assertSameObjects(serial, LoadOBJFile(fileName, rmReduntVerts, 3))
+			(arrays, lines, mtllibFile) = LoadOBJArrays(fileName, rmReduntVerts, workers = 3)
+			self.assertEqual(len(arrays.textures), len(serial[0]))
+
+	def testOFFComments(self):
+		text = 'OFF\n# counts\n4 2 0\n# vertices\n0 0 0\n1 0 0 # corner\n\n1 1 0\n0 1 0\n# faces\n3 0 1 2\n\n3 0 2 3\n# end\n'
+		fileName = self.write('comments.off', text)
+		positions = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+		for workers in (1, 2):
+			(verts, faces, normals, textures, lines) = LoadOFFFile(fileName, False, workers)
+			self.assertEqual([(v[0], v[1], v[2]) for v in verts], [tuple(p) for p in positions])
+			self.assertEqual(_faceLists(faces), [[0, 1, 2], [0, 2, 3]])
+			(arrays, lines) = LoadOFFArrays(fileName, False, workers)
+			self.assertEqual(arrays.positions.tolist(), positions)
+			self.assertEqual(arrays.faces.tolist(), [[0, 1, 2], [0, 2, 3]])
+		chunks = list(ReadOFFChunks(fileName, 24))
+		self.assertEqual(numpy.concatenate([c.positions for c in chunks if c.NumVerts() != 0]).tolist(), positions)
+		self.assertEqual(numpy.concatenate([c.faceVerts for c in chunks if c.NumFaces() != 0]).tolist(), [0, 1, 2, 0, 2, 3])
+
+	def testOFFMalformed(self):
+		for (name, text) in (('truncated.off', 'OFF\n4 2 0\n0 0 0\n1 0 0\n1 1 0\n0 1 0\n3 0 1 2\n'), \
+			('shortvertex.off', 'OFF\n4 2 0\n0 0 0\n1 0 0\n1 1 0\n0 1\n3 0 1 2\n3 0 2 3\n'), \
+			('longface.off', 'OFF\n4 2 0\n0 0 0\n1 0 0\n1 1 0\n0 1 0\n4 0 1 2\n3 0 2 3\n')):
+			fileName = self.write(name, text)
+			for workers in (1, 2):
+				self.assertRaises(AssertionError, LoadOFFFile, fileName, False, workers)
+				self.assertRaises(AssertionError, LoadOFFArrays, fileName, False, workers)
+
+	def testArraysMatchObjects(self):
+		for name in ('fandisk.m', 'fandisk_cut.m', 'fandisk_cut.harmonicmap.obj'):
+			fileName = os.path.join(MODEL_DIR, name)
+			if name.endswith('.m'): (objects, arrays) = (LoadMFile(fileName, True, 2), LoadMArrays(fileName, True, 2)[0])
+			else: (objects, arrays) = (LoadOBJFile(fileName, True, 2), LoadOBJArrays(fileName, True, workers = 2)[0])
+			self.assertEqual(arrays.positions.tolist(), [[v[0], v[1], v[2]] for v in objects[0]])
+			self.assertEqual(arrays.faces.tolist(), _faceLists(objects[1]))
+
+if __name__ == '__main__':
+	unittest.main()
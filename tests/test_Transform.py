@@ -0,0 +1,91 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.MeshArrays import VectorArray
+from MeshLib.Geometry import Vector3D
+from MeshLib.Transform import *
+import numpy
+import os
+import unittest
+
+# Mesh.Transform against normals and areas recomputed from the transformed
+# positions, in object and array mode.
+#     python -m unittest MeshLib.tests.test_Transform
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+MATRICES = dict(
+	rigid = TranslationMatrix((1, -2, 0.5)) @ AxisAngleMatrix((1, 2, 3), 40),
+	uniform = ScaleMatrix(2.5) @ AxisAngleMatrix((0, 0, 1), 90),
+	stretch = ScaleMatrix((1, 3, 0.5)),
+	mirror = ScaleMatrix((-1, 1, 1)),
+	mirrorRotate = AxisAngleMatrix((1, 1, 0), 30) @ ScaleMatrix((1, -2, 1)),
+	shear = numpy.array([[1, 0.5, 0, 0], [0, 1, 0, 0], [0, 0, -1, 0], [0, 0, 0, 1]], dtype=numpy.float64))
+
+# face normals and areas of the triangles from their winding
+def _windingNormals(mesh):
+	positions = VectorArray(mesh.verts, 3)
+	corners = numpy.array([[f[0], f[1], f[2]] for f in mesh.faces])
+	cross = numpy.cross(positions[corners[:, 1]] - positions[corners[:, 0]], positions[corners[:, 2]] - positions[corners[:, 0]])
+	length = numpy.sqrt((cross * cross).sum(axis=1))
+	return (cross / length[:, None], length / 2.0)
+
+def _stored(mesh):
+	return (VectorArray([f.normal for f in mesh.faces], 3), numpy.array([f.area for f in mesh.faces]), VectorArray(mesh.normals, 3))
+
+class TransformTest(unittest.TestCase):
+	def load(self, useArrays):
+		mesh = Mesh(useArrays)
+		mesh.LoadMesh(os.path.join(MODEL_DIR, 'fandisk.m'))
+		return mesh
+
+	def assertMatchesWinding(self, mesh):
+		(faceNormals, faceAreas, normals) = _stored(mesh)
+		(reference, areas) = _windingNormals(mesh)
+		self.assertTrue(numpy.allclose(faceNormals, reference, atol=1e-9))
+		self.assertTrue(numpy.allclose(faceAreas, areas, rtol=1e-9, atol=1e-12))
+
+	def testAgainstWinding(self):
+		for useArrays in (False, True):
+			for (name, matrix) in MATRICES.items():
+				mesh = self.load(useArrays)
+				mesh.Transform(matrix)
+				self.assertMatchesWinding(mesh)
+				# vertex normals as a full recalculation gives them
+				normals = _stored(mesh)[2].copy()
+				mesh.CalcNormals()
+				self.assertTrue(numpy.allclose(normals, _stored(mesh)[2], atol=1e-9), '%s %s' % (name, useArrays))
+
+	def testPositions(self):
+		for useArrays in (False, True):
+			mesh = self.load(useArrays)
+			before = VectorArray(mesh.verts, 3)
+			matrix = MATRICES['mirrorRotate']
+			mesh.Transform(matrix)
+			self.assertTrue(numpy.allclose(VectorArray(mesh.verts, 3), before @ matrix[:3, :3].T + matrix[:3, 3]))
+
+	def testMirrorThenEdit(self):
+		for useArrays in (False, True):
+			mesh = self.load(useArrays)
+			mesh.Transform(MATRICES['mirror'])
+			moved = [10, 11, 500]
+			for vi in moved:
+				mesh.verts[vi].pos = mesh.verts[vi].pos + Vector3D(0.01, -0.02, 0.005)
+			mesh.MarkMoved(moved)
+			mesh.Refresh()
+			# the refreshed faces around the moved vertices agree with the others
+			self.assertMatchesWinding(mesh)
+			normals = _stored(mesh)[2].copy()
+			mesh.CalcNormals()
+			self.assertTrue(numpy.allclose(normals, _stored(mesh)[2], atol=1e-9))
+
+	def testInverse(self):
+		for useArrays in (False, True):
+			mesh = self.load(useArrays)
+			before = [a.copy() for a in _stored(mesh)]
+			matrix = MATRICES['mirrorRotate']
+			mesh.Transform(matrix)
+			mesh.Transform(numpy.linalg.inv(matrix))
+			for (a, b) in zip(before, _stored(mesh)):
+				self.assertTrue(numpy.allclose(a, b, atol=1e-9))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,102 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.MeshArrays import WeldPositions, UniqueRows, VectorArray
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+# Vertex welding against brute force over all pairs of points.
+#     python -m unittest MeshLib.tests.test_Weld
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test-models')
+
+# (keep, realIndex) of the clusters of points linked by pairs at most epsilon apart
+def _bruteWeld(points, epsilon):
+	dist2 = ((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+	(i, j) = numpy.nonzero(dist2 <= epsilon * epsilon)
+	label = numpy.arange(len(points))
+	while True:
+		newLabel = label.copy()
+		numpy.minimum.at(newLabel, i, label[j])
+		newLabel = newLabel[newLabel]
+		if (newLabel == label).all(): break
+		label = newLabel
+	keep = numpy.flatnonzero(label == numpy.arange(len(points)))
+	rank = numpy.empty(len(points), dtype=numpy.int64)
+	rank[keep] = numpy.arange(len(keep))
+	return (keep, rank[label])
+
+class WeldTest(unittest.TestCase):
+	def assertSameWeld(self, points, epsilon):
+		(keep, realIndex) = WeldPositions(points, epsilon)
+		(bruteKeep, bruteIndex) = _bruteWeld(points, epsilon)
+		self.assertEqual(keep.tolist(), bruteKeep.tolist())
+		self.assertEqual(realIndex.tolist(), bruteIndex.tolist())
+
+	def testClusters(self):
+		rng = numpy.random.default_rng(0)
+		for (scale, offset) in ((1.0, 0.0), (1e4, -5e3), (1e-3, 7.0)):
+			epsilon = 0.01 * scale
+			centers = rng.random((300, 3)) * scale + offset
+			# copies around the centers, some of them chained further than epsilon from the center
+			copies = centers[rng.integers(0, 300, 900)] + rng.normal(0.0, 0.5 * epsilon, (900, 3))
+			points = rng.permutation(numpy.concatenate((centers, copies, rng.random((300, 3)) * scale + offset)))
+			self.assertSameWeld(points, epsilon)
+
+	def testEdgeCases(self):
+		rng = numpy.random.default_rng(1)
+		# a chain of points 0.9 epsilon apart is one cluster, 1.1 epsilon apart none
+		line = numpy.outer(numpy.arange(50), [1.0, 0.0, 0.0])
+		self.assertEqual(WeldPositions(line * 0.9, 1.0)[0].tolist(), [0])
+		self.assertEqual(len(WeldPositions(line * 1.1, 1.0)[0]), 50)
+		# points on cell boundaries, and many points in one cell
+		grid = numpy.stack(numpy.meshgrid(*[numpy.arange(6) * 0.5] * 3), axis=-1).reshape(-1, 3)
+		self.assertSameWeld(grid, 0.5)
+		self.assertSameWeld(rng.random((400, 3)) * 0.01, 0.004)
+		for points in (numpy.zeros((0, 3)), numpy.ones((1, 3))):
+			self.assertEqual(WeldPositions(points, 0.1)[1].tolist(), list(range(len(points))))
+		# no epsilon merges equal positions only
+		points = rng.integers(0, 3, (200, 3)).astype(numpy.float64)
+		for (a, b) in zip(WeldPositions(points, 0.0), UniqueRows(points)):
+			self.assertEqual(a.tolist(), b.tolist())
+
+	def testWeldVertices(self):
+		mesh = Mesh(True)
+		mesh.LoadMesh(os.path.join(MODEL_DIR, 'fandisk.m'))
+		(positions, faces) = (mesh.arrays.positions, mesh.arrays.faces)
+		# a triangle soup of the mesh with every corner moved a little, and a face that collapses
+		rng = numpy.random.default_rng(2)
+		epsilon = 1e-4
+		soup = positions[faces.ravel()] + rng.uniform(-0.2, 0.2, (3 * len(faces), 3)) * epsilon
+		soup = numpy.concatenate((soup, positions[faces[0, 0]] + rng.uniform(-0.2, 0.2, (3, 3)) * epsilon))
+		workDir = tempfile.mkdtemp(prefix='meshtest')
+		try:
+			fileName = os.path.join(workDir, 'soup.off')
+			output = open(fileName, 'w')
+			output.write('OFF\n%d %d 0\n' % (len(soup), len(soup) // 3))
+			output.write(''.join('%.9f %.9f %.9f\n' % tuple(p) for p in soup.tolist()))
+			output.write(''.join('3 %d %d %d\n' % (i, i + 1, i + 2) for i in range(0, len(soup), 3)))
+			output.close()
+			# every corner is welded to the vertex it came from, numbered by first appearance
+			corners = numpy.concatenate((faces.ravel(), faces[0, [0, 0, 0]]))
+			(used, first) = numpy.unique(corners, return_index=True)
+			rank = numpy.zeros(len(positions), dtype=numpy.int64)
+			rank[used[numpy.argsort(first)]] = numpy.arange(len(used))
+			for useArrays in (False, True):
+				welded = Mesh(useArrays)
+				welded.LoadMesh(fileName)
+				report = welded.WeldVertices(epsilon)
+				self.assertEqual(report.vertMap.tolist(), rank[corners].tolist())
+				self.assertEqual(report.removedFaces, [len(faces)])
+				self.assertEqual(len(welded.verts), len(used))
+				self.assertEqual(len(welded.faces), len(faces))
+				# the same faces over the same positions as the original mesh
+				weldedFaces = numpy.array([[f[0], f[1], f[2]] for f in welded.faces])
+				self.assertEqual(weldedFaces.tolist(), rank[faces].tolist())
+				self.assertTrue(numpy.allclose(VectorArray(welded.verts, 3)[rank[faces]], positions[faces], atol=epsilon))
+				self.assertEqual(len(welded.edges), len(mesh.edges))
+		finally: shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == '__main__':
+	unittest.main()
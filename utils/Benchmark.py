@@ -0,0 +1,271 @@
+from MeshLib.Mesh import Mesh
+from MeshLib.Topology import TriangleCorners
+from MeshLib.utils.OBJMesh import WriteOBJ
+from MeshLib.utils.OFFMesh import WriteOFF
+from MeshLib.utils.PLYMesh import WritePLY
+from MeshLib.utils.MMesh import WriteM
+from MeshLib.utils.Instrument import Profiler
+import numpy
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmark suite.
+# Deterministic synthetic meshes are written in each format, loaded and saved
+# again through the Mesh API. The stages reported by utils/Instrument are timed,
+# i.e. LoadMesh (split into parse, adjacency, normals and bounding box), SaveMesh
+# per format and RemoveNonManifoldness; with memory=True a second, traced run
+# records the peak memory of each stage. Results saved as a baseline are compared with later
+# runs by RegressionReport:
+#     python -m MeshLib.utils.Benchmark --sizes 10000 100000 --save base.json
+#     python -m MeshLib.utils.Benchmark --sizes 10000 100000 --baseline base.json
+
+BENCH_SIZES = (10000, 100000, 1000000, 10000000)
+BENCH_FORMATS = ('.obj', '.off', '.ply', '.m')
+# regression threshold on time and memory ratios, and the shortest stage compared
+REGRESSION_THRESHOLD = 1.25
+MIN_SECONDS = 0.01
+
+def GridMesh(nFaces):
+	'''
+	Return (positions, faces) of a wavy n x n grid of about nFaces triangles; its border is a boundary
+	'''
+	n = max(1, int(round(numpy.sqrt(nFaces / 2.0))))
+	(y, x) = numpy.mgrid[0:n+1, 0:n+1] / float(n)
+	z = 0.05 * numpy.sin(2 * numpy.pi * x) * numpy.cos(2 * numpy.pi * y)
+	positions = numpy.stack((x.ravel(), y.ravel(), z.ravel()), axis=1)
+	v0 = (numpy.arange(n)[:, None] * (n+1) + numpy.arange(n)[None, :]).ravel()
+	faces = numpy.concatenate((numpy.stack((v0, v0+1, v0+n+2), axis=1), numpy.stack((v0, v0+n+2, v0+n+1), axis=1)))
+	return (positions, faces.astype(numpy.int64))
+
+def IcosphereMesh(nFaces):
+	'''
+	Return (positions, faces) of a unit icosphere, the icosahedron subdivided to the
+	20 * 4^k faces closest to nFaces
+	'''
+	t = (1.0 + numpy.sqrt(5.0)) / 2.0
+	positions = numpy.array([(-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0), (0, -1, t), (0, 1, t), (0, -1, -t), (0, 1, -t), \
+		(t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1)], dtype=numpy.float64)
+	positions /= numpy.linalg.norm(positions, axis=1)[:, None]
+	faces = numpy.array([(0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11), (1, 5, 9), (5, 11, 4), (11, 10, 2), (10, 7, 6), \
+		(7, 1, 8), (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8), (3, 8, 9), (4, 9, 5), (2, 4, 11), (6, 2, 10), (8, 6, 7), (9, 8, 1)], \
+		dtype=numpy.int64)
+	level = max(0, int(round(numpy.log(max(nFaces, 20) / 20.0) / numpy.log(4.0))))
+	for k in range(0, level):
+		nVert = len(positions)
+		# one new vertex per edge, at the normalized midpoint
+		ends = numpy.stack((faces, numpy.roll(faces, -1, axis=1)), axis=2).reshape(-1, 2)
+		ends.sort(axis=1)
+		(keys, inverse) = numpy.unique(ends[:, 0] * nVert + ends[:, 1], return_inverse=True)
+		mid = positions[keys // nVert] + positions[keys % nVert]
+		positions = numpy.concatenate((positions, mid / numpy.linalg.norm(mid, axis=1)[:, None]))
+		m = (inverse.reshape(-1, 3) + nVert).T
+		(a, b, c) = faces.T
+		faces = numpy.concatenate([numpy.stack(f, axis=1) for f in ((a, m[0], m[2]), (b, m[1], m[0]), (c, m[2], m[1]), (m[0], m[1], m[2]))])
+	return (positions, faces)
+
+def TubeMesh(nFaces):
+	'''
+	Return (positions, faces) of an open cylinder of about nFaces triangles; both rims are boundaries
+	'''
+	nSeg = max(3, int(round(numpy.sqrt(nFaces / 2.0))))
+	nRing = max(1, int(round(nFaces / (2.0 * nSeg))))
+	angle = 2 * numpy.pi * numpy.arange(nSeg) / nSeg
+	z = numpy.arange(nRing+1) / float(nRing)
+	positions = numpy.stack((numpy.tile(numpy.cos(angle), nRing+1), numpy.tile(numpy.sin(angle), nRing+1), numpy.repeat(z, nSeg)), axis=1)
+	a = (numpy.arange(nRing)[:, None] * nSeg + numpy.arange(nSeg)[None, :]).ravel()
+	b = (numpy.arange(nRing)[:, None] * nSeg + (numpy.arange(nSeg)[None, :] + 1) % nSeg).ravel()
+	faces = numpy.concatenate((numpy.stack((a, b, b+nSeg), axis=1), numpy.stack((a, b+nSeg, a+nSeg), axis=1)))
+	return (positions, faces.astype(numpy.int64))
+
+def NonManifoldFans(nFaces):
+	'''
+	Return (positions, faces) of about nFaces triangles in non-manifold units: three
+	faces around one edge, and two more faces touching its end vertex only
+	'''
+	# unit vertices: the shared edge a-b, the three wings and the two loose triangles at b
+	unitVerts = numpy.array([(0, 0, 0), (1, 0, 0), (0.5, 1, 0), (0.5, -1, 0), (0.5, 0, 1), (2, 1, 0), (2, 0.5, 0), \
+		(2, -0.5, 0), (2, -1, 0)], dtype=numpy.float64)
+	unitFaces = numpy.array([(0, 1, 2), (1, 0, 3), (0, 1, 4), (1, 6, 5), (1, 7, 8)], dtype=numpy.int64)
+	nUnit = max(1, (nFaces + len(unitFaces) - 1) // len(unitFaces))
+	width = int(numpy.ceil(numpy.sqrt(nUnit)))
+	shift = numpy.stack((numpy.arange(nUnit) % width, numpy.arange(nUnit) // width, numpy.zeros(nUnit)), axis=1) * 3.0
+	positions = (unitVerts[None, :, :] + shift[:, None, :]).reshape(-1, 3)
+	faces = (unitFaces[None, :, :] + len(unitVerts) * numpy.arange(nUnit)[:, None, None]).reshape(-1, 3)
+	return (positions, faces)
+
+GENERATORS = dict(grid = GridMesh, icosphere = IcosphereMesh, tube = TubeMesh, fans = NonManifoldFans)
+
+def WriteMeshArrays(fileName, positions, faces, plyFormat = 'binary_little_endian'):
+	'''
+	Write a triangle mesh given as arrays in the format of the file suffix
+	'''
+	(faceStart, faceVerts) = TriangleCorners(faces)
+	suffix = fileName[fileName.rfind('.'):].lower()
+	if suffix == '.obj': WriteOBJ(fileName, positions, faceStart, faceVerts)
+	elif suffix == '.off': WriteOFF(fileName, positions, faceStart, faceVerts)
+	elif suffix == '.ply': WritePLY(fileName, positions, faceStart, faceVerts, fileFormat = plyFormat)
+	elif suffix == '.m': WriteM(fileName, positions, faceStart, faceVerts)
+
+def RunBenchmark(generators = tuple(GENERATORS.keys()), sizes = BENCH_SIZES, formats = BENCH_FORMATS, useArrays = True, \
+	memory = False, repeat = 1, workDir = None):
+	'''
+	Run the suite and return its result records, dicts of case, faces, format, stage,
+	seconds (the best of repeat runs) and peakMB (with memory, else None)
+	'''
+	ownDir = workDir is None
+	if ownDir: workDir = tempfile.mkdtemp(prefix='meshbench')
+	results = dict()
+	try:
+		for name in generators:
+			for size in sizes:
+				(positions, faces) = GENERATORS[name](size)
+				for fmt in formats:
+					srcName = os.path.join(workDir, 'src' + fmt)
+					WriteMeshArrays(srcName, positions, faces)
+					runs = [False] * repeat + ([True] if memory else [])
+					for traced in runs:
+						for (stage, seconds, peak) in _runCase(srcName, os.path.join(workDir, 'out' + fmt), useArrays, \
+							traced, fmt == formats[0]):
+							key = (name, len(faces), fmt, stage)
+							record = results.setdefault(key, dict(case = name, faces = len(faces), format = fmt, stage = stage, \
+								seconds = None, peakMB = None))
+							if traced: record['peakMB'] = peak / float(1 << 20)
+							else: record['seconds'] = seconds if record['seconds'] is None else min(record['seconds'], seconds)
+					os.remove(srcName)
+	finally:
+		if ownDir: shutil.rmtree(workDir, ignore_errors=True)
+	return list(results.values())
+
+def ObjectFootprint(generator = 'grid', size = 100000):
+	'''
+	Return a record of the traced memory of an object mode mesh (faces, compactMB) next to that of
+	the same objects in the former per-instance __dict__ layout (legacyMB), and their ratio
+	'''
+	(positions, faces) = GENERATORS[generator](size)
+	fields = dict(positions = positions, faces = faces, lineStart = numpy.zeros(1, dtype=numpy.int64), \
+		lineVerts = numpy.zeros(0, dtype=numpy.int64))
+	started = not tracemalloc.is_tracing()
+	if started: tracemalloc.start()
+	try:
+		base = tracemalloc.get_traced_memory()[0]
+		mesh = Mesh(False)
+		mesh.FromFields(fields, dict())
+		compact = tracemalloc.get_traced_memory()[0] - base
+		base = tracemalloc.get_traced_memory()[0]
+		legacy = _legacyObjects(mesh)
+		legacyBytes = tracemalloc.get_traced_memory()[0] - base
+	finally:
+		if started: tracemalloc.stop()
+	return dict(case = generator, faces = len(faces), compactMB = compact / float(1 << 20), \
+		legacyMB = legacyBytes / float(1 << 20), ratio = legacyBytes / float(max(compact, 1)))
+
+# the former object layout: every object has a __dict__, index lists are lists of ints
+class _LegacyObject:
+	def __init__(self, **fields):
+		self.__dict__.update(fields)
+
+# the objects of an object mode mesh rebuilt in the former layout
+def _legacyObjects(mesh):
+	vector = lambda v: _LegacyObject(x = float(v.x), y = float(v.y), z = float(v.z))
+	verts = [_LegacyObject(pos = vector(v.pos), edges = v.edges.tolist(), isBoundary = v.isBoundary, \
+		color = _LegacyObject(x = 1.0, y = 1.0, z = 1.0)) for v in mesh.verts]
+	faces = [_LegacyObject(verts = f.verts.tolist(), edges = f.edges.tolist(), normal = vector(f.normal), area = f.area, \
+		valid = f.valid) for f in mesh.faces]
+	edges = [_LegacyObject(verts = e.verts.tolist(), faces = e.faces.tolist(), idxAtVert = e.idxAtVert.tolist(), \
+		isBoundary = e.isBoundary, valid = e.valid) for e in mesh.edges]
+	return (verts, faces, edges, [vector(n) for n in mesh.normals])
+
+# load, save and (with repair) repair one mesh file, return the (stage, seconds, peak bytes) records
+def _runCase(srcName, dstName, useArrays, traced, repair):
+	with Profiler(traced) as profiler:
+		mesh = Mesh(useArrays)
+		mesh.LoadMesh(srcName)
+		mesh.SaveMesh(dstName)
+		if repair: mesh.RemoveNonManifoldness()
+	os.remove(dstName)
+	return [(r.stage, r.seconds, r.peakBytes) for r in profiler.reports]
+
+def SaveResults(fileName, results):
+	'''
+	Save result records, with a description of the machine, as a .json file
+	'''
+	info = dict(python = platform.python_version(), numpy = numpy.__version__, machine = platform.platform(), \
+		cpus = os.cpu_count(), time = time.strftime('%Y-%m-%d %H:%M:%S'))
+	json.dump(dict(info = info, results = results), open(fileName, 'w'), indent = 1)
+
+def LoadResults(fileName):
+	'''
+	Load the result records of a SaveResults file
+	'''
+	return json.load(open(fileName))['results']
+
+def FormatResults(results):
+	'''
+	Return the result records as lines of a table
+	'''
+	lines = ['%-10s %9s %-5s %-15s %10s %10s' % ('case', 'faces', 'fmt', 'stage', 'seconds', 'peak MB')]
+	for r in results:
+		lines.append('%-10s %9d %-5s %-15s %10.4f %10s' % (r['case'], r['faces'], r['format'], r['stage'], r['seconds'], \
+			'-' if r['peakMB'] is None else '%.1f' % r['peakMB']))
+	return lines
+
+def RegressionReport(results, baseline, threshold = REGRESSION_THRESHOLD, minSeconds = MIN_SECONDS):
+	'''
+	Compare result records with baseline records of the same case, size, format and stage.
+	Return (report lines, number of regressions): a stage regresses when its time or peak
+	memory grows by more than threshold times; stages under minSeconds are not timed against
+	the baseline.
+	'''
+	base = dict(((r['case'], r['faces'], r['format'], r['stage']), r) for r in baseline)
+	lines = ['%-10s %9s %-5s %-15s %10s %10s %7s %7s' % ('case', 'faces', 'fmt', 'stage', 'seconds', 'baseline', 'time', 'memory')]
+	nRegression = 0
+	for r in results:
+		old = base.get((r['case'], r['faces'], r['format'], r['stage']))
+		if old is None: continue
+		timeRatio = r['seconds'] / old['seconds'] if old['seconds'] > 0 else 1.0
+		memRatio = r['peakMB'] / old['peakMB'] if r['peakMB'] is not None and old['peakMB'] else None
+		slower = timeRatio > threshold and max(r['seconds'], old['seconds']) >= minSeconds
+		larger = memRatio is not None and memRatio > threshold
+		if slower or larger: mark = 'REGRESSION'; nRegression += 1
+		elif timeRatio < 1.0 / threshold and max(r['seconds'], old['seconds']) >= minSeconds: mark = 'faster'
+		else: mark = ''
+		lines.append('%-10s %9d %-5s %-15s %10.4f %10.4f %6.2fx %7s %s' % (r['case'], r['faces'], r['format'], r['stage'], \
+			r['seconds'], old['seconds'], timeRatio, '-' if memRatio is None else '%.2fx' % memRatio, mark))
+	lines.append('%d regressions over %.2fx' % (nRegression, threshold))
+	return (lines, nRegression)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'MeshLib benchmark suite')
+	parser.add_argument('--generators', nargs = '+', default = list(GENERATORS.keys()), choices = list(GENERATORS.keys()))
+	parser.add_argument('--sizes', nargs = '+', type = int, default = list(BENCH_SIZES), help = 'face counts')
+	parser.add_argument('--formats', nargs = '+', default = list(BENCH_FORMATS))
+	parser.add_argument('--objects', action = 'store_true', help = 'load meshes in object mode instead of array mode')
+	parser.add_argument('--memory', action = 'store_true', help = 'record peak memory in an extra traced run')
+	parser.add_argument('--repeat', type = int, default = 1, help = 'timed runs, the best one counts')
+	parser.add_argument('--save', help = 'save the results as a .json baseline')
+	parser.add_argument('--baseline', help = 'compare against a saved .json baseline')
+	parser.add_argument('--threshold', type = float, default = REGRESSION_THRESHOLD)
+	parser.add_argument('--footprint', action = 'store_true', help = 'only compare the memory of object mode meshes with the former layout')
+	args = parser.parse_args()
+
+	if args.footprint:
+		print('%-10s %9s %10s %10s %7s' % ('case', 'faces', 'compactMB', 'legacyMB', 'ratio'))
+		for name in args.generators:
+			for size in args.sizes:
+				r = ObjectFootprint(name, size)
+				print('%-10s %9d %10.1f %10.1f %6.2fx' % (r['case'], r['faces'], r['compactMB'], r['legacyMB'], r['ratio']))
+		sys.exit(0)
+	results = RunBenchmark(args.generators, args.sizes, args.formats, not args.objects, args.memory, args.repeat)
+	print('\n'.join(FormatResults(results)))
+	if args.save: SaveResults(args.save, results)
+	if args.baseline:
+		(lines, nRegression) = RegressionReport(results, LoadResults(args.baseline), args.threshold)
+		print('\n'.join(lines))
+		sys.exit(1 if nRegression != 0 else 0)
@@ -0,0 +1,224 @@
+import numpy
+import multiprocessing
+import warnings
+
+# Bulk tokenization helpers for the text mesh formats.
+# A file is read in large blocks that end at a line break; lines of one record
+# type are selected with numpy masks and their numbers parsed in one call.
+
+BLOCK_SIZE = 1 << 24
+# rows formatted per string operation
+FORMAT_CHUNK = 1 << 16
+
+SPACE = ord(' '); TAB = ord('\t'); CR = ord('\r'); LF = ord('\n')
+
+def ReadBlocks(fileName, blockSize = BLOCK_SIZE, start = 0, end = None):
+	'''
+	Yield the bytes of a file (or of its byte range [start, end)) in blocks of
+	about blockSize that end with a line break
+	'''
+	file = open(fileName, 'rb')
+	file.seek(start)
+	remaining = -1 if end is None else end - start
+	rest = b''
+	while remaining != 0:
+		size = blockSize if remaining < 0 else min(blockSize, remaining)
+		data = file.read(size)
+		if len(data) == 0: break
+		if remaining > 0: remaining -= len(data)
+		data = rest + data
+		cut = data.rfind(b'\n') + 1
+		if cut == 0:
+			rest = data
+			continue
+		rest = data[cut:]
+		yield data[:cut]
+	file.close()
+	if len(rest) != 0: yield rest + b'\n'
+
+class LineTable:
+	'''
+	Line start/end offsets of a block; end offsets point at the line breaks
+	'''
+	def __init__(self, block):
+		self.buf = numpy.frombuffer(block, dtype=numpy.uint8)
+		self.end = numpy.flatnonzero(self.buf == LF)
+		self.start = numpy.empty(len(self.end), dtype=numpy.int64)
+		self.start[0:1] = 0
+		self.start[1:] = self.end[:-1] + 1
+		self.chars = dict()
+
+	def __len__(self):
+		return len(self.end)
+
+	def Char(self, offset):
+		'''
+		Return the offset-th character of every line, or a line break past its end
+		'''
+		if offset not in self.chars:
+			pos = self.start + offset
+			chars = self.buf[numpy.minimum(pos, len(self.buf)-1)]
+			self.chars[offset] = numpy.where(pos < self.end, chars, LF)
+		return self.chars[offset]
+
+	def StartsWith(self, prefix):
+		'''
+		Return the flags of the lines made of prefix followed by a blank
+		'''
+		mask = numpy.ones(len(self), dtype=bool)
+		for i in range(0, len(prefix)):
+			mask &= self.Char(i) == ord(prefix[i])
+		c = self.Char(len(prefix))
+		return mask & ((c == SPACE) | (c == TAB))
+
+	def Extract(self, mask, skip = 0):
+		'''
+		Return the bytes of the selected lines (line breaks kept), the first skip
+		characters of each line blanked out
+		'''
+		lineLen = self.end - self.start + 1
+		keep = numpy.repeat(mask, lineLen)
+		data = self.buf[keep].copy()
+		if skip != 0:
+			selStart = numpy.cumsum(lineLen[mask]) - lineLen[mask]
+			for i in range(0, skip):
+				data[selStart + i] = SPACE
+		return data.tobytes()
+
+def ParseNumbers(data, dtype, nToken = None):
+	'''
+	Parse all whitespace-separated numbers of data in one call; nToken is the count
+	of tokens of data if the caller has it. A token that is not a number is an error
+	'''
+	if nToken is None: nToken = _tokenCount(data)
+	# blanks alone would parse as -1
+	if nToken == 0: return numpy.zeros(0, dtype=dtype)
+	with warnings.catch_warnings():
+		# the parse stops at such a token, with a warning or an error by the numpy version
+		warnings.simplefilter('ignore', DeprecationWarning)
+		try: values = numpy.fromstring(data, dtype=dtype, sep=' ')
+		except ValueError: values = None
+	assert values is not None and len(values) == nToken, 'Malformed number in text data.'
+	return values
+
+# the number of whitespace-separated tokens of data
+def _tokenCount(data):
+	if len(data) == 0: return 0
+	buf = numpy.frombuffer(data, dtype=numpy.uint8)
+	isSpace = (buf == SPACE) | (buf == TAB) | (buf == CR) | (buf == LF)
+	return int(not isSpace[0]) + int(numpy.count_nonzero(~isSpace[1:] & isSpace[:-1]))
+
+def TokensPerLine(data):
+	'''
+	Return the number of whitespace-separated tokens on every line of data
+	'''
+	buf = numpy.frombuffer(data, dtype=numpy.uint8)
+	isSpace = (buf == SPACE) | (buf == TAB) | (buf == CR) | (buf == LF)
+	tokenStart = numpy.flatnonzero(~isSpace[1:] & isSpace[:-1]) + 1
+	if len(buf) != 0 and not isSpace[0]: tokenStart = numpy.concatenate(([0], tokenStart))
+	# tokens started before each line break, less those of the lines before
+	return numpy.diff(numpy.searchsorted(tokenStart, numpy.flatnonzero(buf == LF)), prepend=0)
+
+def RealFormat(precision = 6):
+	'''
+	Return the %-format of a real number with precision decimals, '%.6f' by default
+	'''
+	return '%%.%df' % precision
+
+def RowChunks(rows, rowFormat, chunkSize = FORMAT_CHUNK):
+	'''
+	Yield (format, values) pieces formatting the rows of a 2D array with rowFormat
+	(e.g. 'v %f %f %f\n'), chunkSize rows per piece
+	'''
+	rows = numpy.asarray(rows)
+	for i in range(0, len(rows), chunkSize):
+		chunk = rows[i:i+chunkSize]
+		yield (rowFormat * len(chunk), chunk)
+
+def RaggedChunks(items, rowStart, rowFormat, chunkSize = FORMAT_CHUNK):
+	'''
+	Yield (format, values) pieces formatting rows of varying length, row i being
+	items[rowStart[i]:rowStart[i+1]]; rowFormat(n) is the format of a row of n items
+	(e.g. lambda n: 'f' + ' %d' * n + '\n')
+	'''
+	items = numpy.asarray(items)
+	sizes = numpy.diff(rowStart)
+	if len(sizes) == 0: return
+	if (sizes == sizes[0]).all():
+		rowItems = items[rowStart[0]:rowStart[-1]].reshape((len(sizes), -1) + items.shape[1:])
+		for piece in RowChunks(rowItems, rowFormat(int(sizes[0])), chunkSize):
+			yield piece
+		return
+	formats = dict((n, rowFormat(n)) for n in numpy.unique(sizes).tolist())
+	for i in range(0, len(sizes), chunkSize):
+		sizeList = sizes[i:i+chunkSize].tolist()
+		yield (''.join([formats[n] for n in sizeList]), items[rowStart[i]:rowStart[min(i+chunkSize, len(sizes))]])
+
+def FormatPiece(piece):
+	'''
+	Return the bytes of a (format, values) piece
+	'''
+	(rowFormat, values) = piece
+	return (rowFormat % tuple(values.ravel().tolist())).encode()
+
+def FormatPool(workers):
+	'''
+	Return a process pool formatting pieces in parallel, None for workers <= 1
+	'''
+	return multiprocessing.Pool(workers) if workers > 1 else None
+
+def WriteFormatted(output, pieces, pool = None):
+	'''
+	Write the (format, values) pieces into a binary file, formatted by the
+	processes of pool if given (the order is kept)
+	'''
+	if pool is None:
+		for piece in pieces: output.write(FormatPiece(piece))
+		return
+	for data in pool.imap(FormatPiece, pieces):
+		output.write(data)
+
+def RecordColumns(data, nRecord, lo, hi):
+	'''
+	Parse records of lo to hi numbers per line into an Nxhi array, missing numbers are NaN
+	'''
+	values = ParseNumbers(data, numpy.float64)
+	# the sum of the record lengths only tells them apart if all are the shortest or the longest
+	for nCol in (lo, hi):
+		if len(values) != nCol * nRecord: continue
+		values = values.reshape(nRecord, nCol)
+		return numpy.hstack((values, numpy.full((nRecord, hi - nCol), numpy.nan)))
+	tokens = TokensPerLine(data)
+	return LineColumns(values, numpy.cumsum(tokens) - tokens, tokens, hi)
+
+def CountedLists(data, nRecord, listPos = 0):
+	'''
+	Parse records holding a count-prefixed index list (e.g. '3 v0 v1 v2') at token
+	listPos into (start, items), start being the nRecord+1 list offsets
+	'''
+	if nRecord == 0: return (numpy.zeros(1, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64))
+	tokens = TokensPerLine(data)
+	values = ParseNumbers(data, numpy.float64, int(tokens.sum())).astype(numpy.int64)
+	return LineLists(values, numpy.cumsum(tokens) - tokens, listPos)
+
+def LineColumns(values, lineStart, tokens, nCol):
+	'''
+	Gather the numbers of lines that start at offsets lineStart of values and hold
+	tokens numbers into an NxnCol array, missing numbers are NaN
+	'''
+	if len(values) == 0: return numpy.full((len(lineStart), nCol), numpy.nan)
+	columns = numpy.arange(nCol)
+	pos = lineStart[:, None] + columns
+	return numpy.where(columns < tokens[:, None], values[numpy.minimum(pos, len(values)-1)], numpy.nan)
+
+def LineLists(values, lineStart, listPos = 0):
+	'''
+	Gather the count-prefixed index lists at token listPos of lines that start at
+	offsets lineStart of values, return (start, items) as integers
+	'''
+	start = numpy.zeros(len(lineStart)+1, dtype=numpy.int64)
+	sizes = values[lineStart + listPos].astype(numpy.int64)
+	numpy.cumsum(sizes, out=start[1:])
+	recordOf = numpy.repeat(numpy.arange(len(lineStart)), sizes)
+	corner = numpy.arange(start[-1]) - start[recordOf]
+	return (start, values[lineStart[recordOf] + listPos + 1 + corner].astype(numpy.int64))
@@ -0,0 +1,200 @@
+import functools
+import logging
+import threading
+import time
+import tracemalloc
+try:
+	import resource
+except ImportError:
+	resource = None
+
+# Instrumentation of mesh stages.
+# Mesh methods run their phases (load, load.parse, load.construct, save.write, ...)
+# as stages; each stage that ends is reported to every registered hook as a
+# StageReport. Nested stages are named after the stages they run in. With no hook
+# registered a stage costs one check, so instrumentation is always compiled in:
+#     AddHook(lambda report: telemetry.send(report.stage, report.seconds))
+#     with Profiler(memory=True) as profiler: mesh.LoadMesh('bunny.obj')
+#     print('\n'.join(profiler.Summary()))
+
+_hooks = []
+_local = threading.local()
+
+# StageReport class
+# fields:
+#     stage	---- stage name, dotted after the stages it ran in
+#     seconds	---- wall time
+#     info	---- dict of element counts and other facts given by the stage
+#     peakBytes	---- peak traced memory above the stage start, None unless tracemalloc is tracing
+#     maxRSS	---- peak resident set size of the process so far in bytes, None where unknown
+class StageReport:
+	def __init__(self, stage, seconds, info, peakBytes, maxRSS):
+		self.stage = stage
+		self.seconds = seconds
+		self.info = info
+		self.peakBytes = peakBytes
+		self.maxRSS = maxRSS
+
+	def __str__(self):
+		text = '%s %.4fs' % (self.stage, self.seconds)
+		if len(self.info) != 0: text += ' ' + ' '.join('%s=%s' % (k, v) for (k, v) in sorted(self.info.items()))
+		if self.peakBytes is not None: text += ' peak=%.1fMB' % (self.peakBytes / float(1 << 20))
+		return text
+
+def AddHook(hook):
+	'''
+	Register a callable that receives the StageReport of every stage that ends
+	'''
+	if hook not in _hooks: _hooks.append(hook)
+
+def RemoveHook(hook):
+	'''
+	Unregister a hook
+	'''
+	if hook in _hooks: _hooks.remove(hook)
+
+def Stage(name, **info):
+	'''
+	Return a context that runs its block as a stage; info and the Info(...) calls of
+	the context end up in the report
+	'''
+	if len(_hooks) == 0: return _NULL_STAGE
+	return _Stage(name, info)
+
+def Staged(name, info = None):
+	'''
+	Decorator that runs a function as a stage; info(*args, **kwargs) is called with
+	the function arguments after it returns and gives the info of the report
+	'''
+	def decorate(func):
+		@functools.wraps(func)
+		def staged(*args, **kwargs):
+			if len(_hooks) == 0: return func(*args, **kwargs)
+			with _Stage(name, dict()) as stage:
+				result = func(*args, **kwargs)
+				if info is not None: stage.Info(**info(*args, **kwargs))
+				return result
+		return staged
+	return decorate
+
+# the context returned while no hook is registered
+class _NullStage:
+	def __enter__(self):
+		return self
+	def __exit__(self, *exc):
+		return False
+	def Info(self, **info):
+		pass
+
+_NULL_STAGE = _NullStage()
+
+# _Stage class, a running stage
+# fields:
+#     name	---- full stage name
+#     info	---- report info
+#     start	---- perf_counter at the start
+#     base	---- traced memory at the start
+#     peak	---- peak traced memory above base seen so far, before nested stages reset it
+class _Stage:
+	def __init__(self, name, info):
+		self.name = name
+		self.info = info
+
+	def Info(self, **info):
+		self.info.update(info)
+
+	def __enter__(self):
+		frames = _frames()
+		if len(frames) != 0:
+			parent = frames[-1]
+			self.name = parent.name + '.' + self.name
+			parent.NotePeak()
+		self.peak = 0
+		self.base = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+		if tracemalloc.is_tracing(): tracemalloc.reset_peak()
+		frames.append(self)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		seconds = time.perf_counter() - self.start
+		self.NotePeak()
+		frames = _frames()
+		frames.pop()
+		if len(frames) != 0: frames[-1].peak = max(frames[-1].peak, self.peak + self.base - frames[-1].base)
+		report = StageReport(self.name, seconds, self.info, self.peak if tracemalloc.is_tracing() else None, _maxRSS())
+		for hook in list(_hooks):
+			hook(report)
+		if tracemalloc.is_tracing(): tracemalloc.reset_peak()
+		return False
+
+	def NotePeak(self):
+		if tracemalloc.is_tracing(): self.peak = max(self.peak, tracemalloc.get_traced_memory()[1] - self.base)
+
+def _frames():
+	if not hasattr(_local, 'frames'): _local.frames = []
+	return _local.frames
+
+def _maxRSS():
+	if resource is None: return None
+	# kilobytes on Linux
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Profiler class, a hook that collects the reports of the stages run while it is active
+# fields:
+#     memory	---- whether tracemalloc is started to record peak memory; it slows Python code down
+#     reports	---- collected StageReport objects, in the order the stages ended
+class Profiler:
+	def __init__(self, memory = False):
+		self.memory = memory
+		self.reports = []
+		self.__started = False
+
+	def __call__(self, report):
+		self.reports.append(report)
+
+	def __enter__(self):
+		if self.memory and not tracemalloc.is_tracing():
+			tracemalloc.start(); self.__started = True
+		AddHook(self)
+		return self
+
+	def __exit__(self, *exc):
+		RemoveHook(self)
+		if self.__started:
+			tracemalloc.stop(); self.__started = False
+		return False
+
+	def Take(self):
+		'''
+		Return and clear the collected reports
+		'''
+		(reports, self.reports) = (self.reports, [])
+		return reports
+
+	def Summary(self):
+		'''
+		Return the total time, count and largest peak memory of each stage as lines of text
+		'''
+		stages = dict()
+		for r in self.reports:
+			(seconds, count, peak) = stages.get(r.stage, (0.0, 0, None))
+			if r.peakBytes is not None: peak = max(peak or 0, r.peakBytes)
+			stages[r.stage] = (seconds + r.seconds, count + 1, peak)
+		lines = ['%-24s %10s %6s %10s' % ('stage', 'seconds', 'calls', 'peak MB')]
+		for stage in sorted(stages.keys()):
+			(seconds, count, peak) = stages[stage]
+			lines.append('%-24s %10.4f %6d %10s' % (stage, seconds, count, '-' if peak is None else '%.1f' % (peak / float(1 << 20))))
+		return lines
+
+# LoggingHook class, a hook that logs every report
+# fields:
+#     logger	---- the logging.Logger written to
+#     level	---- the level of the records
+class LoggingHook:
+	def __init__(self, logger = None, level = logging.INFO):
+		self.logger = logging.getLogger('MeshLib') if logger is None else logger
+		self.level = level
+
+	def __call__(self, report):
+		self.logger.log(self.level, '%s', report)
@@ -0,0 +1,170 @@
+from MeshLib.Topology import EdgeTable
+import numpy
+import hashlib
+import logging
+import os
+
+# .mlb, the native binary mesh container.
+# A short text header, like the one of .ply, lists free-form info lines and the
+# stored arrays; the raw arrays follow, each starting on an MLB_ALIGN boundary
+# so the whole body can be memory-mapped and viewed without copying:
+#     mlb
+#     version 1
+#     info <key> <value>
+#     array <name> <dtype> <offset> <dim0> <dim1> ...
+#     end_header
+
+MLB_VERSION = 1
+MLB_ALIGN = 64
+# sidecar caches are written next to the source file unless CACHE_DIR is set
+CACHE_SUFFIX = '.mlb'
+CACHE_DIR = None
+# part of every cache key, raised when the meaning of cached fields changes (2: vertex edge order)
+CACHE_VERSION = 2
+
+# edge table fields and their names in the container
+EDGE_TABLE_FIELDS = (('verts', 'edgeVerts'), ('faces', 'edgeFaces'), ('isBoundary', 'edgeBoundary'), ('valid', 'edgeValid'), \
+	('cornerEdge', 'cornerEdge'), ('vertEdgeStart', 'vertEdgeStart'), ('vertEdges', 'vertEdges'), ('idxAtVert', 'idxAtVert'), \
+	('vertBoundary', 'vertBoundary'))
+
+def _aligned(offset):
+	return (offset + MLB_ALIGN - 1) // MLB_ALIGN * MLB_ALIGN
+
+def SaveMLBFile(fileName, fields, info):
+	'''
+	Save a dict of numpy arrays and a dict of info strings into a .mlb file
+	'''
+	header = ['mlb', 'version %d' % MLB_VERSION]
+	for key in sorted(info.keys()):
+		header.append('info %s %s' % (key, info[key]))
+	offset = 0; arrays = []
+	for name in sorted(fields.keys()):
+		array = numpy.ascontiguousarray(fields[name])
+		header.append('array %s %s %d %s' % (name, array.dtype.str, offset, ' '.join(str(d) for d in array.shape)))
+		arrays.append((offset, array))
+		offset = _aligned(offset + array.nbytes)
+	header.append('end_header')
+	header = ('\n'.join(header) + '\n').encode()
+
+	output = open(fileName, 'wb')
+	output.write(header + b'\0' * (_aligned(len(header)) - len(header)))
+	pos = 0
+	for (offset, array) in arrays:
+		output.write(b'\0' * (offset - pos))
+		output.write(array.tobytes())
+		pos = offset + array.nbytes
+	output.close()
+
+def LoadMLBFile(fileName, useMemmap = True):
+	'''
+	Load a .mlb file, return (fields, info).
+	With useMemmap the arrays are copy-on-write views of one memory mapping of
+	the file, i.e. they are paged in on first access and can be modified freely.
+	'''
+	file = open(fileName, 'rb')
+	try:
+		(info, entries) = _readMLBHeader(file)
+	except Exception:
+		file.close()
+		raise
+	dataStart = _aligned(file.tell())
+	if useMemmap and os.path.getsize(fileName) > dataStart:
+		file.close()
+		body = numpy.memmap(fileName, dtype=numpy.uint8, mode='c', offset=dataStart)
+	else:
+		file.seek(dataStart)
+		body = numpy.frombuffer(bytearray(file.read()), dtype=numpy.uint8)
+		file.close()
+	fields = dict()
+	for (name, dtype, offset, shape) in entries:
+		size = int(numpy.prod(shape, dtype=numpy.int64)) * dtype.itemsize
+		fields[name] = numpy.asarray(body[offset:offset+size]).view(dtype).reshape(shape)
+	return (fields, info)
+
+# read the header of a .mlb file, return (info, [(name, dtype, offset, shape) of the arrays])
+def _readMLBHeader(file):
+	assert file.readline().strip() == b'mlb', 'Not a .mlb file.'
+	info = dict(); entries = []
+	while True:
+		curLine = file.readline()
+		assert len(curLine) != 0, 'Unexpected end of .mlb header.'
+		parts = curLine.decode().rstrip('\n').split(' ')
+		if parts[0] == 'end_header': break
+		if parts[0] == 'version':
+			assert int(parts[1]) <= MLB_VERSION, 'Unsupported .mlb version %s.' % parts[1]
+		elif parts[0] == 'info':
+			info[parts[1]] = ' '.join(parts[2:])
+		elif parts[0] == 'array':
+			entries.append((parts[1], numpy.dtype(parts[2]), int(parts[3]), tuple(int(d) for d in parts[4:] if d != '')))
+	return (info, entries)
+
+def EdgeTableFields(table):
+	'''
+	Return the arrays of an EdgeTable as container fields
+	'''
+	fields = dict((name, getattr(table, field)) for (field, name) in EDGE_TABLE_FIELDS)
+	extraEdges = sorted(table.extraFaces.keys())
+	fields['extraEdges'] = numpy.array(extraEdges, dtype=numpy.int64)
+	fields['extraStart'] = numpy.cumsum([0] + [len(table.extraFaces[e]) for e in extraEdges], dtype=numpy.int64)
+	fields['extraFaces'] = numpy.array([fi for e in extraEdges for fi in table.extraFaces[e]], dtype=numpy.int64)
+	return fields
+
+def EdgeTableFromFields(fields):
+	'''
+	Rebuild an EdgeTable from container fields, None if they hold no edge table
+	'''
+	if 'edgeVerts' not in fields: return None
+	table = EdgeTable()
+	for (field, name) in EDGE_TABLE_FIELDS:
+		setattr(table, field, fields[name])
+	(extraEdges, extraStart, extraFaces) = (fields['extraEdges'].tolist(), fields['extraStart'].tolist(), fields['extraFaces'].tolist())
+	for i in range(0, len(extraEdges)):
+		table.extraFaces[extraEdges[i]] = extraFaces[extraStart[i]:extraStart[i+1]]
+	return table
+
+def CacheFileName(fileName, suffix = CACHE_SUFFIX):
+	'''
+	Return the sidecar cache file of a mesh file; other suffixes name other caches
+	of the same file
+	'''
+	if CACHE_DIR is None: return fileName + suffix
+	fullName = os.path.abspath(fileName)
+	digest = hashlib.md5(fullName.encode()).hexdigest()[:16]
+	return os.path.join(CACHE_DIR, '%s.%s%s' % (os.path.basename(fullName), digest, suffix))
+
+def CacheKey(fileName, *options):
+	'''
+	Return the key of a sidecar cache: source path, size and modification time,
+	the cache version and the load options
+	'''
+	stat = os.stat(fileName)
+	return '|'.join([os.path.abspath(fileName), str(stat.st_size), str(stat.st_mtime_ns), 'v%d' % CACHE_VERSION] + \
+		[str(o) for o in options])
+
+def LoadMLBCache(fileName, key, suffix = CACHE_SUFFIX):
+	'''
+	Load the sidecar cache of a mesh file, return (fields, info) or None if
+	there is no cache or it is stale
+	'''
+	cacheName = CacheFileName(fileName, suffix)
+	if not os.path.exists(cacheName): return None
+	try:
+		(fields, info) = LoadMLBFile(cacheName)
+	except (AssertionError, ValueError, OSError):
+		return None
+	if info.get('source') != key: return None
+	return (fields, info)
+
+def SaveMLBCache(fileName, key, fields, info, suffix = CACHE_SUFFIX):
+	'''
+	Write the sidecar cache of a mesh file; a cache that cannot be written is skipped
+	'''
+	info = dict(info); info['source'] = key
+	cacheName = CacheFileName(fileName, suffix)
+	try:
+		if CACHE_DIR is not None and not os.path.isdir(CACHE_DIR): os.makedirs(CACHE_DIR)
+		# write aside and rename, so a concurrent reader never sees half a file
+		SaveMLBFile(cacheName + '.tmp', fields, info)
+		os.replace(cacheName + '.tmp', cacheName)
+	except OSError:
+		logging.getLogger('MeshLib').warning('Cannot write mesh cache %s', cacheName)
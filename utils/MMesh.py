@@ -1,62 +1,152 @@
 from MeshLib.Geometry import *
+from MeshLib.MeshArrays import MeshArrays, UniqueRows, VectorArray
+from MeshLib.Topology import PolygonCorners
+from MeshLib.utils.FastText import *
+from MeshLib.utils.Parallel import *
 import MeshLib.Mesh
+import numpy
 import re
 
-def LoadMFile(fileName, rmReduntVerts):
+def LoadMFile(fileName, rmReduntVerts, workers = 1):
 	'''
 	Load a .m file, return vertices, faces, normals and textures.
-	Right now only vertices and faces can be loaded.
-	'''
-	verts = []; faces = [];	normals = []; textures = []; lines = []
-	vert2index = dict()
-	vertMap = dict()
-	realIndex = []
-	for curLine in open(fileName):
-		curLine = curLine.rstrip()
-		parts = [p for p in curLine.split(' ') if p != '']
-		if len(parts) < 5: continue
-		if parts[0] == 'Vertex':
-			curLine = parts[2] + ' ' + parts[3] + ' ' + parts[4]
-			if rmReduntVerts and curLine in vert2index:
-				vertMap[int(parts[1])] = vert2index[curLine]
-				continue
-			if rmReduntVerts:
-				vert2index[curLine] = len(verts)
-			vertMap[int(parts[1])] = len(verts)
-			verts.append(MeshLib.Mesh.Vertex(Vector3D(float(parts[2]), float(parts[3]), float(parts[4]))))
-			# read extra information
-			if len(parts) >= 5:
-				# rejoin the latter splitted parts
-				vertInfo = ' '.join(parts[5:])
-				# split along the curve bracket
-				vertInfos = re.split('{|}', vertInfo)
-				for vertInfo in vertInfos:
-					if len(vertInfo) == 0: continue
-					if vertInfo.isspace(): continue
-					vertInfo = vertInfo.split('=')
-					if vertInfo[0] == 'uv':
-						uv = vertInfo[1][1:-1].split(' ')
-						textures.append(Vector2D(float(uv[0]), float(uv[1])))
-					else:
-						# other info
-						pass
-
-		elif parts[0] == 'Face':
-			vertList = [int(p) for p in parts[2:5]]
-			vertList = [vertMap[v] for v in vertList]
-			faces.append(MeshLib.Mesh.Face(vertList))
-	return (verts, faces, normals, textures, lines)
-
-def SaveMFile(fileName, verts, faces, normals, textures):
-	'''
-	Save mesh into .obj file
-	'''
-	output = open(fileName, 'w')
-	for vi in range(0, len(verts)):
-		texStr = ''
-		if len(textures) != 0:
-			texStr = ' {uv=(%f %f)}' % (textures[vi][0], textures[vi][1])
-
-		output.write('Vertex %d %f %f %f%s\n' % (vi+1, verts[vi][0], verts[vi][1], verts[vi][2], texStr))
-	for fi in range(0, len(faces)):
-		output.write('Face %d %d %d %d\n' % (fi+1, faces[fi][0]+1, faces[fi][1]+1, faces[fi][2]+1))
+	Right now only vertices, faces and uv attributes are loaded. The file is parsed
+	in bulk, in byte ranges by a pool of workers processes for workers > 1;
+	redundant vertices are those with the same parsed position.
+	'''
+	(positions, uv, faceVerts) = _parseM(fileName, workers)
+	if rmReduntVerts:
+		(keep, realIndex) = UniqueRows(positions)
+		if len(uv) == len(positions): uv = uv[keep]
+		positions = positions[keep]
+		faceVerts = realIndex[faceVerts]
+	verts = [MeshLib.Mesh.Vertex(Vector3D(x, y, z)) for (x, y, z) in positions.tolist()]
+	faceVerts = faceVerts.reshape(-1, 3).tolist()
+	faces = [MeshLib.Mesh.Face(vertList) for vertList in faceVerts]
+	textures = [Vector2D(u, v) for (u, v) in uv.tolist()]
+	return (verts, faces, [], textures, [])
+
+def LoadMArrays(fileName, rmReduntVerts, workers = 1):
+	'''
+	Load a .m file into MeshArrays, return (arrays, lines).
+	Texture coordinates are loaded if every vertex has a uv attribute.
+	With workers > 1 byte ranges of the file are parsed by a process pool.
+	'''
+	(positions, uv, faceVerts) = _parseM(fileName, workers)
+	textures = uv if len(uv) == len(positions) else None
+	if rmReduntVerts:
+		(keep, realIndex) = UniqueRows(positions)
+		positions = positions[keep]
+		if textures is not None: textures = textures[keep]
+		faceVerts = realIndex[faceVerts]
+	return (MeshArrays(positions, faceVerts.reshape(-1, 3), None, textures), [])
+
+# parse a whole .m file, in byte ranges by a process pool for workers > 1;
+# return (positions, uv of the vertices that have one, flat face corners)
+def _parseM(fileName, workers):
+	if workers <= 1:
+		parts = [_parseMRange((fileName, 0, None))]
+	else:
+		ranges = SplitRanges(fileName, 2 * workers) or [(0, 0)]
+		parts = [TakeArrays(shared) for shared in MapInPool(_parseMShared, [(fileName, start, end) for (start, end) in ranges], workers, FreeArrays)]
+	(ids, positions, uv, faceIds) = [numpy.concatenate([part[name] for part in parts]) for name in ('ids', 'positions', 'uv', 'faceIds')]
+	# ids are mapped to the vertices in order of appearance, a repeated id to its last vertex
+	return (positions, uv, _idIndex(ids, faceIds.ravel()))
+
+def _parseMShared(args):
+	return ShareArrays(_parseMRange(args))
+
+# parse the Vertex and Face records of the byte range [start, end) of a .m file
+def _parseMRange(args):
+	(fileName, start, end) = args
+	records = [_parseMBlock(block) for block in ReadBlocks(fileName, BLOCK_SIZE, start, end)] or [_parseMBlock(b'')]
+	return dict((name, numpy.concatenate([r[name] for r in records])) for name in records[0].keys())
+
+# parse the Vertex and Face records of a block of a .m file;
+# return a dict of vertex ids, positions, uv (of the vertices that have one) and face vertex ids
+def _parseMBlock(block):
+	table = LineTable(block)
+	isVert = table.StartsWith('Vertex')
+	isFace = table.StartsWith('Face')
+	records = dict(ids = numpy.zeros(0, dtype=numpy.int64), positions = numpy.zeros((0, 3)), uv = numpy.zeros((0, 2)), \
+		faceIds = numpy.zeros((0, 3), dtype=numpy.int64))
+	nRecord = int(isVert.sum())
+	if nRecord != 0:
+		data = table.Extract(isVert, 6)
+		values = ParseNumbers(_blankBraces(data), numpy.float64).reshape(nRecord, 4)
+		records['ids'] = values[:, 0].astype(numpy.int64)
+		records['positions'] = values[:, 1:4]
+		uvs = re.findall(rb'uv=\(([^)]*)\)', data)
+		if len(uvs) != 0: records['uv'] = ParseNumbers(b' '.join(uvs), numpy.float64).reshape(len(uvs), 2)
+	if isFace.any():
+		values = ParseNumbers(_blankBraces(table.Extract(isFace, 4)), numpy.float64).astype(numpy.int64).reshape(-1, 4)
+		records['faceIds'] = values[:, 1:4]
+	return records
+
+# map vertex ids to indices into the id list, a repeated id to its last occurrence
+def _idIndex(ids, query):
+	if numpy.array_equal(ids, numpy.arange(1, len(ids)+1)): return query - 1
+	order = numpy.argsort(ids[::-1], kind='stable')
+	return (len(ids) - 1 - order)[numpy.searchsorted(ids[::-1][order], query)]
+
+def ReadMChunks(fileName, blockSize = BLOCK_SIZE):
+	'''
+	Yield the vertices and faces of a .m file as MeshChunk objects, one per block
+	of the file. Vertex ids are mapped to 0-based indices in order of appearance.
+	'''
+	nVert = 0; nFace = 0
+	# ids of all vertices so far, only kept once they stop being 1, 2, 3, ...
+	allIds = None
+	for block in ReadBlocks(fileName, blockSize):
+		records = _parseMBlock(block)
+		chunk = MeshLib.Mesh.MeshChunk(nVert, nFace)
+		ids = records['ids']
+		if len(ids) != 0:
+			chunk.positions = records['positions']
+			if len(records['uv']) == len(ids): chunk.textures = records['uv']
+			if allIds is None and not numpy.array_equal(ids, numpy.arange(nVert+1, nVert+len(ids)+1)):
+				allIds = numpy.arange(1, nVert+1)
+			if allIds is not None:
+				allIds = numpy.concatenate((allIds, ids))
+		faceIds = records['faceIds'].ravel()
+		if len(faceIds) != 0:
+			chunk.faceVerts = faceIds - 1 if allIds is None else _idIndex(allIds, faceIds)
+			chunk.faceStart = numpy.arange(0, len(faceIds)+1, 3, dtype=numpy.int64)
+		nVert += chunk.NumVerts(); nFace += chunk.NumFaces()
+		yield chunk
+
+# blank out the {...} attribute groups of .m records
+def _blankBraces(data):
+	buf = numpy.frombuffer(data, dtype=numpy.uint8).copy()
+	isOpen = buf == ord('{'); isClose = buf == ord('}')
+	inside = (numpy.cumsum(isOpen) - numpy.cumsum(isClose) > 0) | isClose
+	buf[inside] = SPACE
+	return buf.tobytes()
+
+def WriteM(fileName, positions, faceStart, faceVerts, textures = None, precision = 6, workers = 1):
+	'''
+	Write a .m file from arrays; faces are given as a flat corner list, of which
+	the first three corners are written.
+	Numbers are written with precision decimals, formatted by workers processes.
+	'''
+	real = RealFormat(precision)
+	pool = FormatPool(workers)
+	output = open(fileName, 'wb')
+	ids = numpy.arange(1, len(positions)+1)[:, None]
+	if textures is not None and len(textures) == len(positions):
+		rowFormat = 'Vertex %%d %s %s %s {uv=(%s %s)}\n' % ((real,) * 5)
+		WriteFormatted(output, RowChunks(numpy.hstack((ids, positions, textures)), rowFormat), pool)
+	else:
+		WriteFormatted(output, RowChunks(numpy.hstack((ids, positions)), 'Vertex %%d %s %s %s\n' % ((real,) * 3)), pool)
+	nFace = len(faceStart) - 1
+	corners = faceVerts[faceStart[:-1, None] + numpy.arange(3)] + 1
+	WriteFormatted(output, RowChunks(numpy.hstack((numpy.arange(1, nFace+1)[:, None], corners)), 'Face %d %d %d %d\n'), pool)
+	output.close()
+	if pool is not None: pool.close()
+
+def SaveMFile(fileName, verts, faces, normals, textures, precision = 6, workers = 1):
+	'''
+	Save mesh into .m file
+	'''
+	(faceStart, faceVerts) = PolygonCorners(faces)
+	WriteM(fileName, VectorArray(verts, 3), faceStart, faceVerts, VectorArray(textures, 2), precision, workers)
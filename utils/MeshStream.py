@@ -0,0 +1,275 @@
+from MeshLib.Geometry import *
+from MeshLib.Normals import FaceNormals
+from MeshLib.Topology import FanTriangulate
+from MeshLib.utils.FastText import RealFormat, RowChunks, WriteFormatted
+import MeshLib.Mesh
+import MeshLib.utils.OBJMesh
+import MeshLib.utils.OFFMesh
+import MeshLib.utils.PLYMesh
+import MeshLib.utils.MMesh
+import numpy
+import shutil
+import tempfile
+
+# Streaming (out-of-core) mesh processing.
+# A mesh file is read as a sequence of MeshChunk objects holding either a run of
+# vertices or a run of faces, so only one chunk needs to be in memory at a time.
+# Passes that need the positions of face corners spill the vertices to a
+# temporary file and memory-map it.
+
+CHUNK_SIZE = 1 << 20
+# about this many bytes of text are read per vertex or face
+BYTES_PER_RECORD = 32
+
+def ReadMeshChunks(fileName, chunkSize = CHUNK_SIZE):
+	'''
+	Yield the vertices and faces of a .obj/.off/.ply/.m file as MeshChunk objects
+	of chunkSize vertices or faces each. A chunk holds either vertices or faces,
+	and the vertices of a face always come in earlier chunks; a chunk is only
+	smaller than chunkSize at the end of a run of vertices or faces.
+	'''
+	suffix = fileName[fileName.rfind('.'):].lower()
+	readers = {'.obj': MeshLib.utils.OBJMesh.ReadOBJChunks, '.off': MeshLib.utils.OFFMesh.ReadOFFChunks, \
+		'.ply': MeshLib.utils.PLYMesh.ReadPLYChunks, '.m': MeshLib.utils.MMesh.ReadMChunks}
+	assert suffix in readers, 'Unsupported mesh format \'%s\'.' % suffix
+	vertPieces = []; facePieces = []
+	nVert = 0; nFace = 0
+	for piece in readers[suffix](fileName, max(chunkSize * BYTES_PER_RECORD, 1 << 16)):
+		if piece.NumVerts() != 0:
+			vertPieces.append(piece)
+			while sum(p.NumVerts() for p in vertPieces) >= chunkSize:
+				chunk = _takeVerts(vertPieces, chunkSize, nVert)
+				nVert += chunk.NumVerts()
+				yield chunk
+		if piece.NumFaces() != 0:
+			facePieces.append(piece)
+			while sum(p.NumFaces() for p in facePieces) >= chunkSize:
+				# faces only go out after all the vertices read before them
+				if len(vertPieces) != 0:
+					chunk = _takeVerts(vertPieces, sum(p.NumVerts() for p in vertPieces), nVert)
+					nVert += chunk.NumVerts()
+					yield chunk
+				chunk = _takeFaces(facePieces, chunkSize, nFace)
+				nFace += chunk.NumFaces()
+				yield chunk
+	if len(vertPieces) != 0:
+		yield _takeVerts(vertPieces, sum(p.NumVerts() for p in vertPieces), nVert)
+	if len(facePieces) != 0:
+		yield _takeFaces(facePieces, sum(p.NumFaces() for p in facePieces), nFace)
+
+# take the first n vertices of a list of chunks into one chunk
+def _takeVerts(pieces, n, vertStart):
+	parts = []
+	while n > 0:
+		piece = pieces[0]
+		k = min(n, piece.NumVerts())
+		parts.append(_vertSlice(piece, 0, k))
+		if k == piece.NumVerts(): del pieces[0]
+		else: pieces[0] = _vertSlice(piece, k, piece.NumVerts())
+		n -= k
+	chunk = MeshLib.Mesh.MeshChunk(vertStart, 0)
+	chunk.positions = numpy.concatenate([p.positions for p in parts])
+	# an attribute given in some parts only is filled with zeros (white for colors)
+	for (name, nCol, fill) in (('normals', 3, 0.0), ('textures', 2, 0.0), ('colors', 3, 1.0)):
+		if all(getattr(p, name) is None for p in parts): continue
+		setattr(chunk, name, numpy.concatenate([numpy.full((p.NumVerts(), nCol), fill) if getattr(p, name) is None \
+			else getattr(p, name) for p in parts]))
+	return chunk
+
+def _vertSlice(chunk, start, end):
+	piece = MeshLib.Mesh.MeshChunk(chunk.vertStart + start, 0)
+	piece.positions = chunk.positions[start:end]
+	for name in ('normals', 'textures', 'colors'):
+		if getattr(chunk, name) is not None: setattr(piece, name, getattr(chunk, name)[start:end])
+	return piece
+
+# take the first n faces of a list of chunks into one chunk
+def _takeFaces(pieces, n, faceFirst):
+	parts = []
+	while n > 0:
+		piece = pieces[0]
+		k = min(n, piece.NumFaces())
+		parts.append(_faceSlice(piece, 0, k))
+		if k == piece.NumFaces(): del pieces[0]
+		else: pieces[0] = _faceSlice(piece, k, piece.NumFaces())
+		n -= k
+	chunk = MeshLib.Mesh.MeshChunk(0, faceFirst)
+	sizes = numpy.concatenate([numpy.diff(p.faceStart) for p in parts])
+	chunk.faceStart = numpy.zeros(len(sizes)+1, dtype=numpy.int64)
+	numpy.cumsum(sizes, out=chunk.faceStart[1:])
+	chunk.faceVerts = numpy.concatenate([p.faceVerts for p in parts])
+	return chunk
+
+def _faceSlice(chunk, start, end):
+	piece = MeshLib.Mesh.MeshChunk(0, chunk.faceFirst + start)
+	piece.faceStart = chunk.faceStart[start:end+1] - chunk.faceStart[start]
+	piece.faceVerts = chunk.faceVerts[chunk.faceStart[start]:chunk.faceStart[end]]
+	return piece
+
+def StreamBoundingBox(fileName, chunkSize = CHUNK_SIZE):
+	'''
+	Return (vMin, vMax) of the vertices of a mesh file without loading it
+	'''
+	vMin = numpy.full(3, 1e30); vMax = numpy.full(3, -1e30)
+	for chunk in ReadMeshChunks(fileName, chunkSize):
+		if chunk.NumVerts() == 0: continue
+		vMin = numpy.minimum(vMin, chunk.positions.min(axis=0))
+		vMax = numpy.maximum(vMax, chunk.positions.max(axis=0))
+	return (Vector3D(*vMin.tolist()), Vector3D(*vMax.tolist()))
+
+def StreamCenterScale(fileName, chunkSize = CHUNK_SIZE):
+	'''
+	Return (center, scale) of a mesh file as Mesh.LoadMesh computes them, without loading it
+	'''
+	(vMin, vMax) = StreamBoundingBox(fileName, chunkSize)
+	scale = -1.0
+	for i in range(0, 3):
+		scale = max(scale, vMax[i] - vMin[i])
+	return ((vMax + vMin) / 2.0, 1.0 / scale)
+
+def StreamFaceAreas(fileName, chunkSize = CHUNK_SIZE):
+	'''
+	Return (area sum, face count) of a mesh file without loading it.
+	Face areas are computed like Mesh face areas; the vertices are spilled to a
+	temporary file, so only one chunk of faces is in memory at a time.
+	'''
+	spill = tempfile.TemporaryFile()
+	nVert = 0; positions = None
+	areaSum = 0.0; nFace = 0
+	for chunk in ReadMeshChunks(fileName, chunkSize):
+		if chunk.NumVerts() != 0:
+			spill.write(numpy.ascontiguousarray(chunk.positions, dtype=numpy.float64).tobytes())
+			nVert += chunk.NumVerts(); positions = None
+		if chunk.NumFaces() == 0: continue
+		if positions is None:
+			spill.flush()
+			positions = numpy.memmap(spill, dtype=numpy.float64, mode='r', shape=(nVert, 3))
+		(normals, areas) = FaceNormals(positions, chunk.faceStart, chunk.faceVerts)
+		areaSum += float(areas.sum()); nFace += chunk.NumFaces()
+	spill.close()
+	return (areaSum, nFace)
+
+def StreamConvert(srcName, dstName, chunkSize = CHUNK_SIZE, plyFormat = 'ascii', precision = 6):
+	'''
+	Convert a mesh file into another format (.obj/.off/.ply/.m) chunk by chunk.
+	Vertex attributes are kept as far as both formats carry them; .m faces are
+	fan-triangulated; numbers are written with precision decimals.
+	Return (vertex count, face count).
+	'''
+	writer = _ChunkWriter(dstName, plyFormat, precision)
+	for chunk in ReadMeshChunks(srcName, chunkSize):
+		if chunk.NumVerts() != 0: writer.WriteVerts(chunk)
+		if chunk.NumFaces() != 0: writer.WriteFaces(chunk)
+	writer.Close()
+	return (writer.nVert, writer.nFace)
+
+# _ChunkWriter class, writes a mesh file from chunks
+# fields:
+#     fileName	---- output file
+#     suffix	---- output format
+#     plyFormat	---- .ply data format
+#     precision	---- decimals of real numbers in text formats
+#     sections	---- temporary files of the vertex, face etc. records, joined behind the header on Close()
+#     attrs	---- vertex attributes written, taken from the first vertex chunk
+#     nVert	---- vertices written so far
+#     nFace	---- faces written so far
+class _ChunkWriter:
+	def __init__(self, fileName, plyFormat = 'ascii', precision = 6):
+		self.fileName = fileName
+		self.suffix = fileName[fileName.rfind('.'):].lower()
+		assert self.suffix in ('.obj', '.off', '.ply', '.m'), 'Unsupported mesh format \'%s\'.' % self.suffix
+		self.plyFormat = plyFormat
+		self.precision = precision
+		self.sections = dict((name, tempfile.TemporaryFile()) for name in ('v', 'vn', 'vt', 'f'))
+		self.attrs = None
+		self.nVert = 0
+		self.nFace = 0
+
+	def WriteVerts(self, chunk):
+		if self.attrs is None:
+			self.attrs = [name for name in ('normals', 'textures', 'colors') if getattr(chunk, name) is not None]
+		n = chunk.NumVerts()
+		positions = chunk.positions
+		normals = self.__attribute(chunk, 'normals', 3, 0.0)
+		textures = self.__attribute(chunk, 'textures', 2, 0.0)
+		colors = self.__attribute(chunk, 'colors', 3, 1.0)
+		if self.suffix == '.obj':
+			if colors is None: self.__write('v', positions, 'v %f %f %f\n')
+			else: self.__write('v', numpy.hstack((positions, colors)), 'v %f %f %f %f %f %f\n')
+			if normals is not None: self.__write('vn', normals, 'vn %f %f %f\n')
+			if textures is not None: self.__write('vt', textures, 'vt %f %f\n')
+		elif self.suffix == '.off':
+			# .off vertices carry either texture coordinates or a color
+			if textures is not None: self.__write('v', numpy.hstack((positions, textures)), '%f %f %f %f %f\n')
+			elif colors is not None:
+				self.__write('v', numpy.hstack((positions, numpy.rint(colors * 255.0))), '%f %f %f %d %d %d\n')
+			else: self.__write('v', positions, '%f %f %f\n')
+		elif self.suffix == '.ply':
+			columns = MeshLib.utils.PLYMesh.PLYVertexColumns(positions, normals, textures, colors)
+			MeshLib.utils.PLYMesh.WritePLYVertices(self.sections['v'], self.plyFormat, columns, self.precision)
+		else:
+			ids = numpy.arange(self.nVert + 1, self.nVert + n + 1)[:, None]
+			if textures is None: self.__write('v', numpy.hstack((ids, positions)), 'Vertex %d %f %f %f\n')
+			else: self.__write('v', numpy.hstack((ids, positions, textures)), 'Vertex %d %f %f %f {uv=(%f %f)}\n')
+		self.nVert += n
+
+	def WriteFaces(self, chunk):
+		faceStart = chunk.faceStart; faceVerts = chunk.faceVerts
+		if self.suffix == '.m':
+			triangles = faceVerts[FanTriangulate(faceStart)]
+			ids = numpy.arange(self.nFace + 1, self.nFace + len(triangles) + 1)[:, None]
+			self.__write('f', numpy.hstack((ids, triangles + 1)), 'Face %d %d %d %d\n')
+			self.nFace += len(triangles)
+			return
+		if self.suffix == '.ply':
+			MeshLib.utils.PLYMesh.WritePLYFaces(self.sections['f'], self.plyFormat, faceStart, faceVerts)
+		elif self.suffix == '.obj':
+			# v, v/vt, v//vn or v/vt/vn tokens with the vertex's own index
+			token = {(): '%d', ('textures',): '%d/%d', ('normals',): '%d//%d', ('normals', 'textures'): '%d/%d/%d'} \
+				[tuple(name for name in ('normals', 'textures') if name in (self.attrs or []))]
+			self.__writeFaces(faceStart, faceVerts + 1, 'f', token, token.count('%d'))
+		else:
+			self.__writeFaces(faceStart, faceVerts, '', '%d', 1, True)
+		self.nFace += chunk.NumFaces()
+
+	def Close(self):
+		output = open(self.fileName, 'wb')
+		if self.suffix == '.off':
+			output.write(('OFF\n%d %d 0\n' % (self.nVert, self.nFace)).encode())
+		elif self.suffix == '.ply':
+			columns = MeshLib.utils.PLYMesh.PLYVertexColumns(numpy.zeros((0, 3)), \
+				*[numpy.zeros((0, nCol)) if name in (self.attrs or []) else None for (name, nCol) in (('normals', 3), ('textures', 2), ('colors', 3))])
+			output.write(MeshLib.utils.PLYMesh.PLYHeader(self.plyFormat, self.nVert, self.nFace, columns))
+		for name in ('v', 'vn', 'vt', 'f'):
+			self.sections[name].seek(0)
+			shutil.copyfileobj(self.sections[name], output)
+			self.sections[name].close()
+		output.close()
+
+	# a vertex attribute of a chunk if it is written, filled where the chunk lacks it
+	def __attribute(self, chunk, name, nCol, fill):
+		if name not in self.attrs: return None
+		if getattr(chunk, name) is None: return numpy.full((chunk.NumVerts(), nCol), fill)
+		return getattr(chunk, name)
+
+	# write rows with rowFormat, %f standing for a real number
+	def __write(self, section, rows, rowFormat):
+		WriteFormatted(self.sections[section], RowChunks(rows, rowFormat.replace('%f', RealFormat(self.precision))))
+
+	# write faces as 'prefix token token ...' lines, a token repeating the index repeat times;
+	# with withSize the prefix is the corner count
+	def __writeFaces(self, faceStart, faceVerts, prefix, token, repeat, withSize = False):
+		sizes = numpy.diff(faceStart)
+		nFace = len(sizes)
+		if nFace != 0 and (sizes == sizes[0]).all():
+			rows = numpy.repeat(faceVerts.reshape(nFace, -1), repeat, axis=1)
+			rowFormat = ' '.join([prefix if not withSize else str(int(sizes[0]))] + [token] * int(sizes[0])) + '\n'
+			self.__write('f', rows, rowFormat)
+			return
+		faceVertList = faceVerts.tolist(); starts = faceStart.tolist()
+		text = []
+		for i in range(0, nFace):
+			corners = faceVertList[starts[i]:starts[i+1]]
+			head = prefix if not withSize else str(len(corners))
+			text.append(head + ''.join(' ' + token % ((c,) * repeat) for c in corners) + '\n')
+		self.sections['f'].write(''.join(text).encode())
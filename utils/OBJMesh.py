@@ -1,99 +1,276 @@
 from MeshLib.Geometry import *
+from MeshLib.MeshArrays import MeshArrays, UniqueRows, VectorArray
+from MeshLib.Topology import FanTriangulate, PolygonCorners
+from MeshLib.utils.FastText import *
+from MeshLib.utils.Parallel import *
 import MeshLib.Mesh
+import numpy
+import re
 
-def LoadOBJFile(fileName, rmReduntVerts):
+def LoadOBJFile(fileName, rmReduntVerts, workers = 1):
 	'''
-	Load a .obj file, return vertices, faces, normals and textures
+	Load a .obj file, return vertices, faces, normals, textures, lines and the mtllib file.
+	The file is parsed in bulk, in byte ranges by a pool of workers processes for
+	workers > 1; redundant vertices are those with the same parsed numbers.
 	'''
-	verts = []; faces = [];	normals = []; textures = []; lines = []
-	reduntLabels = []
-	vert2index = dict()
-	realIndex = []
-	mtllibFile = 'texture.mtl'
-	for curLine in open(fileName):
-		curLine = curLine.rstrip()
-		if curLine[:2] == 'v ':
-			if rmReduntVerts and curLine in vert2index: 
-				realIndex.append(vert2index[curLine])
-				reduntLabels.append(True)
-				continue 
-			if rmReduntVerts: 
-				vert2index[curLine] = len(verts)
-				realIndex.append(len(verts))
-				reduntLabels.append(False)
+	(verts, records, sizes, idx, lines, mtllibFile) = _parseOBJ(fileName, BLOCK_SIZE, workers)
+	hasColor = ~numpy.isnan(verts[:, 5])
+	vIdx = idx[0]
+	normals = records[2][:, :3]; textures = records[1][:, :2]
+	if rmReduntVerts:
+		(keep, realIndex) = UniqueRows(numpy.nan_to_num(verts))
+		# normals and textures are assumed to have exactly the same size as the vertices
+		if len(normals) == len(verts): normals = normals[keep]
+		if len(textures) == len(verts): textures = textures[keep]
+		(verts, hasColor) = (verts[keep], hasColor[keep])
+		vIdx = realIndex[vIdx]
+		lines = [realIndex[l].tolist() for l in lines]
+	vertList = [MeshLib.Mesh.Vertex(Vector3D(x, y, z)) for (x, y, z) in verts[:, :3].tolist()]
+	for i in numpy.flatnonzero(hasColor).tolist():
+		vertList[i].color = Vector3D(*verts[i, 3:6].tolist())
+	faceStart = numpy.zeros(len(sizes)+1, dtype=numpy.int64)
+	numpy.cumsum(sizes, out=faceStart[1:])
+	# faces with a repeated vertex among their first three corners are skipped
+	first = vIdx[faceStart[:-1, None] + numpy.arange(0, 3)] if len(sizes) else numpy.zeros((0, 3), dtype=numpy.int64)
+	valid = (first[:, 0] != first[:, 1]) & (first[:, 1] != first[:, 2]) & (first[:, 0] != first[:, 2])
+	vIdx = vIdx.tolist(); faceStart = faceStart.tolist()
+	faces = [MeshLib.Mesh.Face(vIdx[faceStart[i]:faceStart[i+1]]) for i in numpy.flatnonzero(valid).tolist()]
+	normals = [Vector3D(x, y, z) for (x, y, z) in normals.tolist()]
+	textures = [Vector2D(u, v) for (u, v) in textures.tolist()]
+	return (vertList, faces, normals, textures, lines, mtllibFile)
 
-			parts = curLine.split()
-			parts = [p for p in parts if p != '']
-			v = MeshLib.Mesh.Vertex(Vector3D(float(parts[1]), float(parts[2]), float(parts[3])))
-			if len(parts) > 4:
-				v.color = Vector3D(float(parts[4]), float(parts[5]), float(parts[6]))
-			verts.append(v)
-		elif curLine[:3] == 'vn ':
-			parts = curLine.split()
-			parts = [p for p in parts if p != '']
-			normals.append(Vector3D(float(parts[1]), float(parts[2]), float(parts[3])))
-		elif curLine[:3] == 'vt ':
-			parts = curLine.split()
-			parts = [p for p in parts if p != '']
-			textures.append(Vector2D(float(parts[1]), float(parts[2])))
-		elif curLine[:2] == 'f ':
-			parts = curLine.split()
-			parts = [p for p in parts if p != '']
-			del parts[0]
-			vertList = [int(p.split('/')[0])-1 for p in parts]
-			if rmReduntVerts:
-				vertList = [realIndex[v] for v in vertList]
-			if vertList[0] == vertList[1] or vertList[0] == vertList[2] or vertList[1] == vertList[2]: continue
-			faces.append(MeshLib.Mesh.Face(vertList))
-		elif curLine[:2] == 'l ':
-			parts = curLine.split()
-			parts = [p for p in parts if p != '']
-			del parts[0]
-			vertList = [int(p)-1 for p in parts]
-			if rmReduntVerts:
-				vertList = [realIndex[v] for v in vertList]
-			lines.append(vertList)
-		elif 'mtllib' in curLine:
-			mtllibFile = curLine.split()[-1]
+def LoadOBJArrays(fileName, rmReduntVerts, blockSize = BLOCK_SIZE, workers = 1):
+	'''
+	Load a .obj file into MeshArrays, return (arrays, lines, mtllibFile).
+	The file is read in large blocks and the v/vt/vn/f records of a block are
+	parsed in bulk. Face tokens may be v, v/vt, v//vn or v/vt/vn, indices may be
+	negative, and polygonal faces are fan-triangulated.
+	With workers > 1 byte ranges of the file are parsed by a process pool.
+	'''
+	(verts, records, sizes, idx, lines, mtllibFile) = _parseOBJ(fileName, blockSize, workers)
+	positions = verts[:, :3]
+	# only records with 6 numbers carry a color
+	hasColor = ~numpy.isnan(verts[:, 5])
+	colors = numpy.where(hasColor[:, None], verts[:, 3:6], 1.0) if hasColor.any() else None
+	vIdx = idx[0]
+	# per-vertex textures and normals, through the face tokens if they index them separately
+	perVertex = []
+	for (j, nCol) in ((1, 2), (2, 3)):
+		values = records[j][:, :nCol]
+		if len(values) == 0:
+			perVertex.append(None)
+		elif (idx[j] == -1).all() or (len(values) == len(positions) and numpy.array_equal(idx[j], vIdx)):
+			# same indexing as the vertices
+			perVertex.append(values if len(values) == len(positions) else None)
+		else:
+			scattered = numpy.zeros((len(positions), nCol))
+			used = idx[j] != -1
+			scattered[vIdx[used]] = values[idx[j][used]]
+			perVertex.append(scattered)
+	(textures, normals) = perVertex
 
-	# select normals and textures -- here assume that the normals and textures have exact the same size as vertices
-	normals_ = []; textures_ = []
 	if rmReduntVerts:
-		for i in range(0, len(normals)):
-			if not reduntLabels[i]: 
-				normals_.append(normals[realIndex[i]])
-				textures_.append(textures[realIndex[i]])
+		(keep, realIndex) = UniqueRows(positions if colors is None else numpy.hstack((positions, colors)))
+		positions = positions[keep]
+		if colors is not None: colors = colors[keep]
+		if textures is not None: textures = textures[keep]
+		if normals is not None: normals = normals[keep]
+		vIdx = realIndex[vIdx]
+		lines = [realIndex[l].tolist() for l in lines]
+
+	# triangulate and drop degenerate faces
+	faceStart = numpy.zeros(len(sizes)+1, dtype=numpy.int64)
+	numpy.cumsum(sizes, out=faceStart[1:])
+	faces = vIdx[FanTriangulate(faceStart)]
+	valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+	return (MeshArrays(positions, faces[valid], normals, textures, colors), lines, mtllibFile)
+
+# parse a whole .obj file, in byte ranges by a process pool for workers > 1;
+# return (v records Nx6, [None, vt records, vn records], face sizes, [v, vt, vn indices per corner], lines, mtllibFile)
+def _parseOBJ(fileName, blockSize, workers):
+	if workers <= 1:
+		parts = [_parseOBJRange((fileName, 0, None, blockSize))]
+		blocks = []
 	else:
-		normals_ = normals
-		textures_ = textures
-	return (verts, faces, normals_, textures_, lines, mtllibFile)
+		ranges = SplitRanges(fileName, 2 * workers) or [(0, 0)]
+		results = MapInPool(_parseOBJShared, [(fileName, start, end, blockSize) for (start, end) in ranges], workers, lambda result: FreeArrays(result[0]))
+		parts = []; blocks = []
+		for (shared, mtllib) in results:
+			(arrays, partBlocks) = AttachArrays(shared)
+			parts.append((arrays, mtllib))
+			blocks += partBlocks
+	# v/vt/vn records before each range
+	offsets = numpy.zeros((len(parts)+1, 3), dtype=numpy.int64)
+	for i in range(0, len(parts)):
+		offsets[i+1] = offsets[i] + [len(parts[i][0][name]) for name in ('v', 'vt', 'vn')]
+	def stitch(name, rel = None, j = 0):
+		# indices resolved from negative ones are relative to their range, shift them by the records before it
+		return numpy.concatenate([arrays[name] if rel is None else arrays[name] + numpy.where(arrays[rel], offsets[i, j], 0) \
+			for (i, (arrays, mtllib)) in enumerate(parts)])
+	verts = stitch('v')
+	records = [None, stitch('vt'), stitch('vn')]
+	sizes = stitch('sizes')
+	idx = [stitch('idx%d' % j, 'rel%d' % j, j) for j in range(0, 3)]
+	(lineStart, lineVerts) = ConcatLists([(arrays['lineStart'], arrays['lineVerts']) for (arrays, mtllib) in parts])
+	lineVerts = lineVerts + numpy.concatenate([numpy.where(arrays['lineRel'], offsets[i, 0], 0) for (i, (arrays, mtllib)) in enumerate(parts)])
+	lines = [lineVerts[lineStart[i]:lineStart[i+1]].tolist() for i in range(0, len(lineStart)-1)]
+	mtllibFiles = [mtllib for (arrays, mtllib) in parts if mtllib is not None]
+	ReleaseBlocks(blocks)
+	return (verts, records, sizes, idx, lines, mtllibFiles[-1] if len(mtllibFiles) != 0 else 'texture.mtl')
+
+def _parseOBJShared(args):
+	(arrays, mtllib) = _parseOBJRange(args)
+	return (ShareArrays(arrays), mtllib)
+
+# parse the records of the byte range [start, end) of a .obj file into arrays;
+# negative indices are resolved within the range and flagged by rel0/rel1/rel2 (lineRel for polylines)
+def _parseOBJRange(args):
+	(fileName, start, end, blockSize) = args
+	recordBlocks = [[], [], []]
+	sizeBlocks = []; idxBlocks = [[], [], []]; relBlocks = [[], [], []]
+	lineItems = []; lineRel = []; lineStart = [0]
+	mtllibFile = None
+	# number of v/vt/vn records read so far
+	counts = [0, 0, 0]
+	for block in ReadBlocks(fileName, blockSize, start, end):
+		table = LineTable(block)
+		isRecord = [table.StartsWith('v'), table.StartsWith('vt'), table.StartsWith('vn')]
+		isFace = table.StartsWith('f')
+		isLine = table.StartsWith('l')
+		# vertex records
+		# v: x y z [w] [r g b], vt: u v [w], vn: x y z
+		for (j, prefix, lo, hi) in ((0, 'v', 3, 6), (1, 'vt', 2, 3), (2, 'vn', 3, 3)):
+			nRecord = int(isRecord[j].sum())
+			if nRecord == 0: continue
+			data = table.Extract(isRecord[j], len(prefix))
+			recordBlocks[j].append(RecordColumns(data, nRecord, lo, hi))
+		# faces
+		if isFace.any():
+			(sizes, ints) = _faceRecords(table.Extract(isFace, 1), int(isFace.sum()))
+			k = ints.shape[1]
+			sizeBlocks.append(sizes)
+			for j in range(0, 3):
+				if j >= k:
+					idxBlocks[j].append(numpy.full(len(ints), -1, dtype=numpy.int64))
+					relBlocks[j].append(numpy.zeros(len(ints), dtype=bool))
+					continue
+				idx = ints[:, j] - 1
+				# negative indices count back from the records read before the face
+				rel = idx < -1
+				negative = numpy.flatnonzero(rel)
+				if len(negative) != 0:
+					before = numpy.repeat((numpy.cumsum(isRecord[j]) + counts[j])[isFace], sizes)
+					idx[negative] = before[negative] + idx[negative] + 1
+				idxBlocks[j].append(idx)
+				relBlocks[j].append(rel)
+		# polylines
+		if isLine.any():
+			vertBefore = numpy.cumsum(isRecord[0]) + counts[0]
+			for li in numpy.flatnonzero(isLine).tolist():
+				parts = [int(p) for p in block[table.start[li]:table.end[li]].split()[1:]]
+				lineItems += [p - 1 if p > 0 else int(vertBefore[li]) + p for p in parts]
+				lineRel += [p < 0 for p in parts]
+				lineStart.append(len(lineItems))
+		if b'mtllib' in block:
+			for m in re.finditer(rb'^[ \t]*mtllib[ \t]+(.*?)\s*$', block, re.M):
+				mtllibFile = m.group(1).split()[-1].decode()
+		for j in range(0, 3):
+			counts[j] += int(isRecord[j].sum())
+
+	arrays = dict()
+	for (j, name, nCol) in ((0, 'v', 6), (1, 'vt', 3), (2, 'vn', 3)):
+		arrays[name] = numpy.concatenate(recordBlocks[j]) if len(recordBlocks[j]) else numpy.zeros((0, nCol))
+		arrays['idx%d' % j] = numpy.concatenate(idxBlocks[j]) if len(sizeBlocks) else numpy.zeros(0, dtype=numpy.int64)
+		arrays['rel%d' % j] = numpy.concatenate(relBlocks[j]) if len(sizeBlocks) else numpy.zeros(0, dtype=bool)
+	arrays['sizes'] = numpy.concatenate(sizeBlocks) if len(sizeBlocks) else numpy.zeros(0, dtype=numpy.int64)
+	arrays['lineStart'] = numpy.array(lineStart, dtype=numpy.int64)
+	arrays['lineVerts'] = numpy.array(lineItems, dtype=numpy.int64)
+	arrays['lineRel'] = numpy.array(lineRel, dtype=bool)
+	return (arrays, mtllibFile)
 
-def SaveOBJFile(fileName, verts, faces, lines, normals, textures):
+def ReadOBJChunks(fileName, blockSize = BLOCK_SIZE):
 	'''
-	Save mesh into .obj file
+	Yield the vertices and faces of a .obj file as MeshChunk objects, one per
+	block of the file. Faces keep their polygons; vt/vn records are skipped as
+	their indexing is only known once the whole file is read.
 	'''
-	nNorm = len(normals); nTex = len(textures)
-	output = open(fileName, 'w')
-	for v in verts:
-		output.write('v %f %f %f\n' % (v[0], v[1], v[2]))
-	for vn in normals:
-		output.write('vn %f %f %f\n' % (vn[0], vn[1], vn[2]))
-	for vt in textures:
-		output.write('vt %f %f\n' % (vt[0], vt[1]))
-	for f in faces:
-		if not f.valid: continue
-		faceLine = 'f'
-		if nNorm == 0 and nTex == 0:
-			for fi in f: faceLine += ' ' + str(fi+1)
-		elif nNorm != 0 and nTex == 0 or nNorm == 0 and nTex != 0:
-			for fi in f: faceLine += ' ' + str(fi+1) + '/' + str(fi+1)
-		else:
-			for fi in f: faceLine += ' ' + (str(fi+1) + '/')*2 + str(fi+1)
-		output.write(faceLine + '\n')
-	for curLine in lines:
-		output.write('l')
-		for l in curLine:
-			output.write(' %d' % (l+1))
-		output.write('\n')
+	nVert = 0; nFace = 0
+	for block in ReadBlocks(fileName, blockSize):
+		table = LineTable(block)
+		isVert = table.StartsWith('v')
+		isFace = table.StartsWith('f')
+		chunk = MeshLib.Mesh.MeshChunk(nVert, nFace)
+		nRecord = int(isVert.sum())
+		if nRecord != 0:
+			verts = RecordColumns(table.Extract(isVert, 1), nRecord, 3, 6)
+			chunk.positions = verts[:, :3]
+			hasColor = ~numpy.isnan(verts[:, 5])
+			if hasColor.any(): chunk.colors = numpy.where(hasColor[:, None], verts[:, 3:6], 1.0)
+		if isFace.any():
+			(sizes, ints) = _faceRecords(table.Extract(isFace, 1), int(isFace.sum()))
+			idx = ints[:, 0] - 1
+			negative = numpy.flatnonzero(idx < -1)
+			if len(negative) != 0:
+				before = numpy.repeat((numpy.cumsum(isVert) + nVert)[isFace], sizes)
+				idx[negative] = before[negative] + idx[negative] + 1
+			chunk.faceStart = numpy.zeros(len(sizes)+1, dtype=numpy.int64)
+			numpy.cumsum(sizes, out=chunk.faceStart[1:])
+			chunk.faceVerts = idx
+		nVert += chunk.NumVerts(); nFace += chunk.NumFaces()
+		yield chunk
+
+# parse face records into (sizes, ints), ints having one row of v[/vt[/vn]] indices per token (0 if missing)
+def _faceRecords(data, nFaceLine):
+	# make every token v/vt/vn-like with the same number of slashes
+	if b'//' in data: data = data.replace(b'//', b'/0/')
+	k = data.split(None, 1)[0].count(b'/') + 1
+	nSlash = data.count(b'/')
+	ints = ParseNumbers(data.replace(b'/', b' '), numpy.int64)
+	if len(ints) == 3 * k * nFaceLine and nSlash == 3 * (k-1) * nFaceLine:
+		return (numpy.full(nFaceLine, 3, dtype=numpy.int64), ints.reshape(-1, k))
+	sizes = TokensPerLine(data)
+	nToken = int(sizes.sum())
+	if len(ints) == k * nToken and nSlash == (k-1) * nToken:
+		return (sizes, ints.reshape(-1, k))
+	# tokens of mixed forms, split them one by one
+	tokens = [(t.split(b'/') + [b'0', b'0'])[:3] for t in data.split()]
+	return (sizes, numpy.array([[int(p) for p in t] for t in tokens], dtype=numpy.int64).reshape(-1, 3))
 
+def WriteOBJ(fileName, positions, faceStart, faceVerts, normals = None, textures = None, lines = [], faceValid = None, \
+	precision = 6, workers = 1):
+	'''
+	Write a .obj file from arrays; faces are given as a flat corner list, faces
+	with faceValid False are skipped. Normals and textures share the vertex indices.
+	Numbers are written with precision decimals, formatted by workers processes.
+	'''
+	real = RealFormat(precision)
+	pool = FormatPool(workers)
+	output = open(fileName, 'wb')
+	WriteFormatted(output, RowChunks(positions, 'v %s %s %s\n' % ((real,) * 3)), pool)
+	hasNormals = normals is not None and len(normals) != 0
+	hasTextures = textures is not None and len(textures) != 0
+	if hasNormals: WriteFormatted(output, RowChunks(normals, 'vn %s %s %s\n' % ((real,) * 3)), pool)
+	if hasTextures: WriteFormatted(output, RowChunks(textures, 'vt %s %s\n' % ((real,) * 2)), pool)
+	if faceValid is not None and not faceValid.all():
+		sizes = numpy.diff(faceStart)[faceValid]
+		faceVerts = faceVerts[numpy.repeat(faceValid, numpy.diff(faceStart))]
+		faceStart = numpy.zeros(len(sizes)+1, dtype=numpy.int64)
+		numpy.cumsum(sizes, out=faceStart[1:])
+	token = {(False, False): ' %d', (False, True): ' %d/%d', (True, False): ' %d//%d', (True, True): ' %d/%d/%d'}[(hasNormals, hasTextures)]
+	items = numpy.repeat(faceVerts[:, None] + 1, token.count('%d'), axis=1)
+	WriteFormatted(output, RaggedChunks(items, faceStart, lambda n: 'f' + token * n + '\n'), pool)
+	if len(lines) != 0:
+		lineStart = numpy.cumsum([0] + [len(l) for l in lines])
+		lineVerts = numpy.array([vi for l in lines for vi in l], dtype=numpy.int64) + 1
+		WriteFormatted(output, RaggedChunks(lineVerts, lineStart, lambda n: 'l' + ' %d' * n + '\n'), pool)
 	output.close()
+	if pool is not None: pool.close()
+
+def SaveOBJFile(fileName, verts, faces, lines, normals, textures, precision = 6, workers = 1):
+	'''
+	Save mesh into .obj file
+	'''
+	(faceStart, faceVerts) = PolygonCorners(faces)
+	faceValid = numpy.fromiter((f.valid for f in faces), dtype=bool, count=len(faces))
+	WriteOBJ(fileName, VectorArray(verts, 3), faceStart, faceVerts, VectorArray(normals, 3), VectorArray(textures, 2), \
+		lines, faceValid, precision, workers)
@@ -1,61 +1,171 @@
 from MeshLib.Geometry import *
+from MeshLib.MeshArrays import MeshArrays, UniqueRows, VectorArray
+from MeshLib.Topology import FanTriangulate, PolygonCorners
+from MeshLib.utils.FastText import *
+from MeshLib.utils.Parallel import *
 import MeshLib.Mesh
+import numpy
+import re
 
-def LoadOFFFile(fileName, rmReduntVerts):
+def LoadOFFFile(fileName, rmReduntVerts, workers = 1):
 	'''
-	Load a .off file, return vertices, faces, normals and textures
+	Load a .off file, return vertices, faces, normals and textures.
+	The file is parsed in bulk, in byte ranges by a pool of workers processes for
+	workers > 1; redundant vertices are those with the same parsed numbers.
 	'''
-	file = open(fileName)
+	(rows, faceStart, faceVerts) = _parseOFF(fileName, workers)
+	if rmReduntVerts:
+		(keep, realIndex) = UniqueRows(numpy.nan_to_num(rows))
+		rows = rows[keep]
+		faceVerts = realIndex[faceVerts]
+	# x y z [u v | r g b [a]]
+	hasColor = ~numpy.isnan(rows[:, 5])
+	hasTexture = ~numpy.isnan(rows[:, 4]) & ~hasColor
+	verts = [MeshLib.Mesh.Vertex(Vector3D(x, y, z)) for (x, y, z) in rows[:, :3].tolist()]
+	for i in numpy.flatnonzero(hasColor).tolist():
+		verts[i].color = Vector3D(*(rows[i, 3:6] / 255.0).tolist())
+	textures = [Vector2D(u, v) for (u, v) in rows[hasTexture, 3:5].tolist()]
+	faceVerts = faceVerts.tolist(); faceStart = faceStart.tolist()
+	faces = [MeshLib.Mesh.Face(faceVerts[faceStart[i]:faceStart[i+1]]) for i in range(0, len(faceStart)-1)]
+	return (verts, faces, [], textures, [])
+
+def LoadOFFArrays(fileName, rmReduntVerts, workers = 1):
+	'''
+	Load a .off file into MeshArrays, return (arrays, lines).
+	Vertex colors (r g b [a] in 0..255) and texture coordinates (u v) are loaded
+	if present; polygonal faces are fan-triangulated.
+	With workers > 1 byte ranges of the file are parsed by a process pool.
+	'''
+	(rows, faceStart, faceVerts) = _parseOFF(fileName, workers)
+	if rmReduntVerts:
+		(keep, realIndex) = UniqueRows(numpy.nan_to_num(rows))
+		rows = rows[keep]
+		faceVerts = realIndex[faceVerts]
+	# x y z [u v | r g b [a]]
+	hasColor = ~numpy.isnan(rows[:, 5])
+	colors = numpy.where(hasColor[:, None], rows[:, 3:6] / 255.0, 1.0) if hasColor.any() else None
+	textures = rows[:, 3:5] if len(rows) != 0 and colors is None and not numpy.isnan(rows[:, 4]).any() else None
+	faces = faceVerts[FanTriangulate(faceStart)]
+	return (MeshArrays(rows[:, :3], faces, None, textures, colors), [])
+
+# parse the body of a .off file, in byte ranges by a process pool for workers > 1;
+# return (vertex rows Nx7, NaN padded, face start offsets, flat face corners)
+def _parseOFF(fileName, workers):
+	(meshInfo, start) = _readOFFHeader(fileName)
+	if workers <= 1:
+		parts = [_parseOFFRange((fileName, start, None))]
+		blocks = []
+	else:
+		ranges = SplitRanges(fileName, 2 * workers, start) or [(start, start)]
+		parts = []; blocks = []
+		for shared in MapInPool(_parseOFFShared, [(fileName, start, end) for (start, end) in ranges], workers, FreeArrays):
+			(arrays, partBlocks) = AttachArrays(shared)
+			parts.append(arrays)
+			blocks += partBlocks
+	# a line is a vertex or a face by its record number, the records of the ranges before it plus its own
+	firstLines = numpy.cumsum([0] + [numpy.count_nonzero(part['tokens']) for part in parts]).tolist()
+	try:
+		records = [_offRecords(part['tokens'], part['values'], firstLines[i], meshInfo) for (i, part) in enumerate(parts)]
+	finally:
+		ReleaseBlocks(blocks)
+	rows = numpy.concatenate([r['verts'] for r in records])
+	(faceStart, faceVerts) = ConcatLists([(r['faceStart'], r['faceVerts']) for r in records])
+	assert len(rows) == meshInfo[0] and len(faceStart) - 1 == meshInfo[1], 'Unexpected end of .off data.'
+	return (rows, faceStart, faceVerts)
+
+def _parseOFFShared(args):
+	return ShareArrays(_parseOFFRange(args))
+
+# tokenize the byte range [start, end) of a .off file body, where vertex and face lines
+# are not told apart yet; return the count of numbers on every line and all the numbers
+def _parseOFFRange(args):
+	(fileName, start, end) = args
+	lines = [_offLines(block) for block in ReadBlocks(fileName, BLOCK_SIZE, start, end)]
+	return dict(tokens = numpy.concatenate([tokens for (tokens, values) in lines] + [numpy.zeros(0, dtype=numpy.int64)]), \
+		values = numpy.concatenate([values for (tokens, values) in lines] + [numpy.zeros(0)]))
+
+# read the header of a .off file, return (meshInfo, offset of the body)
+def _readOFFHeader(fileName):
+	file = open(fileName, 'rb')
 	file.readline()
-	meshInfo = [int(i) for i in file.readline().split()]
-	verts = []; faces = []; normals = []; textures = []; lines = []
-	vert2index = dict()
-	realIndex = []
-
-	# load vertices
-	for i in range(0, meshInfo[0]):
-		curLine = file.readline().rstrip()
-		if rmReduntVerts and curLine in vert2index: 
-			realIndex.append(vert2index[curLine])
-			continue 
-		if rmReduntVerts: 
-			vert2index[curLine] = len(verts)
-			realIndex.append(len(verts))
-
-		parts = curLine.split(' ')
-		parts = [p for p in parts if p != '']
-		v = MeshLib.Mesh.Vertex(Vector3D(float(parts[0]), float(parts[1]), float(parts[2])))
-		if len(parts) == 5:
-			textures.append(Vector2D(float(parts[3]), float(parts[4])))
-		elif len(parts) >= 6:
-			v.color = Vector3D(float(parts[3])/255.0, float(parts[4])/255.0, float(parts[5])/255.0)
-		verts.append(v)
-
-	# load faces
-	for i in range(0, meshInfo[1]):
-		vertList = file.readline().rstrip().split(' ')
-		vertList = [int(p) for p in vertList if p != '']
-		del vertList[0]
-		if rmReduntVerts:
-			vertList = [realIndex[v] for v in vertList]
-		faces.append(MeshLib.Mesh.Face(vertList))
-	return (verts, faces, normals, textures, lines)
-
-def SaveOFFFile(fileName, verts, faces, normals, textures):
+	while True:
+		curLine = file.readline()
+		assert len(curLine) != 0, 'Unexpected end of .off header.'
+		parts = curLine.split(b'#')[0].split()
+		if len(parts) != 0: break
+	meshInfo = [int(i) for i in parts]
+	start = file.tell()
+	file.close()
+	return (meshInfo, start)
+
+# parse a block of the body of a .off file whose records start at body record firstLine;
+# return a dict of vertex rows (x y z and up to 4 more numbers, NaN padded) and faces as a flat corner list
+def _parseOFFBlock(block, firstLine, meshInfo):
+	return _offRecords(*_offLines(block), firstLine, meshInfo)
+
+# the count of numbers on every line of a block and all its numbers, # comments left out
+def _offLines(block):
+	if b'#' in block: block = re.sub(rb'#[^\n]*', b'', block)
+	tokens = TokensPerLine(block)
+	return (tokens, ParseNumbers(block, numpy.float64, int(tokens.sum())))
+
+# split tokenized lines into vertex rows and face lists; blank and comment lines are not
+# records, the others are numbered from body record firstLine on
+def _offRecords(tokens, values, firstLine, meshInfo):
+	lineStart = numpy.cumsum(tokens) - tokens
+	isRecord = tokens != 0
+	(tokens, lineStart) = (tokens[isRecord], lineStart[isRecord])
+	recordIdx = numpy.arange(firstLine, firstLine + len(tokens))
+	isVert = recordIdx < meshInfo[0]
+	isFace = ~isVert & (recordIdx < meshInfo[0] + meshInfo[1])
+	assert (tokens[isVert] >= 3).all(), 'Malformed .off vertex.'
+	sizes = values[lineStart[isFace]]
+	assert ((sizes >= 1) & (sizes <= tokens[isFace] - 1) & (sizes == numpy.floor(sizes))).all(), 'Malformed .off face.'
+	records = dict(verts = LineColumns(values, lineStart[isVert], tokens[isVert], 7))
+	(records['faceStart'], records['faceVerts']) = LineLists(values, lineStart[isFace])
+	return records
+
+def ReadOFFChunks(fileName, blockSize = BLOCK_SIZE):
 	'''
-	Save mesh into .off file
+	Yield the vertices and faces of a .off file as MeshChunk objects, one per
+	block of the file
+	'''
+	(meshInfo, start) = _readOFFHeader(fileName)
+	nVert = 0; nFace = 0
+	for block in ReadBlocks(fileName, blockSize, start):
+		records = _parseOFFBlock(block, nVert + nFace, meshInfo)
+		chunk = MeshLib.Mesh.MeshChunk(nVert, nFace)
+		verts = records['verts']
+		if len(verts) != 0:
+			# x y z [u v | r g b [a]]
+			chunk.positions = verts[:, :3]
+			hasColor = ~numpy.isnan(verts[:, 5])
+			if hasColor.any(): chunk.colors = numpy.where(hasColor[:, None], verts[:, 3:6] / 255.0, 1.0)
+			elif not numpy.isnan(verts[:, 4]).any(): chunk.textures = verts[:, 3:5]
+		(chunk.faceStart, chunk.faceVerts) = (records['faceStart'], records['faceVerts'])
+		nVert += chunk.NumVerts(); nFace += chunk.NumFaces()
+		yield chunk
+
+def WriteOFF(fileName, positions, faceStart, faceVerts, textures = None, precision = 6, workers = 1):
+	'''
+	Write a .off file from arrays; faces are given as a flat corner list.
+	Numbers are written with precision decimals, formatted by workers processes.
 	'''
-	output = open(fileName, 'w')
-	output.write('OFF\n')
-	output.write('%d %d 0\n' % (len(verts), len(faces)))
-	for v in verts:
-		texStr = ''
-		if len(textures) != 0:
-			texStr = ' %f %f' % (textures[verts.index(v)][0], textures[verts.index(v)][1])
-		output.write('%f %f %f%s\n' % (v[0], v[1], v[2], texStr))
-	for f in faces:
-		line = '%d' % len(f)
-		for fi in f: line += ' ' + str(fi)
-		line += '\n'
-		output.write(line)
+	real = RealFormat(precision)
+	pool = FormatPool(workers)
+	output = open(fileName, 'wb')
+	output.write(('OFF\n%d %d 0\n' % (len(positions), len(faceStart) - 1)).encode())
+	if textures is not None and len(textures) == len(positions):
+		WriteFormatted(output, RowChunks(numpy.hstack((positions, textures)), ' '.join([real] * 5) + '\n'), pool)
+	else:
+		WriteFormatted(output, RowChunks(positions, ' '.join([real] * 3) + '\n'), pool)
+	WriteFormatted(output, RaggedChunks(faceVerts, faceStart, lambda n: str(n) + ' %d' * n + '\n'), pool)
 	output.close()
+	if pool is not None: pool.close()
+
+def SaveOFFFile(fileName, verts, faces, normals, textures, precision = 6, workers = 1):
+	'''
+	Save mesh into .off file
+	'''
+	(faceStart, faceVerts) = PolygonCorners(faces)
+	WriteOFF(fileName, VectorArray(verts, 3), faceStart, faceVerts, VectorArray(textures, 2), precision, workers)
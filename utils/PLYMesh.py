@@ -1,95 +1,460 @@
 from MeshLib.Geometry import *
+from MeshLib.MeshArrays import MeshArrays, UniqueRows, VectorArray
+from MeshLib.Topology import FanTriangulate, PolygonCorners
+from MeshLib.utils.FastText import *
 import MeshLib.Mesh
+import numpy
+import mmap
 
-def LoadPLYFile(fileName, rmReduntVerts):
+# .ply property types and their numpy equivalents (byte order added per file)
+PLY_TYPES = {'char':'i1', 'uchar':'u1', 'short':'i2', 'ushort':'u2', 'int':'i4', 'uint':'u4', 'float':'f4', 'double':'f8', \
+	'int8':'i1', 'uint8':'u1', 'int16':'i2', 'uint16':'u2', 'int32':'i4', 'uint32':'u4', 'float32':'f4', 'float64':'f8'}
+PLY_FORMATS = {'ascii':'', 'binary_little_endian':'<', 'binary_big_endian':'>'}
+# vertex properties recognized as normals, texture coordinates and colors
+NORMAL_PROPS = ('nx', 'ny', 'nz')
+TEXTURE_PROPS = (('u', 'v'), ('s', 't'), ('texture_u', 'texture_v'), ('texture_s', 'texture_t'))
+COLOR_PROPS = ('red', 'green', 'blue')
+# record ranks of the runs of _byteCountRecords, the longest run it checks at once
+_STEPS = numpy.arange(1 << 16, dtype=numpy.int64)
+
+# PLYElement class
+# fields:
+#     name	---- element name, e.g. 'vertex' or 'face'
+#     count	---- number of records
+#     props	---- list of (name, type) for scalar properties, (name, countType, itemType) for lists
+class PLYElement:
+	def __init__(self, name, count):
+		self.name = name
+		self.count = count
+		self.props = []
+
+	def IsScalar(self):
+		return all(len(p) == 2 for p in self.props)
+
+	def Dtype(self, byteOrder):
+		'''
+		Record dtype of an element with scalar properties only
+		'''
+		return numpy.dtype([(p[0], byteOrder + PLY_TYPES[p[1]]) for p in self.props])
+
+def ReadPLYHeader(file):
 	'''
-	Load a .ply file, return vertices, faces, normals and textures
-	There are some restrictions for the imported .ply formate:
-	1. Only ASCII format supported;
-	2. Only geometry and topology information loaded;
-	3. Only accept list format of face's representation
-	4. Vertex info must before face info
-	'''
-	verts = []; faces = [];	normals = []; textures = []; lines = []
-	typeMaps = {'char':int, 'uchar':int, 'short':int, 'ushort':int, 'int':int, 'uint':int, 'float':float, 'double':float}
-	vertType = []; faceType = []
-	vertPos = [-1, -1, -1]; 
-	nVert = -1; nFace = -1
-	header = []
-
-	# read headers
-	file = open(fileName)
-	curLine = file.readline()
-	while curLine.rstrip().lower() != 'end_header':
-		header.append(curLine.rstrip().lower())
+	Read the header of a .ply file opened in binary mode.
+	Return (format, elements); the file is left at the first data byte.
+	'''
+	assert file.readline().strip().lower() == b'ply', 'Not a .ply file.'
+	fileFormat = 'ascii'; elements = []
+	while True:
 		curLine = file.readline()
-	header = [h for h in header if h != '' and 'comment' not in h]
-	# split headers with 'element'
-	elementIndices = []
-	for hi in range(0, len(header)):
-		if 'element ' not in header[hi]: continue
-		elementIndices.append(hi)
-	elementIndices.append(len(header))
-	# parse header
-	for i in range(0, len(elementIndices)-1):
-		primitive = header[elementIndices[i]].split(' ')[1]
-
-		if primitive == 'vertex':
-			nVert = int(header[elementIndices[i]].split(' ')[2])
-			for j in range(elementIndices[i]+1, elementIndices[i+1]):
-				parts = header[j].split(' ')
-				vertType.append(typeMaps[parts[1]])
-				if parts[2] == 'x': vertPos[0] = j - elementIndices[i]-1
-				elif parts[2] == 'y': vertPos[1] = j - elementIndices[i]-1
-				elif parts[2] == 'z': vertPos[2] = j - elementIndices[i]-1
-		elif primitive == 'face':
-			nFace = int(header[elementIndices[i]].split(' ')[2])
-	
-	# laod content
-	vert2index = dict()
-	realIndex = []
-	for i in range(0, nVert):
-		curLine = file.readline().rstrip()
-		if rmReduntVerts and curLine in realIndex:
-			realIndex.append(vert2index[curLine])
+		assert len(curLine) != 0, 'Unexpected end of .ply header.'
+		parts = curLine.decode('ascii', 'replace').strip().lower().split()
+		if len(parts) == 0 or parts[0] in ('comment', 'obj_info'): continue
+		if parts[0] == 'end_header': break
+		if parts[0] == 'format':
+			fileFormat = parts[1]
+			assert fileFormat in PLY_FORMATS, 'Unknown .ply format \'%s\'.' % fileFormat
+		elif parts[0] == 'element':
+			elements.append(PLYElement(parts[1], int(parts[2])))
+		elif parts[0] == 'property':
+			if parts[1] == 'list': elements[-1].props.append((parts[4], parts[2], parts[3]))
+			else: elements[-1].props.append((parts[2], parts[1]))
+	return (fileFormat, elements)
+
+def LoadPLYElements(fileName, useMemmap = False):
+	'''
+	Load the vertex and face elements of an ascii or binary .ply file.
+	Return (vertexRecords, faceStart, faceVerts): vertexRecords is a structured
+	array with one field per vertex property, faces are given as a flat corner
+	list. With useMemmap the fixed-size vertex records of a binary file are
+	memory-mapped instead of read.
+	'''
+	file = open(fileName, 'rb')
+	(fileFormat, elements) = ReadPLYHeader(file)
+	offset = file.tell()
+	vertexRecords = None
+	faceStart = numpy.zeros(1, dtype=numpy.int64); faceVerts = numpy.zeros(0, dtype=numpy.int64)
+	if fileFormat == 'ascii':
+		table = LineTable(file.read())
+		file.close()
+		lineStart = 0
+		for element in elements:
+			mask = numpy.zeros(len(table), dtype=bool)
+			mask[lineStart:lineStart+element.count] = True
+			lineStart += element.count
+			if element.name == 'vertex':
+				vertexRecords = _asciiScalars(element, table.Extract(mask), element.count)
+			elif element.name == 'face':
+				(faceStart, faceVerts) = _asciiFaces(element, table.Extract(mask), element.count)
+		return (vertexRecords, faceStart, faceVerts)
+
+	byteOrder = PLY_FORMATS[fileFormat]
+	file.seek(0, 2); fileSize = file.tell()
+	for element in elements:
+		if element.IsScalar():
+			dtype = element.Dtype(byteOrder)
+			if element.name == 'vertex':
+				if useMemmap:
+					vertexRecords = numpy.memmap(fileName, dtype=dtype, mode='r', offset=offset, shape=(element.count,))
+				else:
+					file.seek(offset)
+					vertexRecords = numpy.fromfile(file, dtype=dtype, count=element.count)
+			offset += dtype.itemsize * element.count
+			continue
+		# elements with list properties
+		file.seek(offset)
+		(records, size) = _binaryLists(element, byteOrder, file, fileSize - offset, useMemmap and fileName, element.count)
+		offset += size
+		if element.name == 'face':
+			listName = [p[0] for p in element.props if len(p) == 3][0]
+			(faceStart, faceVerts) = records[listName]
+	file.close()
+	return (vertexRecords, faceStart, faceVerts)
+
+# parse count scalar records of an ascii element
+def _asciiScalars(element, data, count):
+	dtype = element.Dtype('=')
+	values = ParseNumbers(data, numpy.float64).reshape(count, len(element.props))
+	records = numpy.empty(count, dtype=dtype)
+	for i in range(0, len(element.props)):
+		records[element.props[i][0]] = values[:, i]
+	return records
+
+# parse the face lists of count ascii records, other properties are skipped
+def _asciiFaces(element, data, count):
+	# every scalar takes one token, the list takes its count plus one
+	listPos = [i for i in range(0, len(element.props)) if len(element.props[i]) == 3][0]
+	return CountedLists(data, count, listPos)
+
+# read count binary records of an element with list properties; return ({list name: (start, items)}, byte size)
+def _binaryLists(element, byteOrder, file, available, memmapFile, count):
+	# try fixed-size records, i.e. every list has the length of the first one
+	head = numpy.frombuffer(file.read(min(available, 4096)), dtype=numpy.uint8)
+	file.seek(-len(head), 1)
+	fields = []; pos = 0; lengths = []
+	for p in element.props:
+		if len(p) == 2:
+			fields.append((p[0], byteOrder + PLY_TYPES[p[1]])); pos += numpy.dtype(PLY_TYPES[p[1]]).itemsize
+			continue
+		countType = numpy.dtype(byteOrder + PLY_TYPES[p[1]]); itemType = numpy.dtype(byteOrder + PLY_TYPES[p[2]])
+		length = int(head[pos:pos+countType.itemsize].view(countType)[0]) if count != 0 else 0
+		fields.append((p[0] + '#count', countType)); fields.append((p[0], itemType, (length,)))
+		pos += countType.itemsize + itemType.itemsize * length
+		lengths.append((p[0], length))
+	dtype = numpy.dtype(fields)
+	start = file.tell()
+	if dtype.itemsize * count <= available:
+		if memmapFile: records = numpy.memmap(memmapFile, dtype=dtype, mode='r', offset=start, shape=(count,))
+		else: records = numpy.fromfile(file, dtype=dtype, count=count)
+		if all((records[name + '#count'] == length).all() for (name, length) in lengths):
+			result = dict()
+			for (name, length) in lengths:
+				result[name] = (numpy.arange(0, length*count+1, length, dtype=numpy.int64), \
+					records[name].reshape(-1).astype(numpy.int64))
+			file.seek(start + dtype.itemsize * count)
+			return (result, dtype.itemsize * count)
+		file.seek(start)
+	# lists of varying length: walk the list counts to find where the records start, then
+	# gather the counts and items from a mapping of the file with index arithmetic
+	return _varyingLists(element, byteOrder, file, start, count)
+
+# read count binary records with lists of varying length from start of file; return as _binaryLists
+def _varyingLists(element, byteOrder, file, start, count):
+	# a record is fixed[0] bytes of scalars, a list, fixed[1] bytes of scalars, a list, ...
+	fixed = [0]; lists = []
+	for p in element.props:
+		if len(p) == 2:
+			fixed[-1] += numpy.dtype(PLY_TYPES[p[1]]).itemsize
+			continue
+		lists.append((p[0], numpy.dtype(byteOrder + PLY_TYPES[p[1]]), numpy.dtype(byteOrder + PLY_TYPES[p[2]])))
+		fixed.append(0)
+	mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+	data = numpy.frombuffer(mapping, dtype=numpy.uint8)
+	countPos = [[] for l in lists]
+	pos = start
+	try:
+		if len(lists) == 1 and lists[0][1].itemsize == 1:
+			# one list with byte counts, the usual face element
+			(countPos, pos) = _byteCountRecords(mapping, data, start, count, fixed[0], fixed[0] + 1 + fixed[1], lists[0][2].itemsize)
+			countPos = [countPos]
+		else:
+			order = 'big' if byteOrder == '>' else 'little'
+			for i in range(0, count):
+				pos += fixed[0]
+				for k in range(0, len(lists)):
+					(countType, itemType) = lists[k][1:]
+					countPos[k].append(pos)
+					length = int.from_bytes(mapping[pos:pos+countType.itemsize], order, signed=countType.kind == 'i')
+					pos += countType.itemsize + itemType.itemsize * length + fixed[k+1]
+	except IndexError:
+		pos = len(mapping) + 1
+	complete = pos <= len(mapping)
+	if not complete:
+		del data
+		mapping.close()
+	assert complete, 'Unexpected end of .ply data.'
+	result = dict()
+	for k in range(0, len(lists)):
+		(name, countType, itemType) = lists[k]
+		where = numpy.array(countPos[k], dtype=numpy.int64)
+		lengths = _gatherValues(data, where, countType).astype(numpy.int64)
+		listStart = numpy.zeros(count + 1, dtype=numpy.int64)
+		numpy.cumsum(lengths, out=listStart[1:])
+		# byte offset of every item: its list start plus its rank in the list
+		rank = numpy.arange(listStart[-1], dtype=numpy.int64) - numpy.repeat(listStart[:-1], lengths)
+		itemPos = numpy.repeat(where + countType.itemsize, lengths) + rank * itemType.itemsize
+		result[name] = (listStart, _gatherValues(data, itemPos, itemType).astype(numpy.int64))
+	del data
+	mapping.close()
+	file.seek(pos)
+	return (result, pos - start)
+
+# byte offsets of the counts of count records with one list of byte counts, from start of
+# mapping (data being its bytes as an array): skip bytes before the count, rest bytes of
+# scalars and count in all, step bytes per item; return (offsets, end of the last record).
+# A run of records with the same count is checked and stepped over in bulk, a mix of
+# counts is walked record by record; IndexError past the end of the mapping
+def _byteCountRecords(mapping, data, start, count, skip, rest, step):
+	pieces = []
+	(pos, i, run, walk) = (start, 0, 64, 1)
+	while i < count:
+		length = mapping[pos + skip]
+		stride = rest + step * length
+		# guess the next records to have the same count, accept them up to the first that has not
+		n = min(run, count - i, (len(data) - 1 - pos - skip) // stride + 1)
+		where = _STEPS[:n] * stride
+		where += pos + skip
+		differ = data[where] != length
+		first = int(differ.argmax())
+		accepted = first if differ[first] else n
+		pieces.append(where[:accepted])
+		pos += stride * accepted; i += accepted
+		if accepted == n:
+			run = min(2 * run, len(_STEPS))
 			continue
-		if rmReduntVerts:
-			realIndex.append(len(verts))
-			vert2index[curLine] = len(verts)
-
-		parts = curLine.split(' ')
-		x = vertType[vertPos[0]](parts[vertPos[0]])
-		y = vertType[vertPos[1]](parts[vertPos[1]])
-		z = vertType[vertPos[2]](parts[vertPos[2]])
-		verts.append(MeshLib.Mesh.Vertex(Vector3D(x, y, z)))
-	for i in range(0, nFace):
-		parts = file.readline().rstrip().split(' ')
-		vertList = [int(parts[j]) for j in range(1, len(parts))]
-		if rmReduntVerts: vertList = [realIndex[v] for v in vertList]
-		faces.append(MeshLib.Mesh.Face(vertList))
+		# walk the records of another count one by one, the more of them the shorter the runs are
+		run = min(max(2 * accepted, 64), len(_STEPS))
+		walk = 1 if accepted >= 16 else min(2 * walk, 256)
+		walked = []
+		for j in range(0, min(walk, count - i)):
+			walked.append(pos + skip)
+			pos += rest + step * mapping[pos + skip]
+		pieces.append(walked)
+		i += len(walked)
+	return (numpy.concatenate(pieces + [numpy.zeros(0, dtype=numpy.int64)]).astype(numpy.int64), pos)
+
+# values of dtype stored at the byte offsets where of a uint8 buffer
+def _gatherValues(data, where, dtype):
+	return data[where[:, None] + numpy.arange(dtype.itemsize)].view(dtype).ravel()
+
+# split vertex records into positions, normals, textures and colors
+def _vertexAttributes(vertexRecords):
+	names = vertexRecords.dtype.names
+	column = lambda props: numpy.stack([vertexRecords[p].astype(numpy.float64) for p in props], axis=1)
+	positions = column(('x', 'y', 'z'))
+	normals = column(NORMAL_PROPS) if all(p in names for p in NORMAL_PROPS) else None
+	textures = None
+	for props in TEXTURE_PROPS:
+		if all(p in names for p in props):
+			textures = column(props)
+			break
+	colors = None
+	if all(p in names for p in COLOR_PROPS):
+		colors = column(COLOR_PROPS)
+		# integer colors are in 0..255
+		if vertexRecords.dtype['red'].kind in 'iu': colors /= 255.0
+	return (positions, normals, textures, colors)
+
+def LoadPLYArrays(fileName, rmReduntVerts, useMemmap = False):
+	'''
+	Load an ascii or binary .ply file into MeshArrays, return (arrays, lines).
+	Normals (nx/ny/nz), texture coordinates (u/v, s/t) and colors (red/green/blue)
+	are loaded if present; polygonal faces are fan-triangulated.
+	'''
+	(vertexRecords, faceStart, faceVerts) = LoadPLYElements(fileName, useMemmap)
+	(positions, normals, textures, colors) = _vertexAttributes(vertexRecords)
+	if rmReduntVerts:
+		(keep, realIndex) = UniqueRows(numpy.ascontiguousarray(vertexRecords).view(numpy.uint8).reshape(len(vertexRecords), -1))
+		positions = positions[keep]
+		normals = None if normals is None else normals[keep]
+		textures = None if textures is None else textures[keep]
+		colors = None if colors is None else colors[keep]
+		faceVerts = realIndex[faceVerts]
+	faces = faceVerts[FanTriangulate(faceStart)]
+	return (MeshArrays(positions, faces, normals, textures, colors), [])
+
+def LoadPLYFile(fileName, rmReduntVerts):
+	'''
+	Load a .ply file, return vertices, faces, normals and textures
+	Both ASCII and binary formats are supported; only faces given as a list
+	property are loaded, other elements are skipped.
+	'''
+	(vertexRecords, faceStart, faceVerts) = LoadPLYElements(fileName)
+	(positions, normals, textures, colors) = _vertexAttributes(vertexRecords)
+	if rmReduntVerts:
+		(keep, realIndex) = UniqueRows(numpy.ascontiguousarray(vertexRecords).view(numpy.uint8).reshape(len(vertexRecords), -1))
+		(positions, faceVerts) = (positions[keep], realIndex[faceVerts])
+		normals = None if normals is None else normals[keep]
+		textures = None if textures is None else textures[keep]
+		colors = None if colors is None else colors[keep]
+	verts = [MeshLib.Mesh.Vertex(Vector3D(*p)) for p in positions.tolist()]
+	if colors is not None:
+		for (v, c) in zip(verts, colors.tolist()): v.color = Vector3D(*c)
+	faceVertList = faceVerts.tolist(); starts = faceStart.tolist()
+	faces = [MeshLib.Mesh.Face(faceVertList[starts[i]:starts[i+1]]) for i in range(0, len(starts)-1)]
+	normals = [] if normals is None else [Vector3D(*n) for n in normals.tolist()]
+	textures = [] if textures is None else [Vector2D(*t) for t in textures.tolist()]
+	return (verts, faces, normals, textures, [])
+
+def ReadPLYChunks(fileName, blockSize = BLOCK_SIZE):
+	'''
+	Yield the vertices and faces of an ascii or binary .ply file as MeshChunk
+	objects of about blockSize bytes each
+	'''
+	file = open(fileName, 'rb')
+	(fileFormat, elements) = ReadPLYHeader(file)
+	nVert = 0; nFace = 0
+	if fileFormat == 'ascii':
+		start = file.tell()
+		file.close()
+		# (element, records left) of the element being read
+		pending = [[element, element.count] for element in elements if element.count != 0]
+		for block in ReadBlocks(fileName, blockSize, start):
+			table = LineTable(block)
+			lineStart = 0
+			while lineStart < len(table) and len(pending) != 0:
+				(element, left) = pending[0]
+				count = min(left, len(table) - lineStart)
+				mask = numpy.zeros(len(table), dtype=bool)
+				mask[lineStart:lineStart+count] = True
+				chunk = MeshLib.Mesh.MeshChunk(nVert, nFace)
+				if element.name == 'vertex':
+					(chunk.positions, chunk.normals, chunk.textures, chunk.colors) = _vertexAttributes(_asciiScalars(element, table.Extract(mask), count))
+				elif element.name == 'face':
+					(chunk.faceStart, chunk.faceVerts) = _asciiFaces(element, table.Extract(mask), count)
+				lineStart += count
+				pending[0][1] -= count
+				if pending[0][1] == 0: del pending[0]
+				if chunk.NumVerts() + chunk.NumFaces() == 0: continue
+				nVert += chunk.NumVerts(); nFace += chunk.NumFaces()
+				yield chunk
+		return
 
+	byteOrder = PLY_FORMATS[fileFormat]
+	offset = file.tell()
+	file.seek(0, 2); fileSize = file.tell()
+	file.seek(offset)
+	for element in elements:
+		if element.IsScalar():
+			dtype = element.Dtype(byteOrder)
+			if element.name != 'vertex':
+				file.seek(dtype.itemsize * element.count, 1)
+				continue
+			step = max(blockSize // dtype.itemsize, 1)
+			for i in range(0, element.count, step):
+				chunk = MeshLib.Mesh.MeshChunk(nVert, nFace)
+				records = numpy.fromfile(file, dtype=dtype, count=min(step, element.count - i))
+				(chunk.positions, chunk.normals, chunk.textures, chunk.colors) = _vertexAttributes(records)
+				nVert += chunk.NumVerts()
+				yield chunk
+			continue
+		# records with lists are read about blockSize / 16 at a time
+		step = max(blockSize // 16, 1)
+		listName = [p[0] for p in element.props if len(p) == 3][0]
+		for i in range(0, element.count, step):
+			(records, size) = _binaryLists(element, byteOrder, file, fileSize - file.tell(), False, min(step, element.count - i))
+			if element.name != 'face': continue
+			chunk = MeshLib.Mesh.MeshChunk(nVert, nFace)
+			(chunk.faceStart, chunk.faceVerts) = records[listName]
+			nFace += chunk.NumFaces()
+			yield chunk
 	file.close()
-	return (verts, faces, normals, textures, lines)
-
-
-def SavePLYFile(fileName, verts, faces, normals, textures):
-	output = open(fileName, 'w')
-	output.write('ply\n')
-	output.write('format ascii 1.0\n')
-	output.write('comment generated by MeshLib\n')
-	output.write('element vertex %d\n' % len(verts))
-	output.write('property float x\n')
-	output.write('property float y\n')
-	output.write('property float z\n')
-	output.write('element face %d\n' % len(faces))
-	output.write('property list uchar int vertex_index\n')
-	output.write('end_header\n')
-
-	for v in verts:
-		output.write('%f %f %f\n' % (v[0], v[1], v[2]))
-	for f in faces:
-		output.write(str(len(f)))
-		for fi in f:
-			output.write(' ' + str(fi))
-		output.write('\n')
+
+def PLYVertexColumns(positions, normals = None, textures = None, colors = None):
+	'''
+	Return the (name, type, values) vertex properties written for the given arrays
+	'''
+	nVert = len(positions)
+	columns = [('x', 'float', positions[:, 0]), ('y', 'float', positions[:, 1]), ('z', 'float', positions[:, 2])]
+	if normals is not None and len(normals) == nVert:
+		columns += [(NORMAL_PROPS[i], 'float', normals[:, i]) for i in range(0, 3)]
+	if textures is not None and len(textures) == nVert:
+		columns += [('u', 'float', textures[:, 0]), ('v', 'float', textures[:, 1])]
+	if colors is not None and len(colors) == nVert:
+		columns += [(COLOR_PROPS[i], 'uchar', numpy.clip(numpy.rint(colors[:, i] * 255.0), 0, 255)) for i in range(0, 3)]
+	return columns
+
+def PLYHeader(fileFormat, nVert, nFace, columns):
+	'''
+	Return the header of a .ply file with the given vertex columns (see PLYVertexColumns)
+	'''
+	assert fileFormat in PLY_FORMATS, 'Unknown .ply format \'%s\'.' % fileFormat
+	header = ['ply', 'format %s 1.0' % fileFormat, 'comment generated by MeshLib', 'element vertex %d' % nVert]
+	header += ['property %s %s' % (c[1], c[0]) for c in columns]
+	header += ['element face %d' % nFace, 'property list uchar int vertex_index', 'end_header']
+	return ('\n'.join(header) + '\n').encode()
+
+def WritePLYVertices(output, fileFormat, columns, precision = 6, pool = None):
+	'''
+	Write the vertex records of the given columns (see PLYVertexColumns) into a binary file
+	'''
+	byteOrder = PLY_FORMATS[fileFormat]
+	if byteOrder == '':
+		values = numpy.stack([c[2] for c in columns], axis=1)
+		rowFormat = ' '.join('%d' if c[1] == 'uchar' else RealFormat(precision) for c in columns) + '\n'
+		WriteFormatted(output, RowChunks(values, rowFormat), pool)
+		return
+	records = numpy.empty(len(columns[0][2]), dtype=[(c[0], byteOrder + PLY_TYPES[c[1]]) for c in columns])
+	for c in columns: records[c[0]] = c[2]
+	output.write(records.tobytes())
+
+def WritePLYFaces(output, fileFormat, faceStart, faceVerts, pool = None):
+	'''
+	Write faces given as a flat corner list into a binary file
+	'''
+	byteOrder = PLY_FORMATS[fileFormat]
+	nFace = len(faceStart) - 1
+	if byteOrder == '':
+		WriteFormatted(output, RaggedChunks(faceVerts, faceStart, lambda n: str(n) + ' %d' * n + '\n'), pool)
+		return
+	sizes = numpy.diff(faceStart)
+	faceVerts = faceVerts[faceStart[0]:faceStart[-1]]
+	if nFace != 0 and (sizes == sizes[0]).all():
+		faceRecords = numpy.empty(nFace, dtype=[('n', 'u1'), ('v', byteOrder + 'i4', (int(sizes[0]),))])
+		faceRecords['n'] = sizes[0]
+		faceRecords['v'] = faceVerts.reshape(nFace, -1)
+		output.write(faceRecords.tobytes())
+		return
+	# one count byte then the 4-byte indices of every face
+	faceStart = faceStart - faceStart[0]
+	data = numpy.empty(nFace + 4 * len(faceVerts), dtype=numpy.uint8)
+	countPos = faceStart[:-1] * 4 + numpy.arange(nFace)
+	data[countPos] = sizes
+	itemBytes = faceVerts.astype(byteOrder + 'i4').view(numpy.uint8)
+	cornerFace = numpy.repeat(numpy.arange(nFace), sizes)
+	bytePos = (numpy.arange(len(faceVerts)) * 4 + cornerFace + 1)[:, None] + numpy.arange(4)
+	data[bytePos.ravel()] = itemBytes
+	output.write(data.tobytes())
+
+def WritePLY(fileName, positions, faceStart, faceVerts, normals = None, textures = None, fileFormat = 'ascii', colors = None, \
+	precision = 6, workers = 1):
+	'''
+	Write a .ply file from arrays; faces are given as a flat corner list.
+	fileFormat is 'ascii', 'binary_little_endian' or 'binary_big_endian'; ascii
+	data is written with precision decimals, formatted by workers processes.
+	'''
+	columns = PLYVertexColumns(positions, normals, textures, colors)
+	pool = FormatPool(workers) if fileFormat == 'ascii' else None
+	output = open(fileName, 'wb')
+	output.write(PLYHeader(fileFormat, len(positions), len(faceStart) - 1, columns))
+	WritePLYVertices(output, fileFormat, columns, precision, pool)
+	WritePLYFaces(output, fileFormat, faceStart, faceVerts, pool)
 	output.close()
+	if pool is not None: pool.close()
+
+def SavePLYFile(fileName, verts, faces, normals, textures, fileFormat = 'ascii', precision = 6, workers = 1):
+	'''
+	Save mesh into .ply file, fileFormat being 'ascii', 'binary_little_endian' or 'binary_big_endian'
+	'''
+	(faceStart, faceVerts) = PolygonCorners(faces)
+	WritePLY(fileName, VectorArray(verts, 3), faceStart, faceVerts, VectorArray(normals, 3), VectorArray(textures, 2), \
+		fileFormat, None, precision, workers)
@@ -0,0 +1,122 @@
+from multiprocessing import shared_memory, resource_tracker
+import multiprocessing
+import numpy
+import os
+
+# Process-pool helpers.
+# Workers return their numpy results through shared memory blocks instead of
+# pickling them: ShareArrays copies a dict of arrays into new blocks and returns
+# small (name, dtype, shape) descriptors, AttachArrays maps them in the parent
+# and ReleaseBlocks frees them once the data has been copied where it belongs.
+
+def SplitRanges(fileName, nPart, start = 0):
+	'''
+	Split the byte range [start, end of file) of a file into up to nPart ranges
+	that end at line breaks, return [(start, end), ...]
+	'''
+	size = os.path.getsize(fileName)
+	bounds = [start]
+	file = open(fileName, 'rb')
+	for i in range(1, nPart):
+		pos = start + (size - start) * i // nPart
+		if pos <= bounds[-1]: continue
+		# move to the start of the next line
+		file.seek(pos - 1)
+		file.readline()
+		pos = file.tell()
+		if bounds[-1] < pos < size: bounds.append(pos)
+	file.close()
+	bounds.append(size)
+	return [(bounds[i], bounds[i+1]) for i in range(0, len(bounds)-1) if bounds[i+1] > bounds[i]]
+
+def ShareArrays(arrays):
+	'''
+	Copy a dict of arrays into new shared memory blocks, return the dict of their
+	(block name, dtype, shape) descriptors
+	'''
+	shared = dict()
+	for (key, array) in arrays.items():
+		array = numpy.ascontiguousarray(array)
+		block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+		numpy.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+		shared[key] = (block.name, array.dtype.str, array.shape)
+		block.close()
+	return shared
+
+def AttachArrays(shared):
+	'''
+	Map the blocks of ShareArrays descriptors, return (arrays, blocks); the arrays
+	are only valid until the blocks are released
+	'''
+	arrays = dict(); blocks = []
+	for (key, (name, dtype, shape)) in shared.items():
+		block = shared_memory.SharedMemory(name=name)
+		arrays[key] = numpy.ndarray(shape, dtype=dtype, buffer=block.buf)
+		blocks.append(block)
+	return (arrays, blocks)
+
+def ReleaseBlocks(blocks):
+	'''
+	Close and free shared memory blocks
+	'''
+	for block in blocks:
+		block.close()
+		block.unlink()
+
+def FreeArrays(shared):
+	'''
+	Free the blocks of ShareArrays descriptors without reading them
+	'''
+	ReleaseBlocks(AttachArrays(shared)[1])
+
+def TakeArrays(shared):
+	'''
+	Copy the arrays of ShareArrays descriptors out of shared memory and free the blocks
+	'''
+	(arrays, blocks) = AttachArrays(shared)
+	arrays = dict((key, array.copy()) for (key, array) in arrays.items())
+	ReleaseBlocks(blocks)
+	return arrays
+
+def SharedPool(workers):
+	'''
+	Return a process pool whose workers share the resource tracker of this
+	process, so blocks created by a worker and freed here are tracked once and
+	blocks never freed are cleaned up at exit
+	'''
+	resource_tracker.ensure_running()
+	return multiprocessing.Pool(workers)
+
+def MapInPool(func, argsList, workers, release = None):
+	'''
+	Return [func(args) for args in argsList] computed by a pool of workers processes.
+	If a call fails, release(result) is called on the results of the others (e.g.
+	FreeArrays of the blocks they shared) before its error is raised
+	'''
+	if workers <= 1 or len(argsList) <= 1: return [func(args) for args in argsList]
+	pool = SharedPool(min(workers, len(argsList)))
+	try:
+		results = []; error = None
+		iterator = pool.imap(func, argsList)
+		for i in range(0, len(argsList)):
+			try: results.append(iterator.next())
+			except Exception as e:
+				if error is None: error = e
+		if error is None: return results
+		if release is not None:
+			for result in results: release(result)
+		raise error
+	finally:
+		pool.close()
+		pool.join()
+
+def ConcatLists(lists):
+	'''
+	Concatenate lists given as (start offsets, flat items) pairs, return (start, items)
+	'''
+	starts = [numpy.zeros(1, dtype=numpy.int64)]; items = []; total = 0
+	for (start, flat) in lists:
+		starts.append(numpy.asarray(start[1:], dtype=numpy.int64) + total)
+		items.append(flat)
+		total += len(flat)
+	return (numpy.concatenate(starts), numpy.concatenate(items) if len(items) else numpy.zeros(0, dtype=numpy.int64))